@@ -0,0 +1,73 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Measures the memory held by the metadata of many artifacts, as Artifact
+objects and as an ArtifactBatch, using tracemalloc.
+
+Usage: python -m benchmarks.bench_artifact_memory [artifact count]
+"""
+import sys
+import time
+import tracemalloc
+
+from pipetree.artifact import Artifact, ArtifactBatch, Item
+from pipetree.config import PipelineStageConfig
+
+
+def measured(fn):
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    result = fn()
+    size = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    stage_config = PipelineStageConfig("bench", {
+        "type": "ParameterPipelineStage"
+    })
+    now = time.time()
+    hashes = ["%032x" % i for i in range(count)]
+
+    def make_artifacts():
+        artifacts = []
+        for i in range(count):
+            artifact = Artifact(stage_config, Item(None, type="default"))
+            artifact._specific_hash = hashes[i]
+            artifact._creation_time = now + i
+            artifacts.append(artifact)
+        return artifacts
+
+    artifacts, artifacts_size = measured(make_artifacts)
+    batch, batch_size = measured(
+        lambda: ArtifactBatch.from_artifacts(artifacts))
+    print("%d artifacts" % count)
+    print("Artifact objects  %8.1f bytes per artifact" %
+          (artifacts_size / count))
+    print("ArtifactBatch     %8.1f bytes per artifact" %
+          (batch_size / count))
+
+
+if __name__ == '__main__':
+    main()
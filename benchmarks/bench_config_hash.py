@@ -0,0 +1,61 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Measures the cost of constructing artifacts against their stage config,
+with the config hash memoized as it is now, and with it recomputed for
+every artifact as it used to be.
+
+Usage: python -m benchmarks.bench_config_hash [artifact count]
+"""
+import sys
+
+from benchmarks.common import timed
+from pipetree.artifact import Artifact, Item
+from pipetree.config import PipelineStageConfig
+
+
+def per_call(fn, count):
+    _, elapsed = timed(lambda: [fn() for _ in range(count)])
+    return elapsed / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    stage_config = PipelineStageConfig("bench", {
+        "type": "ParameterPipelineStage",
+        "serialization": "pickle5",
+        "compression": "zlib",
+        "params": {"key%d" % i: i for i in range(20)}
+    })
+
+    memoized = per_call(lambda: Artifact(stage_config, Item(None)), count)
+    recomputed = per_call(lambda: (Artifact(stage_config, Item(None)),
+                                   stage_config._compute_hash()), count)
+    hash_only = per_call(stage_config.hash, count)
+    print("%d artifacts" % count)
+    print("memoized hash     %8.2fus per artifact" % (memoized * 1e6))
+    print("recomputed hash   %8.2fus per artifact" % (recomputed * 1e6))
+    print("config.hash()     %8.2fus per call" % (hash_only * 1e6))
+
+
+if __name__ == '__main__':
+    main()
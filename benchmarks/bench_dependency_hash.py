@@ -0,0 +1,61 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Measures dependency hashing of a large stage: computing the hash of all
+its inputs at once, and updating it with DependencyHasher as an input is
+added and removed, compared to hashing all inputs again.
+
+Usage: python -m benchmarks.bench_dependency_hash [input count]
+"""
+import sys
+
+from benchmarks.common import timed
+from pipetree.hashing import DependencyHasher, dependency_digest
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    inputs = [("source", "%032x_%032x_" % (0, i)) for i in range(count)]
+    print("%d inputs" % count)
+
+    digest, batch_time = timed(lambda: dependency_digest(inputs))
+    print("batch hash          %8.3fs" % batch_time)
+
+    hasher, build_time = timed(lambda: DependencyHasher(inputs))
+    print("incremental build   %8.3fs" % build_time)
+    assert hasher.hexdigest() == digest
+
+    extra = ("source", "%032x_%032x_" % (1, 0))
+
+    def update():
+        hasher.add(*extra)
+        hasher.hexdigest()
+        hasher.remove(*extra)
+        return hasher.hexdigest()
+
+    updated, update_time = timed(update)
+    assert updated == digest
+    print("add + remove input  %8.6fs" % update_time)
+
+
+if __name__ == '__main__':
+    main()
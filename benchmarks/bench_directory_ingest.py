@@ -0,0 +1,86 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Measures reading a directory tree of files into artifacts with varying
+numbers of read workers. Each file's pages are dropped from the page
+cache before every run where posix_fadvise is supported, so that reads
+go to the disk.
+
+Usage: python -m benchmarks.bench_directory_ingest [files] [KB per file]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from pipetree.config import PipelineStageConfig
+from pipetree.providers import LocalDirectoryArtifactProvider
+
+SUBDIRECTORIES = 16
+WORKERS = [1, 4, 16]
+
+
+def drop_cache(paths):
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    size_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    stage_config = PipelineStageConfig("bench", {
+        "type": "LocalDirectoryPipelineStage",
+        "filepath": "."
+    })
+    with tempfile.TemporaryDirectory() as root:
+        paths = []
+        for i in range(count):
+            directory = os.path.join(root, "%02d" % (i % SUBDIRECTORIES))
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, "%08d.jpg" % i)
+            with open(path, 'wb') as f:
+                f.write(os.urandom(size_kb * 1024))
+            paths.append(path)
+
+        print("%d files of %dKB" % (count, size_kb))
+        for workers in WORKERS:
+            drop_cache(paths)
+            provider = LocalDirectoryArtifactProvider(
+                path=root, stage_config=stage_config, read_content=True,
+                recursive=True, include="*.jpg", read_workers=workers)
+            start = time.perf_counter()
+            size = sum(len(artifact.item.payload)
+                       for artifact in provider.yield_artifacts())
+            elapsed = time.perf_counter() - start
+            print("%2d workers %8.3fs %8.0fMB/s" % (
+                workers, elapsed, size / elapsed / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Compares the hash schemes a backend may use, on the three kinds of
+hashes it computes: stage definition hashes, dependency hashes of a
+million inputs, and content hashes of a random payload. Schemes whose
+package is missing are skipped.
+
+Usage: python -m benchmarks.bench_hash_schemes [payload size in MB]
+"""
+import os
+import sys
+
+from benchmarks.common import timed
+from pipetree.config import PipelineStageConfig
+from pipetree.exceptions import HashSchemeUnavailableError
+from pipetree.hashing import HASH_SCHEMES, content_digest, dependency_digest
+
+CONFIG_HASHES = 10000
+DEPENDENCIES = 1000000
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    payload = os.urandom(size_mb * 1024 * 1024)
+    stage_config = PipelineStageConfig("bench", {
+        "type": "ParameterPipelineStage",
+        "params": {"key%d" % i: i for i in range(20)}
+    })
+    inputs = [("source", "%032x_%032x_" % (0, i))
+              for i in range(DEPENDENCIES)]
+    print("%-8s %14s %14s %14s" % ("scheme", "config hash",
+                                   "dependencies", "content"))
+    for name, scheme in sorted(HASH_SCHEMES.items()):
+        try:
+            scheme.new()
+        except HashSchemeUnavailableError as e:
+            print("%-8s %s" % (name, e))
+            continue
+        _, config_time = timed(lambda: [stage_config._compute_hash(scheme)
+                                        for _ in range(CONFIG_HASHES)])
+        _, dependency_time = timed(
+            lambda: dependency_digest(inputs, scheme))
+        _, content_time = timed(lambda: content_digest(payload, scheme))
+        print("%-8s %12.2fus %13.3fs %10.0fMB/s" % (
+            name, config_time / CONFIG_HASHES * 1e6, dependency_time,
+            size_mb / content_time))
+
+
+if __name__ == '__main__':
+    main()
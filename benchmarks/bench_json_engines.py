@@ -0,0 +1,75 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Compares the JSON engines installed on a shared metadata file of many
+artifacts, as written in the JSON metadata format. Engines whose package
+is missing are skipped.
+
+Usage: python -m benchmarks.bench_json_engines [artifact count]
+"""
+import sys
+import time
+
+from benchmarks.common import timed
+from pipetree import jsonengine
+from pipetree.exceptions import JSONEngineUnavailableError
+
+REPEATS = 3
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    now = time.time()
+    item_meta = {}
+    for i in range(count):
+        specific_hash = "%032x" % i
+        item_meta["%032x_%s_" % (0, specific_hash)] = {
+            "antecedents": {"source": "%032x_%032x_" % (1, i)},
+            "creation_time": now + i,
+            "definition_hash": "%032x" % 0,
+            "specific_hash": specific_hash,
+            "dependency_hash": None,
+            "pipeline_stage": "bench",
+            "serialization_type": "json",
+            "content_hash": "%032x" % (count + i),
+            "item": {"meta": {"index": i}, "tags": ["bench"],
+                     "type": "default"}
+        }
+
+    print("%d artifacts" % count)
+    print("%-10s %12s %12s" % ("engine", "encode", "decode"))
+    for name in jsonengine.JSON_ENGINES:
+        try:
+            engine = jsonengine.get_json_engine(name)
+        except JSONEngineUnavailableError as e:
+            print("%-10s %s" % (name, e))
+            continue
+        data, encode_time = timed(
+            lambda: engine.dumps(item_meta, sort_keys=True), REPEATS)
+        decoded, decode_time = timed(lambda: engine.loads(data), REPEATS)
+        assert decoded == item_meta
+        print("%-10s %8.0fk/s %8.0fk/s" % (
+            name, count / encode_time / 1e3, count / decode_time / 1e3))
+
+
+if __name__ == '__main__':
+    main()
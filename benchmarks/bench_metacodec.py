@@ -0,0 +1,75 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Compares encoding a shared metadata file of many artifacts as JSON and
+in the binary metadata format: encoded size, encoding and decoding
+throughput, and that the binary format round trips.
+
+Usage: python -m benchmarks.bench_metacodec [artifact count]
+"""
+import sys
+import time
+
+from benchmarks.common import timed
+from pipetree import metacodec
+from pipetree.artifact import Artifact, Item
+from pipetree.config import PipelineStageConfig
+
+REPEATS = 3
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    stage_config = PipelineStageConfig("bench", {
+        "type": "ParameterPipelineStage"
+    })
+    now = time.time()
+    item_meta = {}
+    for i in range(count):
+        artifact = Artifact(stage_config, Item(
+            None, meta={"index": i}, tags=["bench"], type="default"))
+        artifact._specific_hash = "%032x" % i
+        artifact._dependency_hash = "%032x" % (count + i)
+        artifact._content_hash = "%032x" % (2 * count + i)
+        artifact._creation_time = now + i
+        artifact._antecedents = {"source": "%s_%032x_" % (
+            stage_config.hash(), i)}
+        item_meta[artifact.get_uid()] = artifact.meta_to_dict()
+
+    print("%d artifacts" % count)
+    print("%-8s %12s %12s %12s" % ("format", "size", "encode", "decode"))
+    for format in metacodec.FORMATS:
+        if metacodec.metadata_format_for(format) != format:
+            print("%-8s requires the msgpack package" % format)
+            continue
+        data, encode_time = timed(
+            lambda: metacodec.dumps_meta_map(item_meta, format), REPEATS)
+        decoded, decode_time = timed(
+            lambda: metacodec.loads_meta_map(data), REPEATS)
+        assert decoded == item_meta
+        print("%-8s %10.1fMB %8.0fk/s %8.0fk/s" % (
+            format, len(data) / 1e6, count / encode_time / 1e3,
+            count / decode_time / 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Compares saving and loading a large NumPy array through
+LocalArtifactBackend using the json serializer, which needs the array
+converted to a list, against pickle5 with out-of-band buffers and the
+memory-mapped ndarray serializer.
+
+Usage: python -m benchmarks.bench_serializers [size in MB]
+"""
+import os
+import sys
+import tempfile
+
+import numpy
+
+from benchmarks.common import timed
+from pipetree.artifact import Artifact, Item
+from pipetree.backend import LocalArtifactBackend
+from pipetree.config import PipelineStageConfig
+
+
+def run(serialization_type, to_payload, array, path):
+    stage_config = PipelineStageConfig("bench_" + serialization_type, {
+        "type": "ParameterPipelineStage",
+        "serialization": serialization_type
+    })
+    backend = LocalArtifactBackend(path=path)
+    artifact = Artifact(stage_config, Item(None))
+    artifact._specific_hash = "bench"
+
+    def save():
+        artifact.item.payload = to_payload(array)
+        backend.save_artifact(artifact)
+
+    def load():
+        query = Artifact(stage_config)
+        query._specific_hash = "bench"
+        return numpy.asarray(backend.load_artifact(query).item.payload)
+
+    _, save_time = timed(save)
+    loaded, load_time = timed(load)
+    assert numpy.array_equal(loaded, array)
+    print("%-10s save %8.3fs  load %8.3fs" %
+          (serialization_type, save_time, load_time))
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    array = numpy.random.random(size_mb * 1024 * 1024 // 8)
+    print("Array of %d MB" % size_mb)
+    with tempfile.TemporaryDirectory() as path:
+        run("json", lambda a: a.tolist(), array, os.path.join(path, "json"))
+        run("pickle5", lambda a: a, array, os.path.join(path, "pickle5"))
+        run("ndarray", lambda a: a, array, os.path.join(path, "ndarray"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Measures sourcing a directory of files with a manifest: the first sweep
+reads and hashes every file, while later sweeps over the unchanged files
+only stat them.
+
+Usage: python -m benchmarks.bench_source_manifest [files] [KB per file]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from pipetree.config import PipelineStageConfig
+from pipetree.providers import LocalDirectoryArtifactProvider
+
+HOUR_NS = 3600 * 10 ** 9
+
+
+def sweep(root, manifest_dir, stage_config):
+    provider = LocalDirectoryArtifactProvider(
+        path=root, stage_config=stage_config, read_content=True,
+        manifest_dir=manifest_dir)
+    start = time.perf_counter()
+    artifacts = list(provider.yield_artifacts())
+    return artifacts, time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    size_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    stage_config = PipelineStageConfig("bench", {
+        "type": "LocalDirectoryPipelineStage",
+        "filepath": "."
+    })
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "source")
+        os.makedirs(root)
+        data = os.urandom(size_kb * 1024)
+        past = time.time_ns() - HOUR_NS
+        for i in range(count):
+            path = os.path.join(root, "%08d.bin" % i)
+            with open(path, 'wb') as f:
+                f.write(data)
+            # Recently modified files aren't recorded in manifests
+            os.utime(path, ns=(past, past))
+
+        manifest_dir = os.path.join(tmp, "manifests")
+        first, first_time = sweep(root, manifest_dir, stage_config)
+        second, second_time = sweep(root, manifest_dir, stage_config)
+        assert [a._specific_hash for a in first] == \
+            [a._specific_hash for a in second]
+        print("%d files of %dKB" % (count, size_kb))
+        print("first sweep   %8.3fs" % first_time)
+        print("second sweep  %8.3fs" % second_time)
+
+
+if __name__ == '__main__':
+    main()
@@ -19,18 +19,61 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
-import hashlib
-import inspect
-import json
+import array
+import io
+import math
 from pipetree.exceptions import InvalidArtifactMetadataError,\
-    ArtifactUnknownSerializationTypeError
+    ArtifactUnknownSerializationTypeError, ArtifactUnknownCompressionError
+from pipetree.hashing import dependency_digest, hash_scheme_of,\
+    LEGACY_HASH_SCHEME
+from pipetree.compression import get_codec, compression_for, NO_COMPRESSION
+from pipetree.serializers import get_serializer, serialization_type_for,\
+    join_chunks, decode_stringlike
+from pipetree.references import FileReference,\
+    FILE_REFERENCE_SERIALIZATION_TYPE
 
 
 class Artifact(object):
+    # Listing of meta properties for serialization purposes
+    _meta_properties = (
+        "antecedents", "creation_time", "definition_hash",
+        "specific_hash", "dependency_hash",
+        "pipeline_stage", "serialization_type")
+
+    # Listing of meta properties added since the original metadata
+    # format, which may be absent from older caches
+    _optional_meta_properties = (
+        "content_hash", "compression", "compression_dictionary",
+        "chunk_manifest", "delta_base", "delta_depth", "partitions",
+        "hash_scheme")
+
+    # Values of optional meta properties absent from older caches
+    _optional_meta_defaults = {
+        "compression": NO_COMPRESSION, "delta_depth": 0,
+        "hash_scheme": LEGACY_HASH_SCHEME}
+
+    # Listing of item properties for serialization purposes
+    _item_properties = ("meta", "tags", "type")
+
+    # Artifacts are created by the million, so they have no __dict__.
+    # Every attribute, including those only backends set, is listed here.
+    __slots__ = (
+        "item", "_antecedents", "_dependency_hash", "_creation_time",
+        "_definition_hash", "_specific_hash", "_content_hash",
+        "_pipeline_stage", "_config", "_loaded_from_cache",
+        "_serialization_type", "_compression", "_compression_dictionary",
+        "_chunk_manifest", "_delta_base", "_delta_depth", "_partitions",
+        "_partition_artifacts", "_recorded_in_run", "_hash_scheme",
+        "_inline_payload",
+        "_pack_location", "_payload_key", "_payload_written",
+        "_stream_opener", "_loaded_from_local_cache",
+        "_loaded_from_s3_cache", "_remotely_produced")
+
     def __init__(self,
                  pipeline_stage_config,
                  item=None,
-                 serialization_type="json"):
+                 serialization_type=None,
+                 compression=None):
         # Item containing user meta, payload, and tags.
         # Item may be none, in which case the artifact is not yet
         # fully loaded, or has not yet been generated.
@@ -56,6 +99,10 @@ class Artifact(object):
         # artifact types
         self._specific_hash = None
 
+        # Digest of the serialized payload, by which content addressed
+        # backends store it
+        self._content_hash = None
+
         # Name of the pipeline stage that produced this artifact
         self._pipeline_stage = pipeline_stage_config.name
 
@@ -65,18 +112,54 @@ class Artifact(object):
         # Set when an artifact is loaded from cache rather than generated freshly
         self._loaded_from_cache = False
 
+        # Serialization type of the payload. If None, the type configured
+        # by the pipeline stage for the item's type is used
         self._serialization_type = serialization_type
 
-        # Listing of meta properties for serialization purposes
-        self._meta_properties = [
-            "antecedents", "creation_time", "definition_hash",
-            "specific_hash", "dependency_hash",
-            "pipeline_stage", "serialization_type"]
+        # Codec compressing the serialized payload. If None, the codec
+        # configured by the pipeline stage for the item's type is used
+        self._compression = compression
+
+        # Digest of the dictionary the payload was compressed with, if any
+        self._compression_dictionary = None
+
+        # Sizes and digests of the chunks of a payload stored in chunks
+        self._chunk_manifest = None
+
+        # Uid of the artifact the payload is stored as a delta against,
+        # and the number of deltas from a fully stored payload
+        self._delta_base = None
+        self._delta_depth = 0
+
+        # Uids of the partitions of a partitioned artifact, which are
+        # stored and hashed independently, and the partitions themselves
+        self._partitions = None
+        self._partition_artifacts = None
 
-        # Listing of item properties for serialization purposes
-        self._item_properties = [
-            "meta", "tags", "type"
-        ]
+        # Whether the artifact is recorded as an output of its stage run.
+        # Partitions are found through the artifact they belong to.
+        self._recorded_in_run = True
+
+        # Name of the hash scheme of the artifact's hashes. If None, the
+        # scheme of the backend saving or loading the artifact is used.
+        self._hash_scheme = None
+
+        # Where backends found the serialized payload: inline in the
+        # metadata, within a pack file, or under an object key
+        self._inline_payload = None
+        self._pack_location = None
+        self._payload_key = None
+
+        # Set when the payload was streamed to the backend through an
+        # ArtifactWriter, and the function opening it for reading back
+        self._payload_written = False
+        self._stream_opener = None
+
+        # Which cache the artifact was loaded from, or whether it was
+        # produced by a remote executor
+        self._loaded_from_local_cache = False
+        self._loaded_from_s3_cache = False
+        self._remotely_produced = False
 
         self._process_stage_definition(pipeline_stage_config)
 
@@ -85,18 +168,51 @@ class Artifact(object):
         Populate relevant artifact fields given stage definition dict
         """
         self._definition_hash = pipeline_stage_config.hash()
-        
-        # We'll hash the stage definition to check if it's changed
-        ignore = ['parent_class']
-        props = {k: getattr(pipeline_stage_config, k)
-                 for k in dir(pipeline_stage_config)
-                 if not k.startswith('__')
-                 and not inspect.ismethod(getattr(pipeline_stage_config, k))
-                 and k not in ignore}
-        h = hashlib.md5()
-        stage_json = json.dumps(props, sort_keys=True)
-        h.update(str(stage_json).encode('utf-8'))
-        self._definition_hash = str(h.hexdigest())
+
+    @staticmethod
+    def partitioned(pipeline_stage_config, partitions, item_type=None,
+                    serialization_type=None, compression=None):
+        """
+        Returns an artifact made of partitions, given as payloads or as
+        artifacts, which are stored and hashed independently. Its payload
+        is the list of the partitions' payloads.
+        """
+        partition_artifacts = []
+        for partition in partitions:
+            if not isinstance(partition, Artifact):
+                partition = Artifact(pipeline_stage_config,
+                                     Item(partition, type=item_type),
+                                     serialization_type=serialization_type,
+                                     compression=compression)
+                partition._recorded_in_run = False
+            partition_artifacts.append(partition)
+        artifact = Artifact(pipeline_stage_config, Item(None, type=item_type))
+        artifact.set_partition_artifacts(partition_artifacts)
+        return artifact
+
+    @property
+    def is_partitioned(self):
+        return self._partitions is not None or \
+            self._partition_artifacts is not None
+
+    def set_partition_artifacts(self, partition_artifacts):
+        """
+        Sets the partitions of a partitioned artifact, whose payload is
+        then loaded from them
+        """
+        self._partition_artifacts = list(partition_artifacts)
+        self.item.lazy_payload(
+            lambda: [partition.item.payload
+                     for partition in self._partition_artifacts])
+
+    def use_hash_scheme(self, scheme):
+        """
+        Hashes the stage definition with the given scheme, unless the
+        artifact's scheme is settled already
+        """
+        if self._hash_scheme is None:
+            self._hash_scheme = scheme.name
+            self._definition_hash = self._config.hash(scheme)
 
     def get_uid(self):
         """
@@ -110,8 +226,11 @@ class Artifact(object):
         Convert relevant internal object properties
         to a dictionary for serialization
         """
+        self._resolve_serialization_type()
+        self._resolve_compression()
+        self._resolve_hash_scheme()
         d = {}
-        for prop in self._meta_properties:
+        for prop in self._meta_properties + self._optional_meta_properties:
             value = getattr(self, "_" + prop)
             d[prop] = value
         d['item'] = {}
@@ -136,6 +255,9 @@ class Artifact(object):
                     property=prop)
             else:
                 setattr(self, "_" + prop, d[prop])
+        for prop in self._optional_meta_properties:
+            setattr(self, "_" + prop,
+                    d.get(prop, self._optional_meta_defaults.get(prop)))
 
         if 'item' not in d:
             return
@@ -150,53 +272,116 @@ class Artifact(object):
             else:
                 setattr(self.item, prop, d['item'][prop])
 
-    def serialize_payload(self):
-        if self._serialization_type == "json":
-            return json.dumps(self.item.payload)
-        if self._serialization_type == "string":
-            return self.item.payload
-        if self._serialization_type == "bytestream":
-            raise NotImplementedError
-        raise ArtifactUnknownSerializationTypeError(
-            stage=self._stage,
-            stype=self._serialization_type)
+    def _resolve_serialization_type(self):
+        """
+        Choose the serialization type configured by the producing stage,
+        unless one was given explicitly or the payload is a file reference
+        """
+        if self._serialization_type is None:
+            if self.item.payload_loaded and \
+               isinstance(self.item.payload, FileReference):
+                self._serialization_type = FILE_REFERENCE_SERIALIZATION_TYPE
+            else:
+                self._serialization_type = serialization_type_for(
+                    self._config, self.item.type)
+        return self._serialization_type
 
-    @staticmethod
-    def decode_stringlike(stringlike):
-        if isinstance(stringlike, bytes):
-            return stringlike.decode('utf-8')
-        if isinstance(stringlike, str):
-            return stringlike
-        return None
+    def _resolve_compression(self):
+        """
+        Choose the codec configured by the producing stage, unless one
+        was given explicitly
+        """
+        if self._compression is None:
+            self._compression = compression_for(self._config, self.item.type)
+        return self._compression
 
-    def load_payload(self, payload):
-        s = self.decode_stringlike(payload)
-
-        if self._serialization_type == "json":
-            self.item.payload = json.loads(s)
-        elif self._serialization_type == "string":
-            self.item.payload = s
-        elif self._serialization_type == "bytestream":
-            raise NotImplementedError
-        else:
+    def _resolve_hash_scheme(self):
+        """
+        Settle the scheme of the definition hash, unless a backend has
+        """
+        if self._hash_scheme is None:
+            self._hash_scheme = hash_scheme_of(self._definition_hash)
+        return self._hash_scheme
+
+    def _codec(self):
+        codec = get_codec(self._resolve_compression())
+        if codec is None:
+            raise ArtifactUnknownCompressionError(
+                stage=self._pipeline_stage,
+                compression=self._compression)
+        return codec
+
+    def _serializer(self):
+        serializer = get_serializer(self._resolve_serialization_type())
+        if serializer is None:
             raise ArtifactUnknownSerializationTypeError(
-                stage=self._stage,
+                stage=self._pipeline_stage,
                 stype=self._serialization_type)
+        return serializer
+
+    def serialize_payload_chunks(self):
+        """
+        Serialize the payload to a list of buffers, to be stored back to back
+        """
+        return self._serializer().serialize(self.item.payload)
+
+    def serialize_payload(self):
+        return join_chunks(self.serialize_payload_chunks())
+
+    decode_stringlike = staticmethod(decode_stringlike)
+
+    def deserialize_payload(self, payload):
+        return self._serializer().deserialize(payload)
+
+    def deserialize_payload_file(self, path):
+        """
+        Deserialize the payload from a file holding exactly its bytes
+        """
+        return self._serializer().deserialize_file(path)
+
+    def load_payload(self, payload):
+        self.item.payload = self.deserialize_payload(payload)
+
+    def load_payload_file(self, path):
+        self.item.payload = self.deserialize_payload_file(path)
+
+    def open(self):
+        """
+        Returns a readable, seekable binary stream of the serialized
+        payload. Artifacts loaded from a backend stream it from there,
+        fetching only what is read.
+        """
+        if self._stream_opener is not None:
+            return self._stream_opener()
+        return io.BytesIO(self.serialize_payload())
+
+    def prefetch(self):
+        """
+        Resolve a lazily loaded payload now rather than on first access
+        """
+        self.item.payload
+        return self
+
+    def release(self):
+        """
+        Drop a lazily loaded payload, to be loaded again on next access
+        """
+        self.item.release_payload()
 
     @staticmethod
-    def dependency_hash(input_artifacts):
+    def dependency_hash(input_artifacts, scheme=None):
         """
         Generate an idempotent dependency hash representing the unique
         set of input artifacts provided.
 
         We do this by generating unique IDs for all input artifacts,
-        then sorting those IDs and hashing their concatenation
+        grouping them by the stage that produced them and hashing them
+        as a Merkle tree over sorted IDs, so the order of the inputs
+        doesn't matter. See DependencyHasher to maintain the hash as
+        inputs are added and removed.
         """
-        uids = map(lambda x: x.get_uid(), input_artifacts)
-        h = hashlib.md5()
-        for u in uids:
-            h.update(u.encode('utf-8'))
-        return str(h.hexdigest())
+        return dependency_digest(((x._pipeline_stage, x.get_uid())
+                                  for x in input_artifacts), scheme)
 
     @staticmethod
     def generate_uid(_specific_hash, _dependency_hash, _definition_hash):
@@ -210,9 +395,216 @@ class Artifact(object):
             specific_hash + "_" + \
             dependency_hash
 
+    @staticmethod
+    def split_uid(uid):
+        """
+        Returns the (specific hash, dependency hash, definition hash)
+        a uid was generated from
+        """
+        definition_hash, rest = uid.split("_", 1)
+        specific_hash, dependency_hash = rest.rsplit("_", 1)
+        return specific_hash or None, dependency_hash or None, definition_hash
+
 class Item(object):
-    def __init__(self, payload, meta={}, tags=[], type=None):
+    __slots__ = ("_payload_loader", "_payload", "_payload_loaded",
+                 "meta", "tags", "type")
+
+    def __init__(self, payload, meta=None, tags=None, type=None):
+        # Function loading the payload on first access, if it's lazy
+        self._payload_loader = None
         self.payload = payload
-        self.meta = meta
-        self.tags = tags
+        self.meta = {} if meta is None else meta
+        self.tags = [] if tags is None else tags
         self.type = type
+
+    @property
+    def payload(self):
+        if not self._payload_loaded:
+            self._payload = self._payload_loader()
+            self._payload_loaded = True
+        return self._payload
+
+    @payload.setter
+    def payload(self, payload):
+        self._payload_loader = None
+        self._payload = payload
+        self._payload_loaded = True
+
+    @property
+    def payload_loaded(self):
+        return self._payload_loaded
+
+    def lazy_payload(self, loader):
+        """
+        Have the payload loaded by calling loader() on first access
+        """
+        self._payload_loader = loader
+        self._payload = None
+        self._payload_loaded = False
+
+    def release_payload(self):
+        """
+        Drop a lazily loaded payload. Payloads without a loader are kept,
+        as they couldn't be loaded again.
+        """
+        if self._payload_loader is not None:
+            self._payload = None
+            self._payload_loaded = False
+
+
+class ArtifactBatch(object):
+    """
+    The metadata of many artifacts, stored column by column rather than
+    as Artifact objects, for bulk operations such as dependency hashing,
+    sorting and filtering. Creation times are kept in an array of doubles,
+    NaN standing for none, and item types and pipeline stages as indices
+    into the distinct values of the batch.
+    """
+    __slots__ = ("specific_hashes", "dependency_hashes", "definition_hashes",
+                 "creation_times", "_type_codes", "_types", "_type_index",
+                 "_stage_codes", "_stages", "_stage_index")
+
+    def __init__(self):
+        self.specific_hashes = []
+        self.dependency_hashes = []
+        self.definition_hashes = []
+        self.creation_times = array.array('d')
+        self._type_codes = array.array('I')
+        self._types = []
+        self._type_index = {}
+        self._stage_codes = array.array('I')
+        self._stages = []
+        self._stage_index = {}
+
+    @staticmethod
+    def _code(values, index, value):
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(values)
+            values.append(value)
+        return code
+
+    @staticmethod
+    def from_artifacts(artifacts):
+        batch = ArtifactBatch()
+        for artifact in artifacts:
+            batch.append(artifact._specific_hash, artifact._dependency_hash,
+                         artifact._definition_hash, artifact._creation_time,
+                         artifact.item.type, artifact._pipeline_stage)
+        return batch
+
+    @staticmethod
+    def from_meta(entries):
+        """
+        Builds a batch from artifact metadata, as returned by
+        Artifact.meta_to_dict()
+        """
+        batch = ArtifactBatch()
+        for entry in entries:
+            batch.append(entry.get('specific_hash'),
+                         entry.get('dependency_hash'),
+                         entry['definition_hash'],
+                         entry.get('creation_time'),
+                         (entry.get('item') or {}).get('type'),
+                         entry.get('pipeline_stage'))
+        return batch
+
+    def append(self, specific_hash, dependency_hash, definition_hash,
+               creation_time=None, item_type=None, pipeline_stage=None):
+        self.specific_hashes.append(specific_hash)
+        self.dependency_hashes.append(dependency_hash)
+        self.definition_hashes.append(definition_hash)
+        self.creation_times.append(
+            math.nan if creation_time is None else creation_time)
+        self._type_codes.append(
+            self._code(self._types, self._type_index, item_type))
+        self._stage_codes.append(
+            self._code(self._stages, self._stage_index, pipeline_stage))
+
+    def __len__(self):
+        return len(self.definition_hashes)
+
+    def uid(self, index):
+        return Artifact.generate_uid(self.specific_hashes[index],
+                                     self.dependency_hashes[index],
+                                     self.definition_hashes[index])
+
+    def uids(self):
+        return [self.uid(index) for index in range(len(self))]
+
+    def creation_time(self, index):
+        value = self.creation_times[index]
+        return None if math.isnan(value) else value
+
+    def item_type(self, index):
+        return self._types[self._type_codes[index]]
+
+    def pipeline_stage(self, index):
+        return self._stages[self._stage_codes[index]]
+
+    def pipeline_stages(self):
+        return [self._stages[code] for code in self._stage_codes]
+
+    def dependency_hash(self, scheme=None):
+        """
+        The dependency hash of the batch's artifacts, equal to
+        Artifact.dependency_hash() of them
+        """
+        return dependency_digest(zip(self.pipeline_stages(), self.uids()),
+                                 scheme)
+
+    def argsort(self, reverse=False):
+        """
+        Returns the indices of the artifacts ordered by creation time,
+        artifacts without one first
+        """
+        times = self.creation_times
+        return sorted(range(len(self)),
+                      key=lambda i: 0 if math.isnan(times[i]) else times[i],
+                      reverse=reverse)
+
+    def where(self, item_type=None, created_after=None, created_before=None):
+        """
+        Returns the indices of the artifacts of the given item type, if
+        any, created within the given bounds
+        """
+        code = None
+        if item_type is not None:
+            code = self._type_index.get(item_type)
+            if code is None:
+                return []
+        result = []
+        for index in range(len(self)):
+            if code is not None and self._type_codes[index] != code:
+                continue
+            time = self.creation_times[index]
+            if created_after is not None and \
+               not (time > created_after):
+                continue
+            if created_before is not None and \
+               not (time < created_before):
+                continue
+            result.append(index)
+        return result
+
+    def take(self, indices):
+        """
+        Returns a new batch of the artifacts at the given indices
+        """
+        batch = ArtifactBatch()
+        for index in indices:
+            batch.append(self.specific_hashes[index],
+                         self.dependency_hashes[index],
+                         self.definition_hashes[index],
+                         self.creation_time(index),
+                         self.item_type(index),
+                         self.pipeline_stage(index))
+        return batch
+
+    def sorted(self, reverse=False):
+        return self.take(self.argsort(reverse=reverse))
+
+    def filter(self, item_type=None, created_after=None,
+               created_before=None):
+        return self.take(self.where(item_type, created_after,
+                                    created_before))
@@ -20,27 +20,77 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import io
 import os
 import os.path
 import copy
+import base64
+import functools
+import shutil
 from collections import OrderedDict
 from decimal import *
 import distutils.dir_util
-import json
 import threading
+from concurrent.futures import ThreadPoolExecutor
 import boto3
 import botocore
 import time
-
-from pipetree import settings
-from pipetree.utils import attach_config_to_object
-from pipetree.exceptions import ArtifactMissingPayloadError
-from pipetree.artifact import Artifact
+import uuid
+
+from pipetree import settings, metacodec
+from pipetree.utils import attach_config_to_object, map_file,\
+    config_for_item_type
+from pipetree.exceptions import ArtifactMissingPayloadError,\
+    ArtifactDeltaBaseMissingError, ArtifactPartitionMissingError,\
+    UnknownHashSchemeError
+from pipetree.artifact import Artifact, ArtifactBatch, Item
+from pipetree.serializers import join_chunks
+from pipetree.compression import NO_COMPRESSION, train_dictionary
+from pipetree.streams import open_range_stream, DEFAULT_READ_AHEAD
+from pipetree.chunking import split_chunks, make_manifest, chunk_ranges,\
+    range_length
+from pipetree.delta import encode_delta, apply_delta, DEFAULT_BLOCK_SIZE
+from pipetree.hashring import ConsistentHashRing
+from pipetree.packs import PackStore
+from pipetree.sinks import ArtifactWriter, FileSink, S3MultipartSink,\
+    buffered_artifact_writer
+from pipetree.hashing import content_digest, content_digests,\
+    HashingWriter, HASH_SCHEMES, LEGACY_HASH_SCHEME, get_hash_scheme,\
+    hash_scheme_of, partition_digest
 
 STAGE_COMPLETE = 'complete'
 STAGE_IN_PROGRESS = 'in_progress'
 STAGE_DOES_NOT_EXIST = 'does_not_exist'
 
+# Storage directories and key prefixes shared by all stages. Stage names
+# must be pythonic, so these cannot collide with a stage's directory.
+PACKS_DIR = '.packs'
+OBJECTS_DIR = '.objects'
+TMP_DIR = '.tmp'
+DICTS_DIR = '.dicts'
+STREAMS_DIR = '.streams'
+
+# Number of payloads, and their maximum size, sampled per stage to train
+# a compression dictionary
+DICTIONARY_SAMPLES = 100
+DICTIONARY_SAMPLE_MAX = 128 * 1024
+
+# Number of artifacts whose metadata is written together by save_artifacts
+SAVE_BATCH_SIZE = 256
+
+
+def _require_payload(artifact):
+    """
+    Raises unless an artifact has a payload to be saved, had its payload
+    stored through an ArtifactWriter, or is made of partitions
+    """
+    if artifact._payload_written or \
+       artifact.is_partitioned:
+        return
+    if artifact.item is None or artifact.item.payload is None:
+        raise ArtifactMissingPayloadError(stage=artifact._pipeline_stage)
+
+
 class ArtifactBackend(object):
     def __init__(self, **kwargs):
         config = copy.copy(self.DEFAULTS)
@@ -48,24 +98,252 @@ class ArtifactBackend(object):
         self._validate_config()
         self._config = kwargs
         attach_config_to_object(self, config)
+        self._hash_scheme = get_hash_scheme(
+            config.get('hash_scheme', LEGACY_HASH_SCHEME))
+        if self._hash_scheme is None:
+            raise UnknownHashSchemeError(name=config['hash_scheme'],
+                                         schemes=sorted(HASH_SCHEMES))
+        # Fail now rather than on the first save if it's unavailable
+        self._hash_scheme.new()
+        self._metadata_format = metacodec.metadata_format_for(
+            config.get('metadata_format', metacodec.JSON))
+
+    def definition_hash(self, stage_config):
+        """
+        Returns the hash of a stage definition under the backend's scheme
+        """
+        return stage_config.hash(self._hash_scheme)
+
+    def dependency_hash(self, input_artifacts):
+        """
+        Returns the dependency hash of input artifacts under the
+        backend's scheme
+        """
+        return Artifact.dependency_hash(input_artifacts, self._hash_scheme)
+
+    def partition_dependency_hash(self, partition):
+        """
+        Returns the dependency hash of a stage run over one partition
+        """
+        return partition_digest(self.dependency_hash([partition]),
+                                self._hash_scheme)
 
     def _validate_config(self):
         raise NotImplementedError
 
-    def load_artifact(self, artifact):
+    def load_artifact(self, artifact, lazy=False):
         """
         Returns a fully instantiated artifact with an Item containing
         payload and metadata. This occurs
         iff one is found matching the provided hashes/properties
         of the given artifact object. Otherwise returns None.
+
+        If lazy, only metadata is loaded, and the payload is fetched on
+        first access to it.
         """
         cached_artifact = self._find_cached_artifact(artifact)
         if cached_artifact is None:
             return None
-        else:
-            cached_artifact.load_payload(self._get_cached_artifact_payload(
-                cached_artifact))
+        if cached_artifact._partitions is not None:
+            cached_artifact.set_partition_artifacts(
+                self._load_partitions(cached_artifact, lazy))
             return cached_artifact
+        if lazy:
+            cached_artifact.item.lazy_payload(
+                lambda: self._read_payload(cached_artifact))
+        else:
+            cached_artifact.item.payload = self._read_payload(cached_artifact)
+        cached_artifact._stream_opener = \
+            lambda: self._open_payload(cached_artifact)
+        return cached_artifact
+
+    def _read_payload(self, artifact):
+        """
+        Reads and deserializes the payload of a cached artifact
+        """
+        path = self._serialized_payload_path(artifact)
+        if path is not None:
+            # Payloads stored as whole files may be loaded lazily
+            return artifact.deserialize_payload_file(path)
+        return artifact.deserialize_payload(self._read_serialized(artifact))
+
+    def _serialized_payload_path(self, artifact):
+        """
+        Returns the path of a local file holding exactly the serialized
+        payload of a cached artifact, i.e. one stored uncompressed and in
+        full, or None
+        """
+        if artifact._inline_payload is not None or \
+           artifact._delta_base is not None or \
+           artifact._resolve_compression() != NO_COMPRESSION:
+            return None
+        return self._get_cached_artifact_payload_path(artifact)
+
+    def _read_serialized(self, artifact):
+        """
+        Returns the serialized payload of a cached artifact, decompressing
+        it and applying it to its delta base as needed
+        """
+        data = artifact._inline_payload
+        if data is None:
+            # Small payloads are stored within the metadata record itself
+            data = self._get_cached_artifact_payload(artifact)
+        data = self._decompress_payload(artifact, data)
+        if artifact._delta_base is not None:
+            data = apply_delta(
+                self._read_serialized(self._delta_base_artifact(artifact)),
+                data)
+        return data
+
+    def _delta_base_artifact(self, artifact):
+        """
+        Returns the cached artifact whose payload an artifact's payload is
+        stored as a delta against
+        """
+        cached_base = self._find_cached_artifact(
+            self._related_artifact(artifact, artifact._delta_base))
+        if cached_base is None:
+            raise ArtifactDeltaBaseMissingError(stage=artifact._pipeline_stage,
+                                                base=artifact._delta_base)
+        return cached_base
+
+    def _load_partitions(self, artifact, lazy=False):
+        """
+        Loads the partitions of a cached partitioned artifact
+        """
+        partitions = []
+        for uid in artifact._partitions:
+            partition = self.load_artifact(
+                self._related_artifact(artifact, uid), lazy)
+            if partition is None:
+                raise ArtifactPartitionMissingError(
+                    stage=artifact._pipeline_stage, partition=uid)
+            partitions.append(partition)
+        return partitions
+
+    @staticmethod
+    def _related_artifact(artifact, uid):
+        """
+        Returns an artifact to query for the artifact with the given uid,
+        of the same stage and item type as another
+        """
+        related = Artifact(artifact._config,
+                           Item(None, type=artifact.item.type))
+        related._specific_hash, related._dependency_hash, \
+            related._definition_hash = Artifact.split_uid(uid)
+        related._hash_scheme = hash_scheme_of(related._definition_hash)
+        return related
+
+    def _save_partitions(self, artifacts):
+        """
+        Saves the partitions of partitioned artifacts which aren't stored
+        yet, and records their uids as the artifacts' manifests
+        """
+        pending = [partition for artifact in artifacts
+                   if artifact._partition_artifacts is not None
+                   for partition in artifact._partition_artifacts
+                   if partition._content_hash is None]
+        if len(pending) > 0:
+            self.save_artifacts(pending)
+        for artifact in artifacts:
+            if artifact._partition_artifacts is None:
+                continue
+            artifact._partitions = [partition.get_uid() for partition
+                                    in artifact._partition_artifacts]
+            if artifact._specific_hash is None:
+                # Unlike a dependency hash, this depends on partition order
+                artifact._specific_hash = content_digest(
+                    [uid.encode('utf-8') for uid in artifact._partitions],
+                    self._hash_scheme)
+
+    def _serialize_payload(self, artifact):
+        """
+        Serializes, delta encodes and compresses the payload of an
+        artifact to chunks.
+
+        Artifacts without a specific hash are identified by the digest of
+        their serialized payload, however it's stored.
+        """
+        serialized = artifact.serialize_payload_chunks()
+        chunks = self._delta_encode(artifact, serialized)
+        codec = artifact._codec()
+        dictionary = None
+        if codec.supports_dictionaries:
+            dictionary = self._compression_dictionary_for(artifact, chunks)
+        stored = codec.compress(chunks, dictionary)
+        if artifact._specific_hash is None and stored is not serialized:
+            # Otherwise the digest of the stored bytes is the same
+            artifact._specific_hash = content_digest(serialized,
+                                                     self._hash_scheme)
+        return stored
+
+    def _delta_encode(self, artifact, chunks):
+        """
+        Returns serialized payload chunks as a delta against a previous
+        version of the artifact, recording its base on the artifact.
+        Backends supporting delta encoding may override this.
+        """
+        return chunks
+
+    def _decompress_payload(self, artifact, data):
+        dictionary = None
+        if artifact._compression_dictionary is not None:
+            dictionary = self._get_compression_dictionary(
+                artifact._compression_dictionary)
+        return artifact._codec().decompress(data, dictionary)
+
+    def _compression_dictionary_for(self, artifact, chunks):
+        """
+        Returns the compression dictionary to compress an artifact's
+        serialized payload with, recording its digest on the artifact.
+        Backends supporting dictionaries may override this.
+        """
+        return None
+
+    def _get_compression_dictionary(self, digest):
+        """
+        Returns the compression dictionary with the given digest
+        """
+        raise NotImplementedError
+
+    def load_artifacts(self, artifacts, lazy=False):
+        """
+        Loads a list of artifacts, returning them in the same order.
+        Backends able to perform I/O in parallel may override this.
+        """
+        return [self.load_artifact(artifact, lazy)
+                for artifact in artifacts]
+
+    def save_artifacts(self, artifacts):
+        """
+        Saves a list of artifacts.
+        Backends able to perform I/O in parallel may override this.
+        """
+        for artifact in artifacts:
+            self.save_artifact(artifact)
+
+    def release_payloads(self, artifacts):
+        """
+        Has saved artifacts drop their payloads, loading them back from
+        the cache on next access
+        """
+        for artifact in artifacts:
+            if artifact.is_partitioned or not artifact.item.payload_loaded:
+                continue
+            artifact.item.lazy_payload(
+                functools.partial(self._read_payload, artifact))
+
+    def open_artifact_writer(self, artifact):
+        """
+        Returns an ArtifactWriter to which a stage writes an artifact's
+        serialized payload, rather than materializing it as the item's
+        payload. Once the writer is closed, the artifact is saved without
+        serializing it again.
+
+        Backends able to stream payloads to storage override this; by
+        default the payload is buffered in memory.
+        """
+        return buffered_artifact_writer(artifact)
 
     def save_artifact(self, artifact):
         """
@@ -117,6 +395,94 @@ class ArtifactBackend(object):
         """
         raise NotImplementedError
 
+    def _get_cached_artifact_payload_path(self, artifact):
+        """
+        Returns the path of a local file holding exactly the payload of a
+        cached artifact, or None if it isn't stored as such a file.
+        """
+        return None
+
+    def open_artifact(self, artifact):
+        """
+        Returns a readable, seekable binary stream of a cached artifact's
+        serialized payload, or None if the artifact isn't cached.
+        Only the parts of the payload which are read are fetched.
+        """
+        cached_artifact = self._find_cached_artifact(artifact)
+        if cached_artifact is None:
+            return None
+        return self._open_payload(cached_artifact)
+
+    def _open_payload(self, artifact):
+        """
+        Opens a stream of a cached artifact's serialized payload
+        """
+        if artifact._resolve_compression() != NO_COMPRESSION or \
+           artifact._delta_base is not None:
+            # Compressed and delta encoded payloads can't be read from an
+            # arbitrary offset
+            return io.BytesIO(self._read_serialized(artifact))
+        if artifact._inline_payload is not None:
+            return io.BytesIO(artifact._inline_payload)
+        path = self._get_cached_artifact_payload_path(artifact)
+        if path is not None:
+            return open(path, 'rb')
+        return open_range_stream(
+            lambda offset, length: self._get_cached_artifact_payload_range(
+                artifact, offset, length),
+            self._get_cached_artifact_payload_size(artifact),
+            self.read_ahead)
+
+    def load_artifact_columns(self, artifact, columns):
+        """
+        Returns only the given columns of a cached artifact's tabular
+        payload, or None if the artifact isn't cached. Arrow tables are
+        memory mapped from local files, or read from streams fetching
+        only the bytes of those columns.
+        """
+        cached_artifact = self._find_cached_artifact(artifact)
+        if cached_artifact is None:
+            return None
+        serializer = cached_artifact._serializer()
+        path = self._serialized_payload_path(cached_artifact)
+        if path is not None:
+            return serializer.read_columns(path, columns)
+        with self._open_payload(cached_artifact) as stream:
+            return serializer.read_columns(stream, columns)
+
+    def _get_cached_artifact_payload_size(self, artifact):
+        """
+        Returns the size of a cached artifact's stored payload.
+        Backends able to find it without reading the payload may override
+        this.
+        """
+        return len(self._get_cached_artifact_payload(artifact))
+
+    def read_artifact_range(self, artifact, offset, length=None):
+        """
+        Returns up to `length` bytes of a cached artifact's stored payload,
+        starting at `offset`, or None if the artifact isn't cached.
+        Bytes are those stored, i.e. after serialization and compression.
+        """
+        cached_artifact = self._find_cached_artifact(artifact)
+        if cached_artifact is None:
+            return None
+        return self._get_cached_artifact_payload_range(cached_artifact,
+                                                       offset, length)
+
+    def _get_cached_artifact_payload_range(self, artifact, offset, length):
+        """
+        Returns a byte range of a cached artifact's stored payload.
+        Backends able to fetch only the requested bytes may override this.
+        """
+        if artifact._inline_payload is not None:
+            payload = memoryview(artifact._inline_payload)
+        else:
+            payload = self._get_cached_artifact_payload(artifact)
+        if length is None:
+            return payload[offset:]
+        return payload[offset:offset + length]
+
     def _get_cached_artifact_metadata(self, artifact):
         """
         Returns the artifact metadata for a given artifact, assuming that it
@@ -130,27 +496,141 @@ class ArtifactBackend(object):
         """
         raise NotImplementedError
 
+    def delete_artifact(self, artifact):
+        """
+        Removes an artifact from the cache. Returns whether it was found.
+        """
+        raise NotImplementedError
+
+    def collect_garbage(self):
+        """
+        Removes stored payloads that no artifact references.
+        Returns the number of payloads removed.
+        """
+        raise NotImplementedError
+
+    def repack(self):
+        """
+        Consolidates small loose payloads into pack files.
+        Returns the number of payloads packed.
+        """
+        raise NotImplementedError
+
+    def start_repacker(self, interval=60.0):
+        """
+        Runs repack() periodically in a background thread
+        """
+        if getattr(self, '_repacker', None) is not None:
+            return
+        self._repacker_stop = threading.Event()
+
+        def run():
+            while not self._repacker_stop.wait(interval):
+                self.repack()
+
+        self._repacker = threading.Thread(target=run, daemon=True)
+        self._repacker.start()
+
+    def stop_repacker(self):
+        if getattr(self, '_repacker', None) is None:
+            return
+        self._repacker_stop.set()
+        self._repacker.join()
+        self._repacker = None
+
 
 class LocalArtifactBackend(ArtifactBackend):
     """
     Provide a local cache layer for artifacts.
     Intended to be composed with S3ArtifactBackend to provide local storage.
 
-    Utilizes a global internal lock to ensure serial access to files.
+    `path` may be a single cache root or a list of roots, e.g. one per disk.
+    Payloads are striped across roots by consistent hashing of their uid,
+    while metadata is kept centrally under the first root.
+
+    Payloads smaller than `inline_threshold` bytes are stored inline within
+    the shared metadata file. Payloads smaller than `pack_threshold` bytes
+    are appended into pack files under each root rather than written out
+    as one file apiece.
+
+    With `content_addressed` set, payloads are stored once per distinct
+    content digest under .objects/, along with the uids referencing them.
+    collect_garbage() removes objects no uid references, once they are
+    older than `gc_grace_period` seconds.
+
+    With `chunk_size` set, larger payloads are split into chunks of that
+    many bytes, stored as content addressed objects and listed by digest
+    in a manifest within the artifact's metadata. Chunks are written and
+    read with `transfer_workers` threads, and byte ranges are read from
+    the chunks covering them alone.
+
+    Payloads written through open_artifact_writer() are streamed to a
+    temporary file and stored as content addressed objects.
+
+    Stages setting `delta_encoding` (for all or some item types) have
+    payloads stored as deltas against the most recent artifact of the same
+    stage and item type, in blocks of `delta_block_size` bytes. Once a
+    chain of deltas reaches `delta_max_depth`, the next payload is stored
+    in full as a new base. Deleting a base stores the artifacts delta
+    encoded against it in full.
+
+    `hash_scheme` names the hash function of the stage definition,
+    dependency and content hashes of the artifacts the backend saves:
+    "md5", which older caches use, "blake2b", or "xxh3" if the xxhash
+    package is installed. Hashes other than MD5 start with a prefix naming
+    their scheme, so artifacts of any scheme resolve by their uid. Stage
+    runs are looked up under the backend's scheme alone, so changing it
+    runs stages again.
+
+    `metadata_format` is the encoding metadata files are written in:
+    "json", as older versions wrote, or "binary", a compact versioned
+    encoding which needs the msgpack package. Files are read in either,
+    so a cache may be switched between them. Without msgpack, JSON is
+    written.
+
+    Utilizes a global internal lock to ensure serial access to metadata
+    files, and a lock per root to ensure serial access to each disk.
     Since the majority of execution time is spent generating individual
     artifacts, this shouldn't impact performance tremendously at the moment.
     """
     DEFAULTS = {
         "path": "~/.pipetree/local_cache/",
-        "metadata_file": "pipeline.meta"
+        "metadata_file": "pipeline.meta",
+        "inline_threshold": 0,
+        "pack_threshold": 0,
+        "pack_size": 64 * 1024 * 1024,
+        "content_addressed": False,
+        "chunk_size": 0,
+        "transfer_workers": 8,
+        "read_ahead": DEFAULT_READ_AHEAD,
+        "delta_block_size": DEFAULT_BLOCK_SIZE,
+        "delta_max_depth": 8,
+        "hash_scheme": LEGACY_HASH_SCHEME,
+        "metadata_format": metacodec.JSON,
+        "gc_grace_period": 3600
     }
 
     def __init__(self, path=DEFAULTS['path'], **kwargs):
         super().__init__(path=path, **kwargs)
-        if not os.path.exists(self.path):
-            distutils.dir_util.mkpath(self.path)
+        if isinstance(path, (list, tuple)):
+            self.paths = list(path)
+        else:
+            self.paths = [path]
+        self.path = self.paths[0]
+        for root in self.paths:
+            if not os.path.exists(root):
+                distutils.dir_util.mkpath(root)
+        self._ring = ConsistentHashRing(self.paths)
         self.cached_meta = {}
         self._write_lock = threading.Lock()
+        self._root_locks = {root: threading.Lock() for root in self.paths}
+        self._pack_stores = {root: PackStore(os.path.join(root, PACKS_DIR),
+                                             self.pack_size)
+                             for root in self.paths}
+        self._dictionary_lock = threading.Lock()
+        self._dictionaries = {}
+        self._stage_dictionaries = {}
+        self._dictionary_samples = {}
 
     def _validate_config(self):
         return True
@@ -173,6 +653,34 @@ class LocalArtifactBackend(ArtifactBackend):
         return os.path.join(self._relative_artifact_dir(artifact),
                             artifact.get_uid())
 
+    def _artifact_root(self, artifact):
+        """
+        Returns the cache root that the artifact's payload is placed on
+        """
+        return self._ring.get_node(artifact.get_uid())
+
+    def _artifact_payload_path(self, artifact):
+        """
+        Returns the absolute path of an artifact's payload, which is the
+        shared object for content addressed payloads.
+
+        Payloads that have not yet been moved onto their assigned root
+        (e.g. after a root was added) are found by probing the other roots.
+        """
+        object_path = self._find_object(artifact._content_hash)
+        if object_path is not None:
+            return object_path
+
+        relative_path = self._relative_artifact_path(artifact)
+        root = self._artifact_root(artifact)
+        path = os.path.join(root, relative_path)
+        if len(self.paths) > 1 and not os.path.exists(path):
+            for other in self.paths:
+                candidate = os.path.join(other, relative_path)
+                if other != root and os.path.exists(candidate):
+                    return candidate
+        return path
+
     def save_artifact(self, artifact):
         """
         Saves an artifact locally on disk.
@@ -182,22 +690,753 @@ class LocalArtifactBackend(ArtifactBackend):
          - dependency_hash
          - definition_hash
         """
-        # TODO: Check if the file exists. If it does, skip writing it out.
-        if artifact.item is None or artifact.item.payload is None:
-            raise ArtifactMissingPayloadError(stage=artifact._pipeline_stage)
+        artifact.use_hash_scheme(self._hash_scheme)
+        self._write_artifact_payload(artifact)
+        self._write_artifact_meta(artifact)
+        self._record_pipeline_stage_run_artifact(artifact)
 
-        distutils.dir_util.mkpath(os.path.join(
-            self.path,
-            self._relative_artifact_dir(artifact)))
+    def save_artifacts(self, artifacts):
+        """
+        Saves a list of artifacts, writing payloads to each root in parallel.
+
+        Artifacts are processed in batches: small payloads are hashed
+        together, and each metadata file is rewritten once per batch.
+        Larger payloads are serialized and stored one at a time per root,
+        so that only one of them is held serialized at once.
+        """
+        small_size = max(self.inline_threshold, self.pack_threshold)
+        for start in range(0, len(artifacts), SAVE_BATCH_SIZE):
+            batch = artifacts[start:start + SAVE_BATCH_SIZE]
+            for artifact in batch:
+                artifact.use_hash_scheme(self._hash_scheme)
+            self._save_partitions(batch)
+            stored = set(id(artifact) for artifact
+                         in self._adopt_stored_payloads(batch))
+            for artifact in batch:
+                if id(artifact) not in stored:
+                    _require_payload(artifact)
+
+            def store(artifact):
+                """
+                Stores a large payload, returning the chunks of a small
+                one to be stored with the rest of the batch
+                """
+                if id(artifact) in stored or artifact.is_partitioned:
+                    return None
+                if artifact._payload_written:
+                    self._store_written_payload(artifact)
+                    return None
+                artifact_chunks = self._serialize_payload(artifact)
+                if self._chunks_size(artifact_chunks) < small_size:
+                    return [join_chunks(artifact_chunks)]
+                self._store_payload(artifact, artifact_chunks)
+                return None
 
+            chunks = self._map_by_root(store, batch)
+            small = [artifact for artifact, artifact_chunks
+                     in zip(batch, chunks) if artifact_chunks is not None]
+            small_chunks = [artifact_chunks for artifact_chunks in chunks
+                            if artifact_chunks is not None]
+            del chunks
+
+            digests = content_digests([artifact_chunks[0] for artifact_chunks
+                                       in small_chunks], self._hash_scheme)
+            for artifact, digest in zip(small, digests):
+                self._set_content_hash(artifact, digest)
+            by_artifact = {id(artifact): artifact_chunks for artifact,
+                           artifact_chunks in zip(small, small_chunks)}
+            self._map_by_root(
+                lambda artifact: self._store_payload(
+                    artifact, by_artifact[id(artifact)],
+                    artifact._content_hash),
+                small)
+            self._write_artifacts_meta(batch)
+            self._record_pipeline_stage_run_artifacts(batch)
+
+    def load_artifacts(self, artifacts, lazy=False):
+        """
+        Loads a list of artifacts, reading payloads from each root in parallel.
+        """
+        if lazy:
+            # Only metadata is read, which is kept on the primary root
+            return super().load_artifacts(artifacts, lazy)
+        return self._map_by_root(
+            lambda artifact: self.load_artifact(artifact, lazy), artifacts)
+
+    def _map_by_root(self, fn, artifacts):
+        """
+        Applies fn to each artifact, running one worker per cache root so
+        that disks are accessed in parallel but each serially.
+        Returns results in the order of the given artifacts.
+        """
+        if len(self.paths) == 1 or len(artifacts) < 2:
+            return [fn(artifact) for artifact in artifacts]
+
+        by_root = OrderedDict()
+        for i, artifact in enumerate(artifacts):
+            by_root.setdefault(self._artifact_root(artifact), []).append(i)
+
+        results = [None] * len(artifacts)
+
+        def run(indices):
+            for i in indices:
+                results[i] = fn(artifacts[i])
+
+        with ThreadPoolExecutor(max_workers=len(by_root)) as pool:
+            for future in [pool.submit(run, indices)
+                           for indices in by_root.values()]:
+                future.result()
+        return results
+
+    def _write_artifact_payload(self, artifact):
+        """
+        Writes an artifact's payload, hashing its content on the way.
+        The content hash becomes the specific hash of artifacts that
+        don't already have one.
+        """
+        if len(self._adopt_stored_payloads([artifact])) > 0:
+            return
+        _require_payload(artifact)
+        if artifact.is_partitioned:
+            self._save_partitions([artifact])
+            return
+        if artifact._payload_written:
+            self._store_written_payload(artifact)
+            return
+
+        self._store_payload(artifact, self._serialize_payload(artifact))
+
+    def _adopt_stored_payloads(self, artifacts):
+        """
+        Has artifacts whose payloads aren't loaded, and which are already
+        stored under their uid, take on the stored payload rather than
+        loading theirs to store it again, e.g. unchanged source files.
+        Returns the artifacts which did.
+        """
+        adopted = []
+        item_metas = {}
+        for artifact in artifacts:
+            if artifact._payload_written or artifact.is_partitioned or \
+               artifact.item is None or artifact.item.payload_loaded:
+                continue
+            key = (artifact._pipeline_stage, artifact.item.type)
+            if key not in item_metas:
+                item_metas[key] = self._load_item_meta(*key)
+            entry = item_metas[key].get(artifact.get_uid())
+            if entry is None or entry.get('content_hash') is None:
+                continue
+            item = artifact.item
+            self._load_meta_entry(artifact, entry)
+            artifact.item = item
+            adopted.append(artifact)
+        return adopted
+
+    def open_artifact_writer(self, artifact):
+        """
+        Returns an ArtifactWriter streaming an artifact's payload into a
+        temporary file. Once it's closed, the payload is stored as a
+        content addressed object, so that it needn't be moved again when
+        the artifact's uid is known.
+
+        Streamed payloads are neither inlined, packed nor chunked.
+        """
+        artifact.use_hash_scheme(self._hash_scheme)
+        root, tmp_path = self._tmp_path()
+        return ArtifactWriter(
+            artifact, [FileSink(tmp_path)],
+            lambda artifact, digest, size: self._finalize_written_payload(
+                artifact, digest, tmp_path, root),
+            scheme=self._hash_scheme)
+
+    def _finalize_written_payload(self, artifact, digest, tmp_path, tmp_root):
+        """
+        Moves a payload written through an ArtifactWriter into place as
+        the object of its digest, and has the artifact load it lazily
+        """
+        self._set_content_hash(artifact, digest)
+        path = self._object_path(digest)
+        root = self._ring.get_node(digest)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            distutils.dir_util.mkpath(os.path.dirname(path))
+            if root == tmp_root:
+                os.replace(tmp_path, path)
+            else:
+                with self._root_locks[root]:
+                    shutil.move(tmp_path, path)
+        artifact._inline_payload = None
+        artifact._chunk_manifest = None
+        artifact._payload_written = True
+        artifact.item.lazy_payload(lambda: self._read_payload(artifact))
+        artifact._stream_opener = lambda: self._open_payload(artifact)
+
+    def _store_written_payload(self, artifact):
+        """
+        Records the artifact as a reference of the object its
+        ArtifactWriter stored, if any
+        """
+        if artifact._payload_written:
+            self._add_object_ref(artifact._content_hash, artifact.get_uid())
+
+    def _tmp_path(self, root=None):
+        """
+        Returns (root, path) of a new temporary file on the given root,
+        or on any root
+        """
+        if root is None:
+            root = self._ring.get_node(uuid.uuid4().hex)
+        distutils.dir_util.mkpath(os.path.join(root, TMP_DIR))
+        return root, os.path.join(root, TMP_DIR, uuid.uuid4().hex)
+
+    @staticmethod
+    def _write_file(path, data):
+        """
+        Replaces a file atomically, so that concurrent readers never see
+        it partially written
+        """
+        tmp_path = "%s.%s" % (path, uuid.uuid4().hex)
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _chunks_size(chunks):
+        return sum(len(chunk) for chunk in chunks)
+
+    def _store_payload(self, artifact, chunks, digest=None):
+        """
+        Stores serialized payload chunks inline, in a pack, as a content
+        addressed object, or as a loose file, depending on their size.
+        Chunks are written back to back rather than joined, unless small.
+        """
+        artifact._inline_payload = None
+        size = self._chunks_size(chunks)
+        if size < max(self.inline_threshold, self.pack_threshold):
+            chunks = [join_chunks(chunks)]
+        if size < max(self.inline_threshold, self.pack_threshold) or \
+           self.content_addressed:
+            # Payloads are in memory and are hashed before placement, so
+            # that duplicate objects needn't be written at all
+            self._set_content_hash(
+                artifact, digest or content_digest(chunks, self._hash_scheme))
+
+        if size < self.inline_threshold:
+            artifact._inline_payload = bytes(chunks[0])
+            return
+
+        if size < self.pack_threshold:
+            root = self._artifact_root(artifact)
+            self._pack_stores[root].append(artifact.get_uid(), chunks[0])
+            return
+
+        if self.chunk_size and size > self.chunk_size:
+            self._write_chunked(artifact, chunks, size, digest)
+            return
+
+        if self.content_addressed:
+            # Referenced first, so that collect_garbage() can't remove an
+            # object found in place before the reference is recorded
+            self._add_object_ref(artifact._content_hash, artifact.get_uid())
+            self._write_object(artifact._content_hash, chunks)
+            return
+
+        # Stream the payload into a temporary file, hashing it as it's
+        # written, then move it into place once its uid is known.
+        root, tmp_path = self._tmp_path(self._artifact_root(artifact))
+        with self._root_locks[root]:
+            with open(tmp_path, 'wb') as f:
+                writer = HashingWriter(f, scheme=self._hash_scheme)
+                for chunk in chunks:
+                    writer.write(chunk)
+        self._set_content_hash(artifact, writer.hexdigest())
+        self._move_into_place(artifact, tmp_path, root)
+
+    def _write_chunked(self, artifact, chunks, size, digest=None):
+        """
+        Writes a payload as content addressed chunks in parallel, skipping
+        chunks already stored, and records their manifest on the artifact
+        """
+        self._set_content_hash(
+            artifact, digest or content_digest(chunks, self._hash_scheme))
+        pieces = list(split_chunks(chunks, self.chunk_size))
+        digests = content_digests(pieces, self._hash_scheme)
+
+        def write(i):
+            self._add_object_ref(digests[i], artifact.get_uid())
+            self._write_object(digests[i], [pieces[i]])
+
+        with ThreadPoolExecutor(max_workers=self.transfer_workers) as pool:
+            list(pool.map(write, range(len(pieces))))
+        artifact._chunk_manifest = make_manifest(digests, size,
+                                                 self.chunk_size)
+
+    def _read_chunks(self, manifest, offset=0, length=None):
+        """
+        Reads a byte range of a chunked payload from the chunks covering
+        it, in parallel. Raises FileNotFoundError if a chunk is missing.
+        """
+        out = memoryview(bytearray(range_length(manifest, offset, length)))
+
+        def read(chunk_range):
+            digest, start, end, position, _ = chunk_range
+            path = self._find_object(digest)
+            if path is None:
+                raise FileNotFoundError(digest)
+            with open(path, 'rb') as f:
+                f.seek(start)
+                f.readinto(out[position:position + end - start])
+
+        with ThreadPoolExecutor(max_workers=self.transfer_workers) as pool:
+            list(pool.map(read, chunk_ranges(manifest, offset, length)))
+        return out
+
+    def _move_into_place(self, artifact, tmp_path, tmp_root):
+        """
+        Moves a temporary payload file to the artifact's payload path
+        """
+        root = self._artifact_root(artifact)
+        target_dir = os.path.join(root, self._relative_artifact_dir(artifact))
+        distutils.dir_util.mkpath(target_dir)
+        target = os.path.join(root, self._relative_artifact_path(artifact))
+        if root == tmp_root:
+            os.replace(tmp_path, target)
+        else:
+            # The uid was only known once the payload had been hashed, and
+            # it's placed on another root than the one written to.
+            with self._root_locks[root]:
+                shutil.move(tmp_path, target)
+
+    @staticmethod
+    def _set_content_hash(artifact, digest):
+        """
+        Records the digest of an artifact's stored payload. Artifacts
+        whose payload is compressed or delta encoded were given a specific
+        hash when serialized, so the stored bytes of the remaining ones
+        are their serialized payload.
+        """
+        artifact._content_hash = digest
+        if artifact._specific_hash is None:
+            artifact._specific_hash = digest
+
+    def _object_path(self, digest, root=None):
+        """
+        Returns the path of a content addressed payload
+        """
+        if root is None:
+            root = self._ring.get_node(digest)
+        # Objects are spread over directories by their digest, less any
+        # hash scheme prefix
+        shard = digest[len(get_hash_scheme(hash_scheme_of(digest)).prefix):]
+        return os.path.join(root, OBJECTS_DIR, shard[:2], digest)
+
+    def _object_refs_path(self, digest):
+        """
+        Returns the path of the file listing uids that reference an object.
+        Reference lists are kept centrally under the first root.
+        """
+        return os.path.join(self.path, OBJECTS_DIR, "refs", digest)
+
+    def _write_object(self, digest, chunks):
+        """
+        Writes a content addressed payload unless it is already stored
+        """
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            return
+        root = self._ring.get_node(digest)
+        distutils.dir_util.mkpath(os.path.dirname(path))
+        tmp_path = "%s.tmp-%s" % (path, uuid.uuid4().hex)
+        with self._root_locks[root]:
+            with open(tmp_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+
+    def _find_object(self, digest):
+        """
+        Returns the path of a stored content addressed payload, or None
+        """
+        if digest is None:
+            return None
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            return path
+        for root in self.paths:
+            path = self._object_path(digest, root)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _object_refs(self, digest):
+        try:
+            with open(self._object_refs_path(digest), 'r') as f:
+                return set(line.strip() for line in f if line.strip())
+        except FileNotFoundError:
+            return set()
+
+    def _add_object_ref(self, digest, uid):
+        """
+        Records that the artifact with the given uid references an object
+        """
+        with self._write_lock:
+            if uid in self._object_refs(digest):
+                return
+            distutils.dir_util.mkpath(os.path.dirname(
+                self._object_refs_path(digest)))
+            with open(self._object_refs_path(digest), 'a') as f:
+                f.write(uid + "\n")
+
+    def _remove_object_ref(self, digest, uid):
         with self._write_lock:
-            with open(os.path.join(self.path,
-                                   self._relative_artifact_path(artifact)),
-                      'w') as f:
-                f.write(artifact.serialize_payload())
+            refs = self._object_refs(digest)
+            refs.discard(uid)
+            with open(self._object_refs_path(digest), 'w') as f:
+                for ref in sorted(refs):
+                    f.write(ref + "\n")
 
-        self._write_artifact_meta(artifact)
-        self._record_pipeline_stage_run_artifact(artifact)
+    def delete_artifact(self, artifact):
+        """
+        Removes an artifact's metadata and releases its payload.
+        Content addressed payloads are removed by collect_garbage() once no
+        artifact references them.
+
+        Artifacts delta encoded against the artifact are first stored in
+        full, so that they remain readable without it.
+        """
+        uid = artifact.get_uid()
+        item_meta = self._load_item_meta(artifact._pipeline_stage,
+                                         artifact.item.type)
+        dependents = [self._load_meta_entry(
+                          self._related_artifact(artifact, dependent_uid),
+                          entry)
+                      for dependent_uid, entry in item_meta.items()
+                      if entry.get('delta_base') == uid]
+        serialized = [self._read_serialized(dependent)
+                      for dependent in dependents]
+
+        with self._write_lock:
+            item_meta = self._load_item_meta(artifact._pipeline_stage,
+                                             artifact.item.type)
+            entry = item_meta.pop(uid, None)
+            if entry is None:
+                return False
+            self._write_file(os.path.join(
+                self.path,
+                self._relative_artifact_dir(artifact),
+                self.metadata_file),
+                metacodec.dumps_meta_map(item_meta, self._metadata_format))
+
+        self._store_in_full(dependents, serialized)
+        removed = self._load_meta_entry(
+            self._related_artifact(artifact, uid), entry)
+        if not self._release_objects(removed):
+            path = self._artifact_payload_path(removed)
+            if os.path.exists(path):
+                os.remove(path)
+            packed = self._packed_location(uid)
+            if packed is not None:
+                packed[0].remove(uid)
+        return True
+
+    def _store_in_full(self, artifacts, serialized):
+        """
+        Stores delta encoded artifacts again, given their serialized
+        payloads, as payloads of their own
+        """
+        for artifact, data in zip(artifacts, serialized):
+            previous = self._load_meta_entry(
+                self._related_artifact(artifact, artifact.get_uid()),
+                artifact.meta_to_dict())
+            artifact._delta_base = None
+            artifact._delta_depth = 0
+            artifact._chunk_manifest = None
+            dictionary = None
+            if artifact._compression_dictionary is not None:
+                dictionary = self._get_compression_dictionary(
+                    artifact._compression_dictionary)
+            self._store_payload(artifact,
+                                artifact._codec().compress([data], dictionary))
+            # Loose payload files were replaced in place
+            self._release_objects(previous)
+        if len(artifacts) > 0:
+            self._write_artifacts_meta(artifacts)
+
+    def _release_objects(self, artifact):
+        """
+        Removes an artifact from the references of the content addressed
+        objects holding its payload. Returns whether there were any.
+        """
+        uid = artifact.get_uid()
+        if artifact._chunk_manifest is not None:
+            for chunk_digest in set(artifact._chunk_manifest['chunks']):
+                self._remove_object_ref(chunk_digest, uid)
+            return True
+        if self._find_object(artifact._content_hash) is not None:
+            self._remove_object_ref(artifact._content_hash, uid)
+            return True
+        return False
+
+    def collect_garbage(self):
+        """
+        Removes content addressed payloads that no artifact references.
+        Returns the number of payloads removed.
+        """
+        removed = 0
+        cutoff = time.time() - self.gc_grace_period
+        for root, digest, path in self._iter_objects():
+            # References are added under the same lock, before the objects
+            # they reference are written
+            with self._write_lock:
+                if len(self._object_refs(digest)) > 0:
+                    continue
+                try:
+                    if os.path.getmtime(path) > cutoff:
+                        continue
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                if os.path.exists(self._object_refs_path(digest)):
+                    os.remove(self._object_refs_path(digest))
+            removed += 1
+        return removed
+
+    def _iter_objects(self):
+        """
+        Yields (root, digest, path) for every stored content addressed payload
+        """
+        for root in self.paths:
+            objects_dir = os.path.join(root, OBJECTS_DIR)
+            if not os.path.isdir(objects_dir):
+                continue
+            for prefix in sorted(os.listdir(objects_dir)):
+                if prefix == "refs":
+                    continue
+                for name in sorted(os.listdir(os.path.join(objects_dir,
+                                                           prefix))):
+                    if ".tmp-" in name:
+                        continue
+                    yield root, name, os.path.join(objects_dir, prefix, name)
+
+    def _dictionary_path(self, name):
+        return os.path.join(self.path, DICTS_DIR, name)
+
+    def _delta_encode(self, artifact, chunks):
+        """
+        Delta encodes the payloads of stages setting `delta_encoding`
+        against the most recent artifact of the same stage and item type,
+        unless its chain of deltas is full or the delta isn't smaller
+        """
+        artifact._delta_base = None
+        artifact._delta_depth = 0
+        if not config_for_item_type(artifact._config, 'delta_encoding',
+                                    artifact.item.type):
+            return chunks
+        base = self._delta_base_for(artifact)
+        if base is None or base._delta_depth >= self.delta_max_depth:
+            return chunks
+
+        target = join_chunks(chunks)
+        if artifact._specific_hash is None:
+            # Identify the payload by its content rather than its delta
+            artifact._specific_hash = content_digest(target,
+                                                     self._hash_scheme)
+        delta = encode_delta(self._read_serialized(base), target,
+                             self.delta_block_size)
+        if delta is None:
+            return chunks
+        artifact._delta_base = base.get_uid()
+        artifact._delta_depth = base._delta_depth + 1
+        return delta
+
+    def _delta_base_for(self, artifact):
+        """
+        Returns the most recent other artifact of an artifact's stage and
+        item type, or None. Artifacts whose chain of deltas includes the
+        artifact itself, which is being saved again, are passed over.
+        """
+        uid = artifact.get_uid()
+        history = self._sorted_artifacts(artifact)
+        by_uid = {candidate.get_uid(): candidate for candidate in history}
+        for candidate in reversed(history):
+            if candidate._partitions is not None:
+                continue
+            base = candidate
+            while base is not None and base.get_uid() != uid:
+                base = by_uid.get(base._delta_base)
+            if base is None:
+                return candidate
+        return None
+
+    def _compression_dictionary_for(self, artifact, chunks):
+        """
+        Returns the compression dictionary of the artifact's stage, for
+        stages setting `compression_dictionary_size`.
+
+        Until a stage has a dictionary, its small payloads are collected
+        as samples. Once there are enough, a dictionary is trained on them
+        and used for the stage's subsequent payloads.
+        """
+        size = getattr(artifact._config, 'compression_dictionary_size', None)
+        if not size:
+            return None
+        stage = artifact._pipeline_stage
+        with self._dictionary_lock:
+            if stage not in self._stage_dictionaries:
+                self._stage_dictionaries[stage] = \
+                    self._load_stage_dictionary(stage)
+            if self._stage_dictionaries[stage] is None:
+                self._sample_for_dictionary(stage, size, chunks)
+            digest = self._stage_dictionaries[stage]
+        if digest is None:
+            return None
+        artifact._compression_dictionary = digest
+        return self._get_compression_dictionary(digest)
+
+    def _sample_for_dictionary(self, stage, size, chunks):
+        if self._chunks_size(chunks) > DICTIONARY_SAMPLE_MAX:
+            return
+        samples = self._dictionary_samples.setdefault(stage, [])
+        samples.append(bytes(join_chunks(chunks)))
+        if len(samples) < DICTIONARY_SAMPLES:
+            return
+        del self._dictionary_samples[stage]
+        dictionary = train_dictionary(samples, size)
+        if dictionary is not None:
+            self._stage_dictionaries[stage] = \
+                self._save_stage_dictionary(stage, dictionary)
+
+    def _load_stage_dictionary(self, stage):
+        """
+        Returns the digest of the dictionary trained for a stage, or None
+        """
+        try:
+            with open(self._dictionary_path(stage + ".current"), 'r') as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def _save_stage_dictionary(self, stage, dictionary):
+        """
+        Stores a dictionary by its digest and makes it the stage's current
+        dictionary. Returns its digest.
+        """
+        digest = content_digest(dictionary, self._hash_scheme)
+        distutils.dir_util.mkpath(os.path.join(self.path, DICTS_DIR))
+        with open(self._dictionary_path(digest), 'wb') as f:
+            f.write(dictionary)
+        with open(self._dictionary_path(stage + ".current"), 'w') as f:
+            f.write(digest)
+        self._dictionaries[digest] = dictionary
+        return digest
+
+    def _get_compression_dictionary(self, digest):
+        if digest not in self._dictionaries:
+            with open(self._dictionary_path(digest), 'rb') as f:
+                self._dictionaries[digest] = f.read()
+        return self._dictionaries[digest]
+
+    def _payload_size(self, artifact):
+        """
+        Returns the size in bytes of a cached artifact's stored payload
+        """
+        inline = artifact._inline_payload
+        if inline is not None:
+            return len(inline)
+        if artifact._chunk_manifest is not None:
+            return artifact._chunk_manifest['size']
+        packed = self._packed_location(artifact.get_uid())
+        if packed is not None:
+            return packed[1][2]
+        return os.path.getsize(self._artifact_payload_path(artifact))
+
+    def _packed_location(self, uid):
+        """
+        Returns (pack store, location) of a packed payload, or None
+        """
+        for root in self.paths:
+            location = self._pack_stores[root].locate(uid)
+            if location is not None:
+                return self._pack_stores[root], location
+        return None
+
+    def repack(self):
+        """
+        Appends loose payloads smaller than `pack_threshold` into the pack
+        of their root, then removes the loose files. Packs mostly holding
+        deleted payloads are then rewritten, see PackStore.compact().
+        Returns the number of payloads packed or rewritten.
+        """
+        packed = 0
+        for relative_dir, uid in self._iter_item_meta_uids():
+            if self._packed_location(uid) is not None:
+                continue
+            for root in self.paths:
+                path = os.path.join(root, relative_dir, uid)
+                if not os.path.isfile(path) or \
+                   os.path.getsize(path) >= self.pack_threshold:
+                    continue
+                with self._root_locks[root]:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                    self._pack_stores[root].append(uid, data)
+                    os.remove(path)
+                packed += 1
+                break
+        for root in self.paths:
+            packed += self._pack_stores[root].compact()
+        return packed
+
+    def rebalance(self):
+        """
+        Moves payloads that are not on their assigned root, e.g. after a
+        root has been added. Returns the number of payloads moved.
+        """
+        moved = 0
+        for relative_dir, uid in self._iter_item_meta_uids():
+            relative_path = os.path.join(relative_dir, uid)
+            target = self._ring.get_node(uid)
+            if os.path.exists(os.path.join(target, relative_path)):
+                continue
+            for root in self.paths:
+                source = os.path.join(root, relative_path)
+                if root == target or not os.path.exists(source):
+                    continue
+                distutils.dir_util.mkpath(os.path.join(target, relative_dir))
+                with self._root_locks[target]:
+                    shutil.move(source, os.path.join(target, relative_path))
+                moved += 1
+                break
+
+        for root, digest, path in self._iter_objects():
+            target = self._ring.get_node(digest)
+            if target == root:
+                continue
+            target_path = self._object_path(digest, target)
+            distutils.dir_util.mkpath(os.path.dirname(target_path))
+            with self._root_locks[target]:
+                shutil.move(path, target_path)
+            moved += 1
+        return moved
+
+    def _iter_item_meta_uids(self):
+        """
+        Yields (relative item directory, uid) for every artifact recorded
+        in the shared metadata files.
+        """
+        for stage in sorted(os.listdir(self.path)):
+            stage_dir = os.path.join(self.path, stage)
+            if not os.path.isdir(stage_dir):
+                continue
+            for item_type in sorted(os.listdir(stage_dir)):
+                meta_path = os.path.join(stage_dir, item_type,
+                                         self.metadata_file)
+                if not os.path.isfile(meta_path):
+                    continue
+                with open(meta_path, 'rb') as f:
+                    item_meta = metacodec.loads_meta_map(f.read())
+                for uid in item_meta:
+                    yield os.path.join(stage, item_type), uid
 
     def _load_item_meta(self, pipeline_stage, item_type):
         """
@@ -212,37 +1451,76 @@ class LocalArtifactBackend(ArtifactBackend):
                     pipeline_stage,
                     item_type,
                     self.metadata_file),
-                      'r') as f:
-                contents = json.load(f)
-                return contents
+                      'rb') as f:
+                return metacodec.loads_meta_map(f.read())
         except FileNotFoundError:
             return {}
 
     def _write_artifact_meta(self, artifact):
+        self._write_artifacts_meta([artifact])
+
+    def _write_artifacts_meta(self, artifacts):
         with self._write_lock:
-            self._u_write_artifact_meta(artifact)
+            self._u_write_artifacts_meta(artifacts)
 
-    def _u_write_artifact_meta(self, artifact):
+    def _u_write_artifacts_meta(self, artifacts):
         """
-        Writes this artifact's metadata to a shared metadata file
+        Writes the metadata of artifacts to the shared metadata files,
+        rewriting each file once for all of its artifacts
         """
-        distutils.dir_util.mkpath(os.path.join(
-            self.path,
-            self._relative_artifact_dir(artifact)))
+        by_dir = OrderedDict()
+        for artifact in artifacts:
+            by_dir.setdefault(self._relative_artifact_dir(artifact),
+                              []).append(artifact)
 
-        item_meta = self._load_item_meta(artifact._pipeline_stage,
-                                         artifact.item.type)
+        for relative_dir, dir_artifacts in by_dir.items():
+            distutils.dir_util.mkpath(os.path.join(self.path, relative_dir))
 
-        item_meta[artifact.get_uid()] = artifact.meta_to_dict()
-        meta_key = artifact._pipeline_stage + str(artifact.item.type)
-        self.cached_meta[meta_key] = item_meta
+            item_meta = self._load_item_meta(dir_artifacts[0]._pipeline_stage,
+                                             dir_artifacts[0].item.type)
+            for artifact in dir_artifacts:
+                item_meta[artifact.get_uid()] = self._meta_entry(artifact)
+            meta_key = dir_artifacts[0]._pipeline_stage + \
+                str(dir_artifacts[0].item.type)
+            self.cached_meta[meta_key] = item_meta
 
-        with open(os.path.join(
+            self._write_file(os.path.join(
                 self.path,
-                self._relative_artifact_dir(artifact),
+                relative_dir,
                 self.metadata_file),
-                  'w') as f:
-            json.dump(item_meta, f)
+                metacodec.dumps_meta_map(item_meta, self._metadata_format))
+
+    def _meta_entry(self, artifact):
+        """
+        Returns the shared metadata file entry for an artifact, including
+        its payload if it is stored inline.
+        """
+        entry = artifact.meta_to_dict()
+        inline = artifact._inline_payload
+        if inline is not None and self._metadata_format == metacodec.BINARY:
+            entry['inline_payload_bytes'] = bytes(inline)
+        elif inline is not None:
+            try:
+                entry['inline_payload'] = bytes(inline).decode('utf-8')
+            except UnicodeDecodeError:
+                entry['inline_payload_b64'] = \
+                    base64.b64encode(inline).decode('ascii')
+        return entry
+
+    def _load_meta_entry(self, artifact, entry):
+        """
+        Populates an artifact from its shared metadata file entry
+        """
+        artifact.meta_from_dict(entry)
+        artifact._inline_payload = None
+        if 'inline_payload' in entry:
+            artifact._inline_payload = entry['inline_payload'].encode('utf-8')
+        elif 'inline_payload_b64' in entry:
+            artifact._inline_payload = \
+                base64.b64decode(entry['inline_payload_b64'])
+        elif 'inline_payload_bytes' in entry:
+            artifact._inline_payload = entry['inline_payload_bytes']
+        return artifact
 
     def _find_cached_artifact(self, artifact):
         """
@@ -254,23 +1532,28 @@ class LocalArtifactBackend(ArtifactBackend):
         If only stage & item name are supplied, will return the newest artifact
         given the pruning ordering.
         """
+        artifact.use_hash_scheme(self._hash_scheme)
         if artifact._specific_hash is not None or \
            artifact._dependency_hash is not None:
             item_meta = self._load_item_meta(artifact._pipeline_stage,
                                              artifact.item.type)
             if artifact.get_uid() in item_meta:
-                artifact.meta_from_dict(item_meta[artifact.get_uid()])
+                self._load_meta_entry(artifact, item_meta[artifact.get_uid()])
                 artifact._loaded_from_local_cache = True
                 return artifact
 
             return None
         else:
-            # Sort artifacts and return most recent
-            sorted_artifacts = self._sorted_artifacts(artifact)
-            if len(sorted_artifacts) == 0:
+            # Sort artifacts and return most recent, loading only its entry
+            entries = list(self._load_item_meta(artifact._pipeline_stage,
+                                                artifact.item.type).values())
+            if len(entries) == 0:
                 return None
-            sorted_artifacts[0]._loaded_from_local_cache = True
-            return sorted_artifacts[0]
+            entry = entries[ArtifactBatch.from_meta(entries).argsort()[0]]
+            found = Artifact(artifact._config, Item(None))
+            self._load_meta_entry(found, entry)
+            found._loaded_from_local_cache = True
+            return found
         raise NotImplementedError
 
     def _get_cached_artifact_payload(self, artifact):
@@ -278,10 +1561,56 @@ class LocalArtifactBackend(ArtifactBackend):
         Returns the payload for a given artifact, assuming that it
         has already been produced and is cached.
         """
-        with open(os.path.join(self.path,
-                               self._relative_artifact_path(artifact)),
-                  'r') as f:
-            return f.read()
+        if artifact._chunk_manifest is not None:
+            return self._read_chunks(artifact._chunk_manifest)
+        packed = self._packed_location(artifact.get_uid())
+        if packed is not None:
+            return packed[0].read(artifact.get_uid())
+        return self._read_loose_payload(artifact)
+
+    def _get_cached_artifact_payload_size(self, artifact):
+        return self._payload_size(artifact)
+
+    def _get_cached_artifact_payload_range(self, artifact, offset, length):
+        """
+        Returns a byte range of a payload, reading only the chunks covering
+        it if the payload is chunked, or mapping only the range otherwise
+        """
+        if artifact._chunk_manifest is not None:
+            return self._read_chunks(artifact._chunk_manifest,
+                                     offset, length)
+        if artifact._inline_payload is not None or \
+           self._packed_location(artifact.get_uid()) is not None:
+            return super()._get_cached_artifact_payload_range(
+                artifact, offset, length)
+        return self._read_loose_payload(artifact, offset, length)
+
+    def _read_loose_payload(self, artifact, offset=0, length=None):
+        """
+        Maps a range of a loose or content addressed payload file, or reads
+        it from a pack if repack() packed the payload since it was looked up
+        """
+        try:
+            return map_file(self._artifact_payload_path(artifact),
+                            offset, length)
+        except FileNotFoundError:
+            packed = self._packed_location(artifact.get_uid())
+            if packed is None:
+                raise
+            payload = packed[0].read(artifact.get_uid())
+            if length is None:
+                return payload[offset:]
+            return payload[offset:offset + length]
+
+    def _get_cached_artifact_payload_path(self, artifact):
+        """
+        Returns the path of a loose or content addressed payload file,
+        or None if the payload is packed or chunked.
+        """
+        if artifact._chunk_manifest is not None or \
+           self._packed_location(artifact.get_uid()) is not None:
+            return None
+        return self._artifact_payload_path(artifact)
 
     def _get_cached_artifact_metadata(self, artifact):
         """
@@ -308,14 +1637,13 @@ class LocalArtifactBackend(ArtifactBackend):
         distutils.dir_util.mkpath(os.path.join(
             self.path,
             stage_config.name))
-        with open(os.path.join(
-                self.path,
-                stage_config.name,
-                self._pipeline_stage_run_filename(
-                        dependency_hash,
-                        stage_config.hash())),
-                  'w') as f:
-            json.dump(meta, f)
+        self._write_file(os.path.join(
+            self.path,
+            stage_config.name,
+            self._pipeline_stage_run_filename(
+                dependency_hash,
+                self.definition_hash(stage_config))),
+            metacodec.dumps(meta, self._metadata_format))
 
     def _pipeline_stage_run_filename(self, dependency_hash,
                                      definition_hash):
@@ -323,46 +1651,60 @@ class LocalArtifactBackend(ArtifactBackend):
                 (dependency_hash, definition_hash))
 
     def _record_pipeline_stage_run_artifact(self, artifact):
-        with self._write_lock:
-            self._u_record_pipeline_stage_run_artifact(artifact)
-
-    def _u_record_pipeline_stage_run_artifact(self, artifact):
-        """
-        Record that the given artifact was produced during its corresponding
-        pipeline stage run.
-        """
-        meta = self._get_pipeline_stage_run_meta(
-            artifact._config,
-            artifact._dependency_hash)
-
-        if 'artifacts' not in meta:
-            meta['artifacts'] = {}
-
-        if 'dependency_hash' not in meta:
-            meta['dependency_hash'] = artifact._dependency_hash
+        self._record_pipeline_stage_run_artifacts([artifact])
 
-        uid = artifact.get_uid()
-        if uid not in meta['artifacts']:
-            meta['artifacts'][uid] = \
-                {"item_type": artifact.item.type,
-                 "specific_hash": artifact._specific_hash,
-                 "uid": uid
-                }
-        else:
-            print("Artifact %s already generated for run %s" %
-                  (artifact.get_uid(), artifact._pipeline_stage))
-
-        distutils.dir_util.mkpath(os.path.join(
-            self.path,
-            artifact._pipeline_stage))
-        with open(os.path.join(
+    def _record_pipeline_stage_run_artifacts(self, artifacts):
+        with self._write_lock:
+            self._u_record_pipeline_stage_run_artifacts(artifacts)
+
+    def _u_record_pipeline_stage_run_artifacts(self, artifacts):
+        """
+        Record that the given artifacts were produced during their
+        corresponding pipeline stage runs, rewriting each run's file once.
+        """
+        runs = OrderedDict()
+        for artifact in artifacts:
+            if not artifact._recorded_in_run:
+                continue
+            run = (artifact._pipeline_stage,
+                   artifact._dependency_hash,
+                   artifact._definition_hash)
+            runs.setdefault(run, []).append(artifact)
+
+        for (stage, dependency_hash, definition_hash), run_artifacts \
+                in runs.items():
+            meta = self._get_pipeline_stage_run_meta(
+                run_artifacts[0]._config,
+                dependency_hash)
+
+            if 'artifacts' not in meta:
+                meta['artifacts'] = {}
+
+            if 'dependency_hash' not in meta:
+                meta['dependency_hash'] = dependency_hash
+
+            for artifact in run_artifacts:
+                uid = artifact.get_uid()
+                if uid not in meta['artifacts']:
+                    meta['artifacts'][uid] = \
+                        {"item_type": artifact.item.type,
+                         "specific_hash": artifact._specific_hash,
+                         "uid": uid
+                        }
+                else:
+                    print("Artifact %s already generated for run %s" %
+                          (uid, stage))
+
+            distutils.dir_util.mkpath(os.path.join(
                 self.path,
-                artifact._pipeline_stage,
+                stage))
+            self._write_file(os.path.join(
+                self.path,
+                stage,
                 self._pipeline_stage_run_filename(
-                    artifact._dependency_hash,
-                    artifact._definition_hash)),
-                  'w') as f:
-            json.dump(meta, f)
+                    dependency_hash,
+                    definition_hash)),
+                metacodec.dumps(meta, self._metadata_format))
 
     def pipeline_stage_run_status(self, stage_config,
                                   dependency_hash):
@@ -395,6 +1737,7 @@ class LocalArtifactBackend(ArtifactBackend):
                 art = Artifact(stage_config)
                 art.item.type = artDict['item_type']
                 art._specific_hash = artDict['specific_hash']
+                art._dependency_hash = dependency_hash
                 res.append(self._find_cached_artifact(art))
             return res
 
@@ -409,10 +1752,9 @@ class LocalArtifactBackend(ArtifactBackend):
                     stage_config.name,
                     self._pipeline_stage_run_filename(
                         dependency_hash,
-                        stage_config.hash())),
-                    'r') as f:
-                contents = json.load(f)
-                return contents
+                        self.definition_hash(stage_config))),
+                    'rb') as f:
+                return metacodec.loads(f.read())
         except FileNotFoundError:
             return {}
 
@@ -422,16 +1764,13 @@ class LocalArtifactBackend(ArtifactBackend):
         """
         item_meta = self._load_item_meta(artifact._pipeline_stage,
                                          artifact.item.type)
-
-        result = []
-        for k in item_meta:
-            result.append(item_meta[k])
-        sorted_metadata = sorted(result, key=lambda x: x["creation_time"])
+        entries = list(item_meta.values())
+        batch = ArtifactBatch.from_meta(entries)
 
         sorted_artifacts = []
-        for x in sorted_metadata:
+        for index in batch.argsort():
             a = Artifact(artifact._config, artifact.item.type)
-            a.meta_from_dict(x)
+            self._load_meta_entry(a, entries[index])
             sorted_artifacts.append(a)
 
         return sorted_artifacts
@@ -441,6 +1780,33 @@ class S3ArtifactBackend(ArtifactBackend):
     """
     Provide an S3 + DynamoDB storage backend for generated artifacts 
     and their metadata.
+
+    Payloads smaller than `inline_threshold` bytes are stored inline within
+    their DynamoDB metadata item, and are returned along with the metadata
+    without a separate S3 request. Keep this well below DynamoDB's item
+    size limit.
+
+    Payloads smaller than `pack_threshold` bytes are buffered and uploaded
+    together as a single pack object once `pack_size` bytes accumulate or
+    the stage run completes. Their metadata records the pack key, offset
+    and length so that they can be fetched with a ranged GET.
+
+    With `content_addressed` set, payloads are uploaded once per distinct
+    content digest under .objects/, and each digest's DynamoDB item holds
+    the set of uids referencing it. As locally, collect_garbage() leaves
+    objects modified within `gc_grace_period` seconds in place.
+
+    With `chunk_size` set, larger payloads are uploaded as content
+    addressed chunks by `transfer_workers` threads. Chunks already in the
+    bucket are skipped, so an interrupted upload resumes where it left off,
+    and downloads fetch chunks in parallel, keeping them in the local cache.
+
+    Payloads written through open_artifact_writer() are uploaded while
+    they're written, in multipart upload parts of `part_size` bytes.
+
+    `hash_scheme` and `metadata_format` are as for LocalArtifactBackend.
+    Metadata is stored in DynamoDB as a binary attribute in the binary
+    format, or as a string in JSON.
     """
     DEFAULTS = {
         "path": "~/.pipetree/local_cache/",
@@ -450,12 +1816,27 @@ class S3ArtifactBackend(ArtifactBackend):
         "aws_profile": settings.AWS_PROFILE,
         "s3_bucket_name": settings.S3_ARTIFACT_BUCKET_NAME,
         "dynamodb_artifact_table_name": settings.DYNAMODB_ARTIFACT_TABLE_NAME,
-        "dynamodb_stage_run_table_name": settings.DYNAMODB_STAGE_RUN_TABLE_NAME
+        "dynamodb_stage_run_table_name": settings.DYNAMODB_STAGE_RUN_TABLE_NAME,
+        "inline_threshold": 0,
+        "pack_threshold": 0,
+        "pack_size": 16 * 1024 * 1024,
+        "content_addressed": False,
+        "chunk_size": 0,
+        "transfer_workers": 8,
+        "read_ahead": 8 * 1024 * 1024,
+        "part_size": 8 * 1024 * 1024,
+        "hash_scheme": LEGACY_HASH_SCHEME,
+        "metadata_format": metacodec.JSON,
+        "gc_grace_period": 3600
     }
 
     def __init__(self, path=DEFAULTS['path'], **kwargs):
         super().__init__(path=path, **kwargs)
         self._localArtifactBackend = LocalArtifactBackend(path=path, **kwargs)
+        self._pending_pack = []
+        self._pending_pack_size = 0
+        self._pack_lock = threading.Lock()
+        self._uploaded_dictionaries = set()
 
         try:
             self._session = boto3.Session(profile_name=self.aws_profile,
@@ -575,66 +1956,506 @@ class S3ArtifactBackend(ArtifactBackend):
          - dependency_hash
          - definition_hash
         """
-        if artifact.item is None or artifact.item.payload is None:
-            raise ArtifactMissingPayloadError(stage=artifact._pipeline_stage)
+        artifact.use_hash_scheme(self._hash_scheme)
+        if artifact.is_partitioned:
+            # Partitions are saved as artifacts of their own first
+            self._save_partitions([artifact])
 
         # Cache the output locally and use local file for S3 upload
         self._localArtifactBackend.save_artifact(artifact)
+        if artifact.is_partitioned:
+            self._write_artifact_meta(artifact)
+            return
+        if artifact._payload_written:
+            # Its ArtifactWriter already uploaded the payload
+            self._store_streamed_object(artifact)
+            self._write_artifact_meta(artifact)
+            return
+        self._upload_compression_dictionary(artifact._compression_dictionary)
+
+        size = self._localArtifactBackend._payload_size(artifact)
+        if size < self.inline_threshold:
+            # Store the payload within the metadata item
+            if artifact._inline_payload is None:
+                payload = self._localArtifactBackend.\
+                    _get_cached_artifact_payload(artifact)
+                artifact._inline_payload = bytes(payload)
+            self._write_artifact_meta(artifact)
+            return
+
+        if artifact._chunk_manifest is not None:
+            self._upload_chunks(artifact)
+            self._write_artifact_meta(artifact)
+            return
+
+        if size >= self.pack_threshold:
+            # Upload to S3
+            local_file = self._localArtifactBackend._artifact_payload_path(
+                artifact)
+            if self.content_addressed:
+                self._upload_object(artifact, local_file)
+            else:
+                key = self.s3_artifact_key(artifact)
+                self._s3_client.upload_file(local_file,
+                                            self.s3_bucket_name,
+                                            key)
+            self._write_artifact_meta(artifact)
+            return
+
+        # Small payloads are held back until a whole pack can be uploaded
+        data = self._localArtifactBackend._get_cached_artifact_payload(
+            artifact)
+        with self._pack_lock:
+            self._pending_pack.append((artifact, data))
+            self._pending_pack_size += len(data)
+            full = self._pending_pack_size >= self.pack_size
+        if full:
+            self.flush_pack()
+
+    def release_payloads(self, artifacts):
+        """
+        Has saved artifacts drop their payloads, loading them back from
+        the local cache, which they're also saved to, on next access
+        """
+        for artifact in artifacts:
+            artifact._loaded_from_local_cache = True
+        super().release_payloads(artifacts)
+
+    def open_artifact_writer(self, artifact):
+        """
+        Returns an ArtifactWriter streaming an artifact's payload into the
+        local cache and, concurrently, to S3 as a multipart upload of
+        `part_size` byte parts. Peak memory is bounded by the parts in
+        flight rather than the size of the payload.
+
+        As the payload's digest is only known once it's written, it's
+        uploaded under .streams/ and moved to its content address once
+        the artifact is saved. collect_garbage() removes streams left
+        behind by writers which failed or whose artifact wasn't saved.
+        """
+        artifact.use_hash_scheme(self._hash_scheme)
+        local = self._localArtifactBackend
+        root, tmp_path = local._tmp_path()
+        sink = S3MultipartSink(self._s3_client,
+                               self.s3_bucket_name,
+                               "%s/%s" % (STREAMS_DIR, uuid.uuid4().hex),
+                               self.part_size,
+                               self.transfer_workers)
+
+        def finalize(artifact, digest, size):
+            local._finalize_written_payload(artifact, digest, tmp_path, root)
+            artifact._payload_key = sink.key
+
+        return ArtifactWriter(artifact, [FileSink(tmp_path), sink], finalize,
+                              scheme=self._hash_scheme)
+
+    def _dictionary_key(self, digest):
+        return "%s/%s" % (DICTS_DIR, digest)
+
+    def _upload_compression_dictionary(self, digest):
+        """
+        Uploads a compression dictionary used locally, so that other
+        machines can decompress payloads compressed with it
+        """
+        if digest is None or digest in self._uploaded_dictionaries:
+            return
+        self._s3_client.upload_file(
+            self._localArtifactBackend._dictionary_path(digest),
+            self.s3_bucket_name,
+            self._dictionary_key(digest))
+        self._uploaded_dictionaries.add(digest)
+
+    def _get_compression_dictionary(self, digest):
+        """
+        Returns a compression dictionary, downloading it into the local
+        cache if needed
+        """
+        local = self._localArtifactBackend
+        if not os.path.exists(local._dictionary_path(digest)):
+            distutils.dir_util.mkpath(os.path.join(local.path, DICTS_DIR))
+            self._s3_client.download_file(self.s3_bucket_name,
+                                          self._dictionary_key(digest),
+                                          local._dictionary_path(digest))
+        return local._get_compression_dictionary(digest)
+
+    def _upload_object(self, artifact, local_file):
+        """
+        Uploads a content addressed payload unless the bucket already holds
+        it, and records the artifact as one of its references.
+        """
+        key = self._object_key(artifact._content_hash)
+        if not self._add_object_ref(artifact._content_hash,
+                                    artifact.get_uid()) or \
+           not self._object_exists(key):
+            self._s3_client.upload_file(local_file,
+                                        self.s3_bucket_name,
+                                        key)
+        artifact._payload_key = key
+
+    def _store_streamed_object(self, artifact):
+        """
+        Moves a payload uploaded by an ArtifactWriter from .streams/ to
+        its content address, unless the bucket already holds it, and
+        records the artifact as one of its references
+        """
+        stream_key = artifact._payload_key
+        if stream_key is None or \
+           not stream_key.startswith(STREAMS_DIR + '/'):
+            return
+        key = self._object_key(artifact._content_hash)
+        if not self._add_object_ref(artifact._content_hash,
+                                    artifact.get_uid()) or \
+           not self._object_exists(key):
+            self._s3_client.copy({'Bucket': self.s3_bucket_name,
+                                  'Key': stream_key},
+                                 self.s3_bucket_name,
+                                 key)
+        self._s3_client.delete_object(Bucket=self.s3_bucket_name,
+                                      Key=stream_key)
+        artifact._payload_key = key
+
+    def _add_object_ref(self, digest, uid):
+        """
+        Records the uid as a reference of a content addressed payload.
+        Returns whether the payload was already referenced; if it wasn't,
+        collect_garbage() may be removing it, so it should be uploaded
+        again regardless of whether the bucket holds it.
+        """
+        response = self._artifact_meta_table.update_item(
+            Key={'artifact_uid': self._object_refs_uid(digest)},
+            UpdateExpression='ADD refs :uid',
+            ExpressionAttributeValues={':uid': set([uid])},
+            ReturnValues='UPDATED_OLD'
+        )
+        return len(response.get('Attributes', {}).get('refs', [])) > 0
 
-        # Upload to S3
-        key = self.s3_artifact_key(artifact)
-        local_file = os.path.join(self.path, key)
-        self._s3_client.upload_file(local_file,
-                                    self.s3_bucket_name,
-                                    key)
-        
-        self._write_artifact_meta(artifact)
+    def _upload_chunks(self, artifact):
+        """
+        Uploads the chunks of a chunked payload in parallel, skipping those
+        the bucket already holds, so that an interrupted upload resumes.
+        Records the artifact as a reference of each chunk.
+        """
+        local = self._localArtifactBackend
+        digests = sorted(set(artifact._chunk_manifest['chunks']))
+
+        def upload(digest):
+            key = self._object_key(digest)
+            if not self._add_object_ref(digest, artifact.get_uid()) or \
+               not self._object_exists(key):
+                self._s3_client.upload_file(local._find_object(digest),
+                                            self.s3_bucket_name,
+                                            key)
+
+        with ThreadPoolExecutor(max_workers=self.transfer_workers) as pool:
+            list(pool.map(upload, digests))
+
+    def _download_chunks(self, manifest, offset=0, length=None):
+        """
+        Downloads a byte range of a chunked payload from the chunks covering
+        it, in parallel. With local caching, whole chunks are kept in the
+        local cache and chunks already there aren't downloaded again.
+        """
+        local = None
+        if self.enable_local_caching:
+            local = self._localArtifactBackend
+        out = memoryview(bytearray(range_length(manifest, offset, length)))
+
+        def download(chunk_range):
+            digest, start, end, position, chunk_length = chunk_range
+            target = out[position:position + end - start]
+            path = local._find_object(digest) if local else None
+            if path is not None:
+                with open(path, 'rb') as f:
+                    f.seek(start)
+                    f.readinto(target)
+                return
+            key = self._object_key(digest)
+            if local is not None and start == 0 and end == chunk_length:
+                data = self._get_object_range(key)
+                local._write_object(digest, [data])
+            else:
+                data = self._get_object_range(key, start, end)
+            target[:] = data
+
+        with ThreadPoolExecutor(max_workers=self.transfer_workers) as pool:
+            list(pool.map(download, chunk_ranges(manifest, offset, length)))
+        return out
+
+    def _get_object_range(self, key, start=0, end=None):
+        """
+        Returns the bytes [start, end) of an S3 object, or all of them
+        """
+        kwargs = {}
+        if end is not None:
+            kwargs['Range'] = 'bytes=%d-%d' % (start, end - 1)
+        elif start > 0:
+            kwargs['Range'] = 'bytes=%d-' % start
+        obj = self._s3_client.get_object(Bucket=self.s3_bucket_name,
+                                         Key=key,
+                                         **kwargs)
+        return memoryview(obj['Body'].read())
+
+    @staticmethod
+    def _object_key(digest):
+        return "%s/%s" % (OBJECTS_DIR, digest)
+
+    def _object_exists(self, key):
+        try:
+            self._s3_client.head_object(Bucket=self.s3_bucket_name, Key=key)
+        except botocore.exceptions.ClientError:
+            return False
+        return True
+
+    @staticmethod
+    def _object_refs_uid(digest):
+        """
+        Returns the key of the DynamoDB item listing the uids that
+        reference a content addressed payload
+        """
+        return "object:%s" % digest
+
+    def delete_artifact(self, artifact):
+        """
+        Removes an artifact's metadata and releases its payload.
+        Content addressed payloads are removed by collect_garbage() once no
+        artifact references them.
+        """
+        if self.enable_local_caching:
+            self._localArtifactBackend.delete_artifact(artifact)
+
+        response = self._artifact_meta_table.get_item(
+            Key={'artifact_uid': artifact.get_uid()})
+        if 'Item' not in response:
+            return False
+        item = response['Item']
+        self._artifact_meta_table.delete_item(
+            Key={'artifact_uid': artifact.get_uid()})
+
+        meta = self._load_document(item['artifact_meta'])
+        if meta.get('chunk_manifest') is not None:
+            for digest in set(meta['chunk_manifest']['chunks']):
+                self._artifact_meta_table.update_item(
+                    Key={'artifact_uid': self._object_refs_uid(digest)},
+                    UpdateExpression='DELETE refs :uid',
+                    ExpressionAttributeValues={
+                        ':uid': set([artifact.get_uid()])}
+                )
+        elif item.get('payload_key', '').startswith(OBJECTS_DIR + '/'):
+            self._artifact_meta_table.update_item(
+                Key={'artifact_uid':
+                     self._object_refs_uid(meta['content_hash'])},
+                UpdateExpression='DELETE refs :uid',
+                ExpressionAttributeValues={':uid': set([artifact.get_uid()])}
+            )
+        elif 'pack_key' not in item and 'inline_payload' not in item:
+            self._s3_client.delete_object(
+                Bucket=self.s3_bucket_name,
+                Key=item.get('payload_key', self.s3_artifact_key(artifact)))
+        return True
+
+    def collect_garbage(self):
+        """
+        Removes content addressed payloads that no artifact references.
+        Returns the number of payloads removed.
+        """
+        removed = 0
+        scan_kwargs = {}
+        stream_keys = set()
+        while True:
+            response = self._artifact_meta_table.scan(**scan_kwargs)
+            for item in response['Items']:
+                uid = item['artifact_uid']
+                if item.get('payload_key', '').startswith(STREAMS_DIR + '/'):
+                    stream_keys.add(item['payload_key'])
+                if not uid.startswith('object:') or len(item.get('refs', [])):
+                    continue
+                digest = uid[len('object:'):]
+                if self._collect_object(uid, self._object_key(digest)):
+                    removed += 1
+            if 'LastEvaluatedKey' not in response:
+                break
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        removed += self._collect_streams(stream_keys)
+        if self.enable_local_caching:
+            self._localArtifactBackend.collect_garbage()
+        return removed
+
+    def _collect_streams(self, referenced):
+        """
+        Removes payloads under .streams/ which no metadata references, and
+        aborts multipart uploads there, once older than the grace period.
+        Returns the number of payloads removed.
+        """
+        cutoff = time.time() - self.gc_grace_period
+        removed = 0
+        paginator = self._s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.s3_bucket_name,
+                                       Prefix=STREAMS_DIR + '/'):
+            for obj in page.get('Contents', []):
+                if obj['Key'] in referenced or \
+                   obj['LastModified'].timestamp() > cutoff:
+                    continue
+                self._s3_client.delete_object(Bucket=self.s3_bucket_name,
+                                              Key=obj['Key'])
+                removed += 1
+        paginator = self._s3_client.get_paginator('list_multipart_uploads')
+        for page in paginator.paginate(Bucket=self.s3_bucket_name,
+                                       Prefix=STREAMS_DIR + '/'):
+            for upload in page.get('Uploads', []):
+                if upload['Initiated'].timestamp() > cutoff:
+                    continue
+                self._s3_client.abort_multipart_upload(
+                    Bucket=self.s3_bucket_name,
+                    Key=upload['Key'],
+                    UploadId=upload['UploadId'])
+        return removed
+
+    def _collect_object(self, uid, key):
+        """
+        Removes an unreferenced content addressed payload, unless it was
+        modified within the grace period or has since been referenced.
+        Its references item is removed first, so that a payload referenced
+        afterwards is uploaded again. Returns whether it was removed.
+        """
+        try:
+            head = self._s3_client.head_object(Bucket=self.s3_bucket_name,
+                                               Key=key)
+            age = time.time() - head['LastModified'].timestamp()
+            if age < self.gc_grace_period:
+                return False
+        except botocore.exceptions.ClientError:
+            pass
+        try:
+            self._artifact_meta_table.delete_item(
+                Key={'artifact_uid': uid},
+                ConditionExpression='attribute_not_exists(refs) OR '
+                'size(refs) = :zero',
+                ExpressionAttributeValues={':zero': 0})
+        except botocore.exceptions.ClientError as err:
+            if err.response['Error']['Code'] != \
+               'ConditionalCheckFailedException':
+                raise
+            return False
+        self._s3_client.delete_object(Bucket=self.s3_bucket_name, Key=key)
+        return True
+
+    def flush_pack(self):
+        """
+        Uploads buffered small payloads as a single pack object, then
+        records the metadata of the artifacts it contains.
+        """
+        with self._pack_lock:
+            pending = self._pending_pack
+            self._pending_pack = []
+            self._pending_pack_size = 0
+        if len(pending) == 0:
+            return
+
+        key = "%s/pack-%s.pack" % (PACKS_DIR, uuid.uuid4().hex)
+        body = bytearray()
+        artifacts = []
+        for artifact, data in pending:
+            artifact._pack_location = (key, len(body), len(data))
+            body += data
+            artifacts.append(artifact)
+        self._s3_client.put_object(Bucket=self.s3_bucket_name,
+                                   Key=key,
+                                   Body=bytes(body))
+        self._write_artifacts_meta(artifacts)
 
     def _write_artifact_meta(self, artifact):
         """
         Writes this artifact's metadata to local storage & dynamodb
         """
+        self._write_artifacts_meta([artifact])
+
+    def _write_artifacts_meta(self, artifacts):
+        """
+        Writes the metadata of several artifacts to local storage & dynamodb
+        """
         if self.enable_local_caching:
-            self._localArtifactBackend._write_artifact_meta(artifact)
+            # Each local metadata file is rewritten once for all artifacts
+            self._localArtifactBackend._write_artifacts_meta(artifacts)
 
         # Insert artifact meta into DynamoDB
-        self._artifact_meta_table.put_item(
-            Item={
-                'artifact_uid': artifact.get_uid(),
-                'artifact_meta': json.dumps(artifact.meta_to_dict()),
-                'creation_time': Decimal(time.time())
-            }
-        )
+        with self._artifact_meta_table.batch_writer() as writer:
+            for artifact in artifacts:
+                writer.put_item(Item=self._artifact_meta_item(artifact))
 
         # Update pipeline stage meta
+        runs = OrderedDict()
+        for artifact in artifacts:
+            if not artifact._recorded_in_run:
+                continue
+            run = (str(artifact._definition_hash),
+                   str(artifact._dependency_hash))
+            runs.setdefault(run, []).append(artifact)
+        for run, run_artifacts in runs.items():
+            self._record_pipeline_stage_run_artifacts(run, run_artifacts)
+
+    def _dump_document(self, document):
+        """
+        Encodes metadata as a DynamoDB attribute value: bytes in the
+        binary format, or a string in JSON as older versions wrote
+        """
+        data = metacodec.dumps(document, self._metadata_format)
+        if self._metadata_format == metacodec.JSON:
+            return data.decode('utf-8')
+        return data
+
+    @staticmethod
+    def _load_document(value):
+        return metacodec.loads(getattr(value, 'value', value))
+
+    def _artifact_meta_item(self, artifact):
+        item = {
+            'artifact_uid': artifact.get_uid(),
+            'artifact_meta': self._dump_document(
+                metacodec.MetaRecord(artifact.meta_to_dict())),
+            'creation_time': Decimal(time.time())
+        }
+        inline = artifact._inline_payload
+        if inline is not None:
+            item['inline_payload'] = bytes(inline)
+        payload_key = artifact._payload_key
+        if payload_key is not None:
+            item['payload_key'] = payload_key
+        pack_location = artifact._pack_location
+        if pack_location is not None:
+            item['pack_key'] = pack_location[0]
+            item['pack_offset'] = pack_location[1]
+            item['pack_length'] = pack_location[2]
+        return item
+
+    def _record_pipeline_stage_run_artifacts(self, run, artifacts):
+        """
+        Record that the given artifacts were produced during the
+        pipeline stage run identified by (definition hash, dependency hash)
+        """
         stage_run_key = {
-            'stage_config_hash': str(artifact._definition_hash),
-            'dependency_hash': str(artifact._dependency_hash)
+            'stage_config_hash': run[0],
+            'dependency_hash': run[1]
         }
+        entries = [{'uid': artifact.get_uid(),
+                    'specific_hash': artifact._specific_hash,
+                    'type': artifact.item.type}
+                   for artifact in artifacts]
         response = self._stage_run_table.get_item(Key=stage_run_key)
 
         if 'Item' not in response:
             # Create stage run meta            
             self._stage_run_table.put_item(
                 Item={
-                    'stage_config_hash': artifact._definition_hash,
-                    'dependency_hash': str(artifact._dependency_hash),
+                    'stage_config_hash': run[0],
+                    'dependency_hash': run[1],
                     'stage_run_status': STAGE_IN_PROGRESS,
-                    'metadata': json.dumps({'artifacts': [
-                        {'uid': artifact.get_uid(),
-                         'specific_hash': artifact._specific_hash,
-                         'type': artifact.item.type}
-                    ]}, sort_keys=True)
+                    'metadata': self._dump_document({'artifacts': entries})
                 }
             )
         else:
             # Update stage meta
-            meta = json.loads(response['Item']['metadata'])
-            meta['artifacts'].append({
-                "uid": artifact.get_uid(),
-                "type": artifact.item.type,
-                "specific_hash": artifact._specific_hash
-            })
+            meta = self._load_document(response['Item']['metadata'])
+            meta['artifacts'] += entries
             self._stage_run_table.update_item(
                 Key=stage_run_key,
                 UpdateExpression='SET metadata = :metaVal',#, stage_run_status= :status',
@@ -643,16 +2464,16 @@ class S3ArtifactBackend(ArtifactBackend):
                 ConditionExpression='metadata = :oldMetaVal',
                 ExpressionAttributeValues={
                     ':oldMetaVal': response['Item']['metadata'],
-                    ':metaVal': json.dumps(meta, sort_keys=True),
+                    ':metaVal': self._dump_document(meta),
                     #':status': STAGE_IN_PROGRESS
                 }
             )
-            item = response['Item']
 
     def _find_cached_artifact(self, artifact):
         """
         Loads the metadata, but not the payload of an artifact.
         """
+        artifact.use_hash_scheme(self._hash_scheme)
 
         # Attempt to load artifact locally
         if self.enable_local_caching:
@@ -668,24 +2489,262 @@ class S3ArtifactBackend(ArtifactBackend):
         if 'Item' not in response:
             return None
         else:
-            artifact.meta_from_dict(json.loads(response['Item']['artifact_meta']))
+            item = response['Item']
+            artifact.meta_from_dict(
+                self._load_document(item['artifact_meta']))
+            artifact._inline_payload = None
+            if 'inline_payload' in item:
+                inline = item['inline_payload']
+                artifact._inline_payload = getattr(inline, 'value', inline)
+            artifact._payload_key = item.get('payload_key')
+            if 'pack_key' in item:
+                artifact._pack_location = (item['pack_key'],
+                                           int(item['pack_offset']),
+                                           int(item['pack_length']))
             artifact._loaded_from_s3_cache = True
             return artifact
         return None
 
+    def repack(self):
+        """
+        Consolidates loose payload objects smaller than `pack_threshold`
+        into pack objects, recording their new location in DynamoDB.
+        Packs older than `gc_grace_period` seconds whose artifacts hold
+        less than half their bytes are rewritten the same way.
+
+        Readers may have looked up the objects superseded, so they're
+        recorded in DynamoDB and deleted by a later repack() once the
+        grace period has passed. Returns the number of payloads packed.
+        """
+        packs, superseded = self._scan_packs()
+        packed = 0
+        batch = []
+        batch_size = 0
+        cutoff = time.time() - self.gc_grace_period
+        paginator = self._s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.s3_bucket_name):
+            for obj in page.get('Contents', []):
+                if obj['Key'] in superseded:
+                    continue
+                if obj['Key'].startswith(PACKS_DIR + '/'):
+                    entries = self._repacked_entries(
+                        obj, packs.get(obj['Key'], []), cutoff)
+                elif obj['Key'].startswith(OBJECTS_DIR + '/') or \
+                        obj['Key'].startswith(DICTS_DIR + '/') or \
+                        obj['Key'].startswith(STREAMS_DIR + '/') or \
+                        obj['Size'] >= self.pack_threshold:
+                    continue
+                else:
+                    entries = [(os.path.basename(obj['Key']), obj['Key'],
+                                None, self._s3_client.get_object(
+                                    Bucket=self.s3_bucket_name,
+                                    Key=obj['Key'])['Body'].read())]
+                if entries is None:
+                    continue
+                batch += entries
+                batch_size += sum(len(entry[3]) for entry in entries)
+                if len(entries) == 0:
+                    # Nothing in the pack is referenced any more
+                    self._supersede(obj['Key'])
+                if batch_size >= self.pack_size:
+                    packed += self._upload_repacked(batch)
+                    batch = []
+                    batch_size = 0
+        packed += self._upload_repacked(batch)
+        return packed
+
+    def _scan_packs(self):
+        """
+        Returns the (uid, offset, length) of the artifacts stored in each
+        pack by key, and the keys of superseded objects. Deletes those
+        superseded longer than the grace period ago along the way.
+        """
+        packs = {}
+        superseded = set()
+        cutoff = time.time() - self.gc_grace_period
+        scan_kwargs = {}
+        while True:
+            response = self._artifact_meta_table.scan(**scan_kwargs)
+            for item in response['Items']:
+                uid = item['artifact_uid']
+                if uid.startswith('superseded:'):
+                    superseded.add(uid[len('superseded:'):])
+                    if float(item['superseded_at']) < cutoff:
+                        self._s3_client.delete_object(
+                            Bucket=self.s3_bucket_name,
+                            Key=uid[len('superseded:'):])
+                        self._artifact_meta_table.delete_item(
+                            Key={'artifact_uid': uid})
+                elif 'pack_key' in item:
+                    packs.setdefault(item['pack_key'], []).append(
+                        (uid, int(item['pack_offset']),
+                         int(item['pack_length'])))
+            if 'LastEvaluatedKey' not in response:
+                break
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        return packs, superseded
+
+    def _repacked_entries(self, obj, artifacts, cutoff):
+        """
+        Returns the (uid, source key, source pack, payload) of the artifacts
+        of a pack to be rewritten, or None if it's kept
+        """
+        if obj['LastModified'].timestamp() > cutoff or \
+           sum(length for _, _, length in artifacts) * 2 >= obj['Size']:
+            return None
+        return [(uid, None, obj['Key'],
+                 self._get_object_range(obj['Key'], offset, offset + length))
+                for uid, offset, length in artifacts]
+
+    def _supersede(self, key):
+        """
+        Records that an object is no longer referenced, to be deleted once
+        readers which looked it up before are done with it
+        """
+        self._artifact_meta_table.put_item(Item={
+            'artifact_uid': 'superseded:%s' % key,
+            'superseded_at': Decimal(time.time())
+        })
+
+    def _upload_repacked(self, batch):
+        if len(batch) == 0:
+            return 0
+        pack_key = "%s/pack-%s.pack" % (PACKS_DIR, uuid.uuid4().hex)
+        body = bytearray()
+        locations = []
+        for uid, key, source_pack, data in batch:
+            locations.append((uid, key, source_pack, len(body), len(data)))
+            body += data
+        self._s3_client.put_object(Bucket=self.s3_bucket_name,
+                                   Key=pack_key,
+                                   Body=bytes(body))
+        packed = 0
+        source_packs = set()
+        for uid, key, source_pack, offset, length in locations:
+            values = {':key': pack_key, ':offset': offset, ':length': length}
+            if source_pack is None:
+                condition = 'attribute_exists(artifact_uid)'
+            else:
+                # Unless the artifact was deleted or moved meanwhile
+                condition = 'pack_key = :source'
+                values[':source'] = source_pack
+                source_packs.add(source_pack)
+            try:
+                self._artifact_meta_table.update_item(
+                    Key={'artifact_uid': uid},
+                    UpdateExpression='SET pack_key = :key, '
+                    'pack_offset = :offset, pack_length = :length',
+                    ConditionExpression=condition,
+                    ExpressionAttributeValues=values
+                )
+            except botocore.exceptions.ClientError:
+                # Not a known artifact payload; leave it in place.
+                continue
+            if key is not None:
+                self._supersede(key)
+            packed += 1
+        for source_pack in source_packs:
+            self._supersede(source_pack)
+        return packed
+
     def s3_artifact_key(self, artifact):
         return self._relative_artifact_path(artifact)
     
+    def _get_cached_artifact_payload_path(self, artifact):
+        """
+        Returns the path of the payload file in the local cache, if the
+        artifact was found there.
+        """
+        if not artifact._loaded_from_local_cache:
+            return None
+        path = self._localArtifactBackend.\
+            _get_cached_artifact_payload_path(artifact)
+        if path is None or not os.path.exists(path):
+            return None
+        return path
+
     def _get_cached_artifact_payload(self, artifact):
         """
         Returns the payload for a given artifact, assuming that it
         has already been produced and is cached on S3.
         """
-        obj = self._s3_client.get_object(
-            Bucket= self.s3_bucket_name,
-            Key= self.s3_artifact_key(artifact)
-        )
-        return obj['Body'].read()
+        if artifact._loaded_from_local_cache:
+            try:
+                return self._localArtifactBackend.\
+                    _get_cached_artifact_payload(artifact)
+            except FileNotFoundError:
+                pass
+
+        if artifact._chunk_manifest is not None:
+            return self._download_chunks(artifact._chunk_manifest)
+
+        pack_location = artifact._pack_location
+        if pack_location is not None:
+            key, offset, length = pack_location
+            return self._get_object_range(key, offset, offset + length)
+
+        return self._get_object_range(
+            artifact._payload_key or
+            self.s3_artifact_key(artifact))
+
+    def _get_cached_artifact_payload_size(self, artifact):
+        """
+        Returns the size of a payload without downloading it
+        """
+        if artifact._inline_payload is not None:
+            return len(artifact._inline_payload)
+        if artifact._loaded_from_local_cache:
+            try:
+                return self._localArtifactBackend._payload_size(artifact)
+            except FileNotFoundError:
+                pass
+        if artifact._chunk_manifest is not None:
+            return artifact._chunk_manifest['size']
+        pack_location = artifact._pack_location
+        if pack_location is not None:
+            return pack_location[2]
+        return self._s3_client.head_object(
+            Bucket=self.s3_bucket_name,
+            Key=artifact._payload_key or
+            self.s3_artifact_key(artifact))['ContentLength']
+
+    def _get_cached_artifact_payload_range(self, artifact, offset, length):
+        """
+        Returns a byte range of a payload, fetching only the chunks covering
+        it if the payload is chunked, or with a ranged GET otherwise
+        """
+        if artifact._inline_payload is not None:
+            return super()._get_cached_artifact_payload_range(
+                artifact, offset, length)
+
+        if artifact._loaded_from_local_cache:
+            try:
+                return self._localArtifactBackend.\
+                    _get_cached_artifact_payload_range(artifact,
+                                                       offset, length)
+            except FileNotFoundError:
+                pass
+
+        if artifact._chunk_manifest is not None:
+            return self._download_chunks(artifact._chunk_manifest,
+                                         offset, length)
+
+        pack_location = artifact._pack_location
+        if pack_location is not None:
+            key, pack_offset, pack_length = pack_location
+            end = pack_length if length is None else \
+                min(offset + length, pack_length)
+            if end <= offset:
+                return memoryview(b'')
+            return self._get_object_range(key, pack_offset + offset,
+                                          pack_offset + end)
+
+        key = artifact._payload_key or \
+            self.s3_artifact_key(artifact)
+        if length == 0:
+            return memoryview(b'')
+        return self._get_object_range(
+            key, offset, None if length is None else offset + length)
 
     def log_pipeline_stage_run_complete(self, stage_config,
                                            dependency_hash):
@@ -693,6 +2752,9 @@ class S3ArtifactBackend(ArtifactBackend):
         Record that the pipeline stage run for the given dependency hash and
         definition hash completed successfully.
         """
+        # Packed artifacts of this run must be visible before it completes
+        self.flush_pack()
+
         # Log locally
         if self.enable_local_caching:
             self._localArtifactBackend.log_pipeline_stage_run_complete(
@@ -700,7 +2762,7 @@ class S3ArtifactBackend(ArtifactBackend):
         
         # Update dynamo db
         stage_run_key = {
-            'stage_config_hash': str(stage_config.hash()),
+            'stage_config_hash': str(self.definition_hash(stage_config)),
             'dependency_hash': str(dependency_hash)
         }
         self._stage_run_table.update_item(
@@ -716,7 +2778,7 @@ class S3ArtifactBackend(ArtifactBackend):
     def pipeline_stage_run_status(self, stage_config,
                                   dependency_hash):
         stage_run_key = {
-            'stage_config_hash': str(stage_config.hash()),
+            'stage_config_hash': str(self.definition_hash(stage_config)),
             'dependency_hash': str(dependency_hash)
         }
         response = self._stage_run_table.get_item(Key=stage_run_key)
@@ -734,7 +2796,7 @@ class S3ArtifactBackend(ArtifactBackend):
         """
         # Update pipeline stage metaa
         stage_run_key = {
-            'stage_config_hash': stage_config.hash(),
+            'stage_config_hash': self.definition_hash(stage_config),
             'dependency_hash': dependency_hash,
         }
 
@@ -743,13 +2805,13 @@ class S3ArtifactBackend(ArtifactBackend):
             return None
         else:
             res = []
-            meta = json.loads(response['Item']['metadata'])
+            meta = self._load_document(response['Item']['metadata'])
             for obj in meta['artifacts']:
                 art = Artifact(stage_config)
                 art.item.type = obj['type']
                 art._specific_hash = obj['specific_hash']
                 art._dependency_hash = dependency_hash
-                art._definition_hash = stage_config.hash()
+                art.use_hash_scheme(self._hash_scheme)
                 res.append(self._find_cached_artifact(art))
             return res
 
@@ -758,18 +2820,8 @@ class S3ArtifactBackend(ArtifactBackend):
         """
         Load metadata for a given run of a pipeline stage
         """
-        try:
-            with open(os.path.join(
-                    self.path,
-                    stage_config.name,
-                    self._pipeline_stage_run_filename(
-                        dependency_hash,
-                        stage_config.hash())),
-                    'r') as f:
-                contents = json.load(f)
-                return contents
-        except FileNotFoundError:
-            return {}
+        return self._localArtifactBackend._get_pipeline_stage_run_meta(
+            stage_config, dependency_hash)
 
     def _sorted_artifacts(self, artifact):
         """
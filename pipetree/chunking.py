@@ -0,0 +1,88 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from pipetree.serializers import byteview
+
+
+def split_chunks(chunks, chunk_size):
+    """
+    Splits a payload given as a list of buffers into pieces of exactly
+    `chunk_size` bytes, apart from the last. Pieces within a single buffer
+    are views of it; only pieces spanning buffers are copied.
+    """
+    pending = []
+    pending_size = 0
+    for chunk in chunks:
+        view = byteview(chunk)
+        while len(view) > 0:
+            take = min(chunk_size - pending_size, len(view))
+            if pending_size == 0 and take == chunk_size:
+                yield view[:take]
+            else:
+                pending.append(view[:take])
+                pending_size += take
+                if pending_size == chunk_size:
+                    yield b''.join(pending)
+                    pending = []
+                    pending_size = 0
+            view = view[take:]
+    if pending_size > 0:
+        yield b''.join(pending)
+
+
+def make_manifest(digests, size, chunk_size):
+    """
+    Returns the manifest of a chunked payload, recorded in its metadata
+    """
+    return {"size": size, "chunk_size": chunk_size, "chunks": digests}
+
+
+def chunk_ranges(manifest, offset=0, length=None):
+    """
+    Yields (digest, start, end, position, chunk_length) for each chunk
+    covering `length` bytes from `offset` of a chunked payload, where
+    [start, end) is the range within the chunk and `position` is where it
+    falls within the requested bytes.
+    """
+    size = manifest["size"]
+    chunk_size = manifest["chunk_size"]
+    if length is None or offset + length > size:
+        length = max(size - offset, 0)
+    end = offset + length
+    index = offset // chunk_size
+    while index * chunk_size < end:
+        chunk_start = index * chunk_size
+        chunk_length = min(chunk_size, size - chunk_start)
+        start = max(offset, chunk_start) - chunk_start
+        stop = min(end, chunk_start + chunk_length) - chunk_start
+        yield (manifest["chunks"][index], start, stop,
+               chunk_start + start - offset, chunk_length)
+        index += 1
+
+
+def range_length(manifest, offset=0, length=None):
+    """
+    Returns the number of bytes available from `offset`, up to `length`
+    """
+    available = max(manifest["size"] - offset, 0)
+    if length is None:
+        return available
+    return min(length, available)
@@ -0,0 +1,217 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import lzma
+import zlib
+from pipetree.exceptions import CodecUnavailableError
+from pipetree.utils import config_for_item_type
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+NO_COMPRESSION = "none"
+
+
+class Codec(object):
+    """
+    Compresses serialized payloads.
+
+    compress() takes and returns a list of chunks, so that payloads are
+    compressed as a stream rather than joined first. Codecs which support
+    dictionaries accept one trained on similar payloads.
+    """
+    name = None
+    supports_dictionaries = False
+
+    def compress(self, chunks, dictionary=None):
+        raise NotImplementedError
+
+    def decompress(self, data, dictionary=None):
+        raise NotImplementedError
+
+    def compressor(self, dictionary=None):
+        """
+        Returns an object compressing a payload incrementally through
+        compress() and flush(), or None if the codec can't
+        """
+        return None
+
+
+class NoCodec(Codec):
+    name = NO_COMPRESSION
+
+    def compress(self, chunks, dictionary=None):
+        return chunks
+
+    def decompress(self, data, dictionary=None):
+        return data
+
+
+class StreamCodec(Codec):
+    """
+    Codec built on a compressor object with compress() and flush()
+    """
+    def _compressor(self, dictionary):
+        raise NotImplementedError
+
+    def compressor(self, dictionary=None):
+        return self._compressor(dictionary)
+
+    def compress(self, chunks, dictionary=None):
+        compressor = self._compressor(dictionary)
+        compressed = [compressor.compress(chunk) for chunk in chunks]
+        compressed.append(compressor.flush())
+        return [chunk for chunk in compressed if len(chunk) > 0]
+
+
+class ZlibCodec(StreamCodec):
+    name = "zlib"
+
+    def _compressor(self, dictionary):
+        return zlib.compressobj()
+
+    def decompress(self, data, dictionary=None):
+        return zlib.decompress(data)
+
+
+class LzmaCodec(StreamCodec):
+    name = "lzma"
+
+    def _compressor(self, dictionary):
+        return lzma.LZMACompressor()
+
+    def decompress(self, data, dictionary=None):
+        return lzma.decompress(data)
+
+
+class ZstdCodec(StreamCodec):
+    """
+    Zstandard compression, which must be installed. Payloads may be
+    compressed with a dictionary trained per stage.
+    """
+    name = "zstd"
+    supports_dictionaries = True
+
+    def _require_zstandard(self):
+        if zstandard is None:
+            raise CodecUnavailableError(name=self.name, package="zstandard")
+
+    def _dictionary(self, dictionary):
+        if dictionary is None:
+            return None
+        return zstandard.ZstdCompressionDict(dictionary)
+
+    def _compressor(self, dictionary):
+        self._require_zstandard()
+        return zstandard.ZstdCompressor(
+            dict_data=self._dictionary(dictionary)).compressobj()
+
+    def decompress(self, data, dictionary=None):
+        self._require_zstandard()
+        decompressor = zstandard.ZstdDecompressor(
+            dict_data=self._dictionary(dictionary))
+        return decompressor.decompressobj().decompress(data)
+
+
+class Lz4Codec(StreamCodec):
+    """
+    LZ4 frame compression, which must be installed
+    """
+    name = "lz4"
+
+    def _require_lz4(self):
+        if lz4 is None:
+            raise CodecUnavailableError(name=self.name, package="lz4")
+
+    def _compressor(self, dictionary):
+        self._require_lz4()
+        return Lz4Compressor()
+
+    def decompress(self, data, dictionary=None):
+        self._require_lz4()
+        return lz4.frame.decompress(data)
+
+
+class Lz4Compressor(object):
+    """
+    Adapts an LZ4 frame compressor to the compress()/flush() interface
+    """
+    def __init__(self):
+        self._compressor = lz4.frame.LZ4FrameCompressor()
+        self._header = self._compressor.begin()
+
+    def compress(self, data):
+        header, self._header = self._header, b''
+        return header + self._compressor.compress(data)
+
+    def flush(self):
+        return self._header + self._compressor.flush()
+
+
+def train_dictionary(samples, size):
+    """
+    Trains a zstd dictionary of up to `size` bytes on sample payloads.
+    Returns None if zstandard is missing or the samples don't suffice.
+    """
+    if zstandard is None:
+        return None
+    try:
+        return zstandard.train_dictionary(size, samples).as_bytes()
+    except zstandard.ZstdError:
+        return None
+
+
+CODECS = {}
+
+
+def register_codec(codec):
+    """
+    Makes a codec available as a compression setting by its name
+    """
+    CODECS[codec.name] = codec
+
+
+def get_codec(name):
+    """
+    Returns the codec registered under a name, or None
+    """
+    return CODECS.get(name)
+
+
+def compression_for(stage_config, item_type):
+    """
+    Returns the compression a stage configures for an item type with its
+    `compression` entry, as either a codec name or a dictionary from item
+    types to codec names.
+    """
+    return config_for_item_type(stage_config, 'compression', item_type) \
+        or NO_COMPRESSION
+
+
+for codec in [NoCodec(), ZlibCodec(), LzmaCodec(), ZstdCodec(), Lz4Codec()]:
+    register_codec(codec)
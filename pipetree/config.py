@@ -19,17 +19,26 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import hashlib
 import inspect
-import json
 from pipetree import STAGES
+from pipetree.jsonengine import canonical_dumps
 from pipetree.utils import attach_config_to_object
 from pipetree.exceptions import IncorrectPipelineStageNameError,\
-    NonPythonicNameError, MissingPipelineAttributeError
+    NonPythonicNameError, MissingPipelineAttributeError,\
+    FrozenPipelineStageConfigError
 from pipetree.utils import name_is_pythonic
+from pipetree.hashing import get_hash_scheme, LEGACY_HASH_SCHEME
 
 
 class PipelineStageConfig(object):
+    """
+    The configuration of a pipeline stage. A config is frozen once
+    constructed, so that its hash can be computed once and reused by
+    every artifact and stage run lookup.
+    """
+
+    _frozen = False
+
     def __init__(self, key, data):
         if not name_is_pythonic(key):
             raise NonPythonicNameError(symbol=key)
@@ -49,18 +58,41 @@ class PipelineStageConfig(object):
             raise IncorrectPipelineStageNameError(
                 types=list(STAGES.keys()))
         self.parent_class = STAGES[self.type]
+        self._hash = self._compute_hash()
+        # Hashes under schemes other than the legacy one, by scheme name
+        self._hashes = {}
+        self._frozen = True
+
+    def __setattr__(self, key, value):
+        if self._frozen:
+            raise FrozenPipelineStageConfigError(stage=self.name,
+                                                 attribute=key)
+        object.__setattr__(self, key, value)
 
-    def hash(self):
+    def __delattr__(self, key):
+        if self._frozen:
+            raise FrozenPipelineStageConfigError(stage=self.name,
+                                                 attribute=key)
+        object.__delattr__(self, key)
+
+    def hash(self, scheme=None):
         """
-        Hash a pipeline stage in an idempotent way
+        Hash a pipeline stage in an idempotent way, with the given hash
+        scheme or the legacy one
         """
-        ignore = ['parent_class']
+        if scheme is None or scheme.name == LEGACY_HASH_SCHEME:
+            return self._hash
+        if scheme.name not in self._hashes:
+            self._hashes[scheme.name] = self._compute_hash(scheme)
+        return self._hashes[scheme.name]
+
+    def _compute_hash(self, scheme=None):
+        scheme = scheme or get_hash_scheme()
+        ignore = ['parent_class', '_hash', '_hashes', '_frozen']
         props = {k: getattr(self, k)
                  for k in dir(self)
                  if not k.startswith('__')
                  and not inspect.ismethod(getattr(self, k))
                  and k not in ignore}
-        h = hashlib.md5()
-        stage_json = json.dumps(props, sort_keys=True)
-        h.update(str(stage_json).encode('utf-8'))
-        return str(h.hexdigest())
+        stage_json = canonical_dumps(props, sort_keys=True)
+        return scheme.hexdigest(scheme.new(stage_json))
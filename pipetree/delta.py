@@ -0,0 +1,207 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import hashlib
+import struct
+from pipetree.serializers import byteview
+
+# Size of the blocks of a base payload that deltas copy from
+DEFAULT_BLOCK_SIZE = 4096
+
+# Number of base blocks following the last copied one, and the number of
+# bytes of the payload, searched to find where it resumes matching the base
+RESYNC_BLOCKS = 8
+RESYNC_WINDOW = 1024 * 1024
+
+# Deltas whose inserted bytes exceed this share of the payload aren't
+# worth storing over the full payload
+MAX_INSERTED_RATIO = 0.5
+
+DELTA_MAGIC = b'PTD1'
+_HEADER = struct.Struct('<4sQ')
+_COPY = struct.Struct('<BQQ')
+_INSERT = struct.Struct('<BQ')
+_OP_COPY = 0
+_OP_INSERT = 1
+
+
+class _DeltaOps(object):
+    """
+    Accumulates delta operations as chunks, merging adjacent copies
+    """
+    def __init__(self, size):
+        self.chunks = [_HEADER.pack(DELTA_MAGIC, size)]
+        self.inserted = 0
+        self._copy = None
+
+    def copy(self, offset, length):
+        if self._copy is not None and \
+           self._copy[0] + self._copy[1] == offset:
+            self._copy = (self._copy[0], self._copy[1] + length)
+            return
+        self._flush_copy()
+        self._copy = (offset, length)
+
+    def insert(self, data):
+        if len(data) == 0:
+            return
+        self._flush_copy()
+        self.chunks.append(_INSERT.pack(_OP_INSERT, len(data)))
+        self.chunks.append(data)
+        self.inserted += len(data)
+
+    def _flush_copy(self):
+        if self._copy is not None:
+            self.chunks.append(_COPY.pack(_OP_COPY, *self._copy))
+            self._copy = None
+
+    def finish(self):
+        self._flush_copy()
+        return self.chunks
+
+
+def _block_digest(block):
+    return hashlib.md5(block).digest()
+
+
+def encode_delta(base, target, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Returns a delta reconstructing `target` from `base` as a list of
+    chunks, or None if it wouldn't be much smaller than `target`.
+
+    Blocks of the target are matched against the base's blocks, as in
+    rsync. After a mismatch, the base blocks following the last match are
+    searched for in the target, so that insertions and deletions only
+    cost the bytes they change.
+    """
+    base = bytes(base)
+    target = bytes(target)
+    base_view = memoryview(base)
+    target_view = memoryview(target)
+
+    index = {}
+    for offset in range(0, len(base) - block_size + 1, block_size):
+        index.setdefault(
+            _block_digest(base_view[offset:offset + block_size]), offset)
+
+    ops = _DeltaOps(len(target))
+    budget = len(target) * MAX_INSERTED_RATIO
+    position = 0
+    literal = 0
+    expected = 0
+    searched = {}
+    while position + block_size <= len(target):
+        block = target_view[position:position + block_size]
+        offset = None
+        if base_view[expected:expected + block_size] == block:
+            offset = expected
+        else:
+            candidate = index.get(_block_digest(block))
+            if candidate is not None and \
+               base_view[candidate:candidate + block_size] == block:
+                offset = candidate
+        if offset is not None:
+            ops.insert(target_view[literal:position])
+            ops.copy(offset, block_size)
+            position += block_size
+            literal = position
+            expected = offset + block_size
+            continue
+
+        if position - literal + ops.inserted > budget:
+            return None
+        resumed = _resync(base, target, position, expected, block_size,
+                          searched)
+        if resumed is None:
+            position += block_size
+        else:
+            position, expected = resumed
+
+    ops.insert(target_view[literal:])
+    if ops.inserted > budget:
+        return None
+    return ops.finish()
+
+
+def _resync(base, target, position, expected, block_size, searched):
+    """
+    Returns (position, offset) of the first of the base blocks following
+    `expected` found in the target from `position`, or of the base block
+    matching the target at `position`, or None. `searched` records how
+    far each base block was already searched for.
+    """
+    limit = min(len(target), position + RESYNC_WINDOW + block_size)
+    found = None
+    for i in range(RESYNC_BLOCKS):
+        offset = expected + i * block_size
+        if offset + block_size > len(base):
+            break
+        start = max(position, searched.get(offset, 0))
+        end = limit if found is None else min(limit, found[0] + block_size)
+        if start >= end:
+            continue
+        match = target.find(base[offset:offset + block_size], start, end)
+        if match == -1:
+            searched[offset] = max(start, end - block_size + 1)
+        elif found is None or match < found[0]:
+            found = (match, offset)
+    if found is not None:
+        return found
+
+    # Bytes may have been deleted instead, so that the target resumes
+    # further along the base
+    offset = base.find(target[position:position + block_size], expected,
+                       expected + RESYNC_WINDOW + block_size)
+    if offset == -1:
+        return None
+    return position, offset
+
+
+def apply_delta(base, delta):
+    """
+    Reconstructs a payload from its base and a delta against it
+    """
+    base = byteview(base)
+    delta = byteview(delta)
+    magic, size = _HEADER.unpack_from(delta, 0)
+    if magic != DELTA_MAGIC:
+        raise ValueError("not a delta")
+    out = bytearray(size)
+    written = 0
+    position = _HEADER.size
+    while position < len(delta):
+        op = delta[position]
+        if op == _OP_COPY:
+            _, offset, length = _COPY.unpack_from(delta, position)
+            position += _COPY.size
+            out[written:written + length] = base[offset:offset + length]
+        elif op == _OP_INSERT:
+            _, length = _INSERT.unpack_from(delta, position)
+            position += _INSERT.size
+            out[written:written + length] = \
+                delta[position:position + length]
+            position += length
+        else:
+            raise ValueError("unknown delta operation %d" % op)
+        written += length
+    if written != size:
+        raise ValueError("truncated delta")
+    return memoryview(out)
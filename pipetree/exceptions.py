@@ -50,6 +50,15 @@ class MissingPipelineAttributeError(PipetreeError):
     message = 'No {attribute} attribute found for pipeline stage {stage_name}'
 
 
+class FrozenPipelineStageConfigError(PipetreeError, AttributeError):
+    """
+    Raised when an attribute of a PipelineStageConfig is set or deleted
+    after construction
+    """
+    message = 'Config of pipeline stage {stage} is frozen, cannot '\
+              + 'change {attribute}'
+
+
 class IncorrectPipelineStageNameError(PipetreeError):
     message = 'Pipeline stage type must be one of {types}'
 
@@ -62,6 +71,10 @@ class ArtifactSourceDoesNotExistError(PipetreeError):
     message = '{provider} cannot source artifacts from {source}'
 
 
+class FileReferenceChangedError(PipetreeError):
+    message = 'Referenced file {path} has changed since it was fingerprinted'
+
+
 class ArtifactProviderMissingParameterError(PipetreeError):
     message = '{provider} instantiated without parameter {parameter}'
 
@@ -85,6 +98,53 @@ class ArtifactUnknownSerializationTypeError(PipetreeError):
               + 'serialization type {stype}'
 
 
+class SerializerUnavailableError(PipetreeError):
+    message = 'Serializer {name} requires the {package} package'
+
+
+class ArtifactUnknownCompressionError(PipetreeError):
+    message = 'Artifact from stage {stage} has invalid '\
+              + 'compression {compression}'
+
+
+class CodecUnavailableError(PipetreeError):
+    message = 'Compression codec {name} requires the {package} package'
+
+
+class UnknownHashSchemeError(PipetreeError):
+    message = 'Unknown hash scheme {name}, expected one of {schemes}'
+
+
+class HashSchemeUnavailableError(PipetreeError):
+    message = 'Hash scheme {name} requires the {package} package'
+
+
+class UnknownJSONEngineError(PipetreeError):
+    message = 'Unknown JSON engine {name}, expected one of {engines}'
+
+
+class JSONEngineUnavailableError(PipetreeError):
+    message = 'JSON engine {name} requires the {package} package'
+
+
+class UnknownMetadataFormatError(PipetreeError):
+    message = 'Unknown metadata format {name}, expected one of {formats}'
+
+
+class UnknownMetadataVersionError(PipetreeError):
+    message = 'Metadata is encoded with unknown version {version}'
+
+
+class ArtifactDeltaBaseMissingError(PipetreeError):
+    message = 'Artifact from stage {stage} is stored as a delta against '\
+              + 'artifact {base}, which is missing'
+
+
+class ArtifactPartitionMissingError(PipetreeError):
+    message = 'Partitioned artifact from stage {stage} is missing its '\
+              + 'partition {partition}'
+
+
 class StageDoesNotExistError(PipetreeError):
     message = 'Specified pipeline stage {stage} does not exist'
 
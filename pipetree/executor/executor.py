@@ -20,7 +20,8 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 import asyncio
-import json
+
+from pipetree import metacodec
 
 ALL_ARTIFACTS_GENERATED = "ALL_ARTIFACTS_GENERATED"
 
@@ -36,13 +37,17 @@ class ExecutorTask(object):
         self._loop = loop
         self._queue = asyncio.Queue(loop=self._loop)
 
-    def serialize(self):
-        return json.dumps({
+    def serialize(self, format=metacodec.JSON):
+        """
+        Encodes the task as text, with its input artifacts' metadata in the
+        given metadata format
+        """
+        return metacodec.dumps_text({
             "stage_name": self._stage._config.name,
             "stage_config": self._stage._config.raw_config,
-            "artifacts": list(map(lambda x: x.meta_to_dict(),
-                                  self._input_artifacts))
-        })
+            "artifacts": list(map(lambda x: metacodec.MetaRecord(
+                x.meta_to_dict()), self._input_artifacts))
+        }, format)
 
     def load_from_json(self):
         raise NotImplementedError
@@ -57,16 +62,25 @@ class ExecutorTask(object):
         """
         self._queue.put_nowait((None, ALL_ARTIFACTS_GENERATED))
 
+    async def next_artifact(self):
+        """
+        Returns the next artifact produced by this stage, or None once
+        all artifacts have been generated.
+        """
+        (artifact, status) = await self._queue.get()
+        if status == ALL_ARTIFACTS_GENERATED:
+            return None
+        return artifact
+
     async def generate_artifacts(self):
         """
         Returns all artifacts produced by this stage.
-        To stream artifact results, the queue can be accessed
-        directly.
+        To stream artifact results, use next_artifact().
         """
         artifacts = []
         while True:
-            (artifact, status) = await self._queue.get()
-            if status == ALL_ARTIFACTS_GENERATED:
+            artifact = await self.next_artifact()
+            if artifact is None:
                 break
             artifacts.append(artifact)
         return artifacts
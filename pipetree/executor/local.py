@@ -18,6 +18,7 @@
 # AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+import asyncio
 from pipetree.executor import Executor
 
 
@@ -38,6 +39,8 @@ class LocalCPUExecutor(Executor):
                 for artifact in task._stage.yield_artifacts(
                         input_artifacts=task._input_artifacts):
                     task.enqueue_artifact(artifact)
+                    # Let the artifact be consumed before the next
+                    await asyncio.sleep(0)
                 task.all_artifacts_generated()
         except RuntimeError:
             pass
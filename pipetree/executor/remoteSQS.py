@@ -20,12 +20,10 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 import boto3
 import botocore.exceptions
-import json
 import asyncio
 
-from pipetree import settings
+from pipetree import settings, metacodec
 from pipetree.executor import Executor, LocalCPUExecutor
-from pipetree.artifact import Artifact
 from pipetree.backend import S3ArtifactBackend
 from pipetree.executor.server import ExecutorServer
 
@@ -82,7 +80,7 @@ class RemoteSQSExecutor(Executor):
         self._log("Sending SQS task message for stage %s: %s / %s" %
                   (task._stage._config.name, config_hash, dependency_hash))
         self._task_queue.send_message(
-            MessageBody=task.serialize(),
+            MessageBody=task.serialize(self._backend._metadata_format),
             MessageAttributes={
                 'stage_config_hash': {
                     'StringValue': config_hash,
@@ -139,8 +137,8 @@ class RemoteSQSExecutor(Executor):
                        len(task._input_artifacts)))
 
             # Push task to queue
-            config_hash = task._stage._config.hash()
-            dependency_hash = Artifact.dependency_hash(
+            config_hash = self._backend.definition_hash(task._stage._config)
+            dependency_hash = self._backend.dependency_hash(
                 task._input_artifacts)
             self._queue_push(task, config_hash, dependency_hash)
 
@@ -232,7 +230,7 @@ class RemoteSQSServer(object):
                     get('dependency_hash').get('StringValue')
                 self._log("Retrieved SQS task message %s / %s" %
                           (m_config_hash, m_dependency_hash))                
-                task = json.loads(message.body)
+                task = metacodec.loads_text(message.body)
                 job_id = self._executor_server.enqueue_job(task)
                 self._log("Enqueued Job ID: %d for stage %s" %
                           (job_id, task['stage_name']))
@@ -85,6 +85,7 @@ class ExecutorServer(object):
         pf = PipelineStageFactory()
         config = PipelineStageConfig(job['stage_name'], job['stage_config'])
         stage = pf.create_pipeline_stage(config)
+        stage.bind_backend(self._backend)
 
         # Load input artifact payloads from cache
         loaded_artifacts = []
@@ -101,13 +102,14 @@ class ExecutorServer(object):
         exec_task = self._executor.create_task(stage, loaded_artifacts)
         result = await exec_task.generate_artifacts()
 
+        dependency_hash = self._backend.dependency_hash(loaded_artifacts)
         for art in result:
             art._creation_time = float(time.time())
-            art._dependency_hash = Artifact.dependency_hash(loaded_artifacts)
+            art._dependency_hash = dependency_hash
             self._backend.save_artifact(art)
         self._backend.log_pipeline_stage_run_complete(
             config,
-            Artifact.dependency_hash(loaded_artifacts))
+            dependency_hash)
 
         return result
 
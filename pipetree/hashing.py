@@ -0,0 +1,312 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import bisect
+import hashlib
+import zlib
+from pipetree.exceptions import HashSchemeUnavailableError
+from pipetree.utils import advise_sequential
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# Size of the slices in which payloads are hashed and written
+CHUNK_SIZE = 1024 * 1024
+
+# Scheme of caches predating hash schemes, whose digests have no prefix
+LEGACY_HASH_SCHEME = "md5"
+
+
+class HashScheme(object):
+    """
+    A hash function for fingerprints: stage definitions, dependencies and
+    payload contents. Digests of every scheme but the legacy one start
+    with the scheme's prefix, so that uids name the scheme they were
+    made with and caches holding several schemes resolve unambiguously.
+    """
+    name = None
+    prefix = ""
+
+    def new(self, data=b""):
+        """
+        Returns a hash object with update(), digest() and hexdigest()
+        """
+        raise NotImplementedError
+
+    def hexdigest(self, h):
+        return self.prefix + str(h.hexdigest())
+
+
+class Md5HashScheme(HashScheme):
+    name = LEGACY_HASH_SCHEME
+
+    def new(self, data=b""):
+        return hashlib.md5(data)
+
+
+class Blake2bHashScheme(HashScheme):
+    """
+    BLAKE2b with a 128 bit digest, faster than MD5 on 64 bit machines
+    """
+    name = "blake2b"
+    prefix = "b2-"
+
+    def new(self, data=b""):
+        return hashlib.blake2b(data, digest_size=16)
+
+
+class Xxh3HashScheme(HashScheme):
+    """
+    128 bit XXH3, which isn't cryptographic but is faster still.
+    The xxhash package must be installed.
+    """
+    name = "xxh3"
+    prefix = "x3-"
+
+    def new(self, data=b""):
+        if xxhash is None:
+            raise HashSchemeUnavailableError(name=self.name,
+                                             package="xxhash")
+        return xxhash.xxh3_128(data)
+
+
+HASH_SCHEMES = {}
+
+
+def register_hash_scheme(scheme):
+    """
+    Makes a hash scheme available to backends by its name
+    """
+    HASH_SCHEMES[scheme.name] = scheme
+
+
+def get_hash_scheme(name=None):
+    """
+    Returns the hash scheme registered under a name, or None. Without a
+    name, returns the legacy scheme.
+    """
+    return HASH_SCHEMES.get(name or LEGACY_HASH_SCHEME)
+
+
+def hash_scheme_of(digest):
+    """
+    Returns the name of the hash scheme a digest was made with
+    """
+    for scheme in HASH_SCHEMES.values():
+        if scheme.prefix and digest.startswith(scheme.prefix):
+            return scheme.name
+    return LEGACY_HASH_SCHEME
+
+
+for scheme in [Md5HashScheme(), Blake2bHashScheme(), Xxh3HashScheme()]:
+    register_hash_scheme(scheme)
+
+
+def content_digest(data, scheme=None):
+    """
+    Returns the hex digest of a serialized payload, used to address
+    payloads by their content. `data` may also be a list of chunks.
+    """
+    scheme = scheme or get_hash_scheme()
+    h = scheme.new()
+    if isinstance(data, list):
+        for chunk in data:
+            h.update(chunk)
+    else:
+        h.update(data)
+    return scheme.hexdigest(h)
+
+
+def content_digests(datas, scheme=None):
+    """
+    Returns the digests of several serialized payloads at once, avoiding
+    per-call overhead when hashing many small payloads
+    """
+    scheme = scheme or get_hash_scheme()
+    new, hexdigest = scheme.new, scheme.hexdigest
+    return [hexdigest(new(data)) for data in datas]
+
+
+def file_digest(path, scheme=None, chunk_size=CHUNK_SIZE):
+    """
+    Returns the digest of a file's contents, read a chunk at a time
+    """
+    scheme = scheme or get_hash_scheme()
+    h = scheme.new()
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    with open(path, 'rb', buffering=0) as f:
+        advise_sequential(f.fileno())
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            h.update(view[:n])
+    return scheme.hexdigest(h)
+
+
+class HashingWriter(object):
+    """
+    Wraps a writable file, hashing bytes as they are written so that a
+    payload's digest is available without a second pass over it.
+    """
+    def __init__(self, f, chunk_size=CHUNK_SIZE, scheme=None):
+        self._f = f
+        self._scheme = scheme or get_hash_scheme()
+        self._hash = self._scheme.new()
+        self._chunk_size = chunk_size
+        self.bytes_written = 0
+
+    def write(self, data):
+        view = memoryview(data).cast('B')
+        for i in range(0, len(view), self._chunk_size):
+            chunk = view[i:i + self._chunk_size]
+            self._hash.update(chunk)
+            self._f.write(chunk)
+        self.bytes_written += len(view)
+        return len(view)
+
+    def hexdigest(self):
+        return self._scheme.hexdigest(self._hash)
+
+
+# Number of buckets the uids of each input stage are spread over, so that
+# adding or removing an input only rehashes the uids of its bucket
+DEPENDENCY_BUCKETS = 256
+
+
+def _bucket_of(uid):
+    return zlib.crc32(uid) % DEPENDENCY_BUCKETS
+
+
+def _bucket_digest(scheme, uids):
+    """
+    Digest of the sorted uids, as bytes, of one bucket
+    """
+    return scheme.new(b"\n".join(uids)).digest()
+
+
+def _group_digest(scheme, bucket_digests):
+    """
+    Digest of an input stage, over the digests of its non-empty buckets
+    """
+    h = scheme.new()
+    for index in sorted(bucket_digests):
+        h.update(bytes((index,)))
+        h.update(bucket_digests[index])
+    return h.digest()
+
+
+def _root_digest(scheme, group_digests):
+    """
+    Dependency hash over the digests of the input stages
+    """
+    h = scheme.new()
+    for stage in sorted(group_digests):
+        h.update(stage.encode('utf-8'))
+        h.update(b"\0")
+        h.update(group_digests[stage])
+    return scheme.hexdigest(h)
+
+
+def dependency_digest(stage_uids, scheme=None):
+    """
+    Returns the dependency hash of a set of inputs, given as
+    (pipeline stage, uid) pairs. The hash is a Merkle tree: the uids of
+    each stage are spread over buckets and sorted within them, so that
+    it doesn't depend on the order of the inputs.
+    """
+    scheme = scheme or get_hash_scheme()
+    groups = {}
+    for stage, uid in stage_uids:
+        uid = uid.encode('utf-8')
+        buckets = groups.setdefault(stage or "", {})
+        buckets.setdefault(_bucket_of(uid), []).append(uid)
+    return _root_digest(scheme, {
+        stage: _group_digest(scheme, {
+            index: _bucket_digest(scheme, sorted(bucket))
+            for index, bucket in buckets.items()})
+        for stage, buckets in groups.items()})
+
+
+def partition_digest(dependency_hash, scheme=None):
+    """
+    Returns the dependency hash of a stage run over a single partition,
+    given the dependency hash of the partition as an input. Partition
+    runs are keyed apart from runs of the whole stage, which may have
+    that same input.
+    """
+    scheme = scheme or get_hash_scheme()
+    return scheme.hexdigest(scheme.new(
+        b"partition:" + dependency_hash.encode('utf-8')))
+
+
+class DependencyHasher(object):
+    """
+    Computes the same hash as dependency_digest() incrementally, as
+    inputs are added and removed. Only the buckets changed since the
+    last digest are rehashed.
+    """
+    def __init__(self, stage_uids=(), scheme=None):
+        self._scheme = scheme or get_hash_scheme()
+        # Sorted uids of each bucket of each stage
+        self._buckets = {}
+        # Digests of each bucket of each stage, missing when stale
+        self._digests = {}
+        for stage, uid in stage_uids:
+            self.add(stage, uid)
+
+    def add(self, stage, uid):
+        uid = uid.encode('utf-8')
+        index = _bucket_of(uid)
+        buckets = self._buckets.setdefault(stage or "", {})
+        bisect.insort(buckets.setdefault(index, []), uid)
+        self._digests.setdefault(stage or "", {}).pop(index, None)
+
+    def remove(self, stage, uid):
+        """
+        Removes an input added before, raising KeyError if it wasn't
+        """
+        uid = uid.encode('utf-8')
+        index = _bucket_of(uid)
+        bucket = self._buckets.get(stage or "", {}).get(index, [])
+        position = bisect.bisect_left(bucket, uid)
+        if position == len(bucket) or bucket[position] != uid:
+            raise KeyError(uid)
+        del bucket[position]
+        self._digests[stage or ""].pop(index, None)
+        if len(bucket) == 0:
+            del self._buckets[stage or ""][index]
+            if len(self._buckets[stage or ""]) == 0:
+                del self._buckets[stage or ""]
+                del self._digests[stage or ""]
+
+    def hexdigest(self):
+        group_digests = {}
+        for stage, buckets in self._buckets.items():
+            digests = self._digests[stage]
+            for index, bucket in buckets.items():
+                if index not in digests:
+                    digests[index] = _bucket_digest(self._scheme, bucket)
+            group_digests[stage] = _group_digest(self._scheme, digests)
+        return _root_digest(self._scheme, group_digests)
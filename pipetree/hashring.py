@@ -0,0 +1,74 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import bisect
+import hashlib
+
+
+class ConsistentHashRing(object):
+    """
+    Map keys onto a set of nodes such that adding or removing a node
+    only relocates roughly 1/N of the keys.
+
+    Each node is placed on the ring at several points (replicas) to
+    smooth out the distribution of keys between nodes.
+    """
+    def __init__(self, nodes=None, replicas=64):
+        self._replicas = replicas
+        self._points = []
+        self._nodes = {}
+        for node in nodes or []:
+            self.add_node(node)
+
+    @staticmethod
+    def _point(key):
+        h = hashlib.md5(key.encode('utf-8'))
+        return int(h.hexdigest()[:16], 16)
+
+    def add_node(self, node):
+        for i in range(self._replicas):
+            point = self._point("%s#%d" % (node, i))
+            if point in self._nodes:
+                continue
+            bisect.insort(self._points, point)
+            self._nodes[point] = node
+
+    def remove_node(self, node):
+        for i in range(self._replicas):
+            point = self._point("%s#%d" % (node, i))
+            if self._nodes.get(point) == node:
+                del self._nodes[point]
+                self._points.remove(point)
+
+    def get_node(self, key):
+        """
+        Returns the node responsible for the given key
+        """
+        if len(self._points) == 0:
+            return None
+        idx = bisect.bisect(self._points, self._point(key))
+        if idx == len(self._points):
+            idx = 0
+        return self._nodes[self._points[idx]]
+
+    @property
+    def nodes(self):
+        return set(self._nodes.values())
@@ -0,0 +1,212 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Encodes and decodes JSON with the fastest library installed: orjson,
+ujson or python-rapidjson, falling back to the standard library.
+
+Engines may write JSON differently from one another, e.g. without
+spaces, so output which feeds a hash is written by canonical_dumps(),
+which matches the standard library's byte for byte.
+"""
+import json
+from pipetree.exceptions import UnknownJSONEngineError,\
+    JSONEngineUnavailableError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+try:
+    import rapidjson
+except ImportError:
+    rapidjson = None
+
+
+def _bytes(data):
+    if isinstance(data, memoryview):
+        return data.tobytes()
+    return data
+
+
+class JSONEngine(object):
+    """
+    A JSON library. Engines decode what the standard library writes,
+    falling back to it for what they don't support themselves, such as
+    NaN or integers beyond 64 bits.
+    """
+    name = None
+    package = None
+
+    def available(self):
+        return True
+
+    def dumps(self, obj, sort_keys=False, default=None):
+        """
+        Returns obj as UTF-8 encoded JSON
+        """
+        try:
+            return self._dumps(obj, sort_keys, default)
+        except (TypeError, ValueError, OverflowError):
+            return StdlibJSONEngine._dumps(self, obj, sort_keys, default)
+
+    def loads(self, data, object_pairs_hook=None):
+        """
+        Decodes JSON from text or a bytes-like object. Objects are decoded
+        by the standard library, which calls `object_pairs_hook` with
+        their pairs in order, if it's given.
+        """
+        if object_pairs_hook is not None:
+            return json.loads(_bytes(data),
+                              object_pairs_hook=object_pairs_hook)
+        try:
+            return self._loads(data)
+        except ValueError:
+            return json.loads(_bytes(data))
+
+    def _dumps(self, obj, sort_keys, default):
+        raise NotImplementedError
+
+    def _loads(self, data):
+        raise NotImplementedError
+
+
+class StdlibJSONEngine(JSONEngine):
+    name = "json"
+
+    def _dumps(self, obj, sort_keys, default):
+        return json.dumps(obj, sort_keys=sort_keys,
+                          default=default).encode('utf-8')
+
+    def _loads(self, data):
+        return json.loads(_bytes(data))
+
+
+class OrjsonJSONEngine(JSONEngine):
+    name = "orjson"
+    package = "orjson"
+
+    def available(self):
+        return orjson is not None
+
+    def _dumps(self, obj, sort_keys, default):
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=default, option=option)
+
+    def _loads(self, data):
+        return orjson.loads(data)
+
+
+class UjsonJSONEngine(JSONEngine):
+    name = "ujson"
+    package = "ujson"
+
+    def available(self):
+        return ujson is not None
+
+    def _dumps(self, obj, sort_keys, default):
+        return ujson.dumps(obj, sort_keys=sort_keys, default=default,
+                           ensure_ascii=False,
+                           escape_forward_slashes=False).encode('utf-8')
+
+    def _loads(self, data):
+        return ujson.loads(_bytes(data))
+
+
+class RapidjsonJSONEngine(JSONEngine):
+    name = "rapidjson"
+    package = "python-rapidjson"
+
+    def available(self):
+        return rapidjson is not None
+
+    def _dumps(self, obj, sort_keys, default):
+        return rapidjson.dumps(obj, sort_keys=sort_keys, default=default,
+                               ensure_ascii=False).encode('utf-8')
+
+    def _loads(self, data):
+        return rapidjson.loads(_bytes(data))
+
+
+# Engines by name, in order of preference
+JSON_ENGINES = {}
+
+
+def register_json_engine(engine):
+    JSON_ENGINES[engine.name] = engine
+
+
+for engine in [OrjsonJSONEngine(), UjsonJSONEngine(), RapidjsonJSONEngine(),
+               StdlibJSONEngine()]:
+    register_json_engine(engine)
+
+
+def get_json_engine(name=None):
+    """
+    Returns the engine registered under a name, or without a name, the
+    preferred engine installed
+    """
+    if name is None:
+        return next(engine for engine in JSON_ENGINES.values()
+                    if engine.available())
+    engine = JSON_ENGINES.get(name)
+    if engine is None:
+        raise UnknownJSONEngineError(name=name,
+                                     engines=sorted(JSON_ENGINES))
+    if not engine.available():
+        raise JSONEngineUnavailableError(name=name, package=engine.package)
+    return engine
+
+
+_engine = get_json_engine()
+
+
+def use_json_engine(name=None):
+    """
+    Sets the engine used by dumps() and loads(), by default the
+    preferred one installed
+    """
+    global _engine
+    _engine = get_json_engine(name)
+
+
+def dumps(obj, sort_keys=False, default=None):
+    return _engine.dumps(obj, sort_keys, default)
+
+
+def loads(data, object_pairs_hook=None):
+    return _engine.loads(data, object_pairs_hook)
+
+
+def canonical_dumps(obj, sort_keys=False):
+    """
+    Returns obj as UTF-8 encoded JSON, written exactly as the standard
+    library writes it, for output which feeds a hash
+    """
+    return json.dumps(obj, sort_keys=sort_keys).encode('utf-8')
@@ -20,9 +20,9 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 import os
-import json
 from collections import OrderedDict
 
+from pipetree import jsonengine
 from pipetree.config import PipelineStageConfig
 from pipetree.exceptions import InvalidPipelineConfigError
 
@@ -38,8 +38,8 @@ class JSONFileLoader(object):
     def load_file(self, path):
         full_path = _append_json_ext(path)
         with open(path, 'rb') as f:
-            content = f.read().decode('utf-8')
-            return json.loads(content, object_pairs_hook=OrderedDict)
+            # Stages are run in the order they're listed
+            return jsonengine.loads(f.read(), object_pairs_hook=OrderedDict)
 
 
 class PipelineConfigLoader():
@@ -0,0 +1,107 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Manifests of the files providers source artifacts from, recording each
+file's stat fingerprint and content digest, so that the digest of an
+unchanged file is known without reading it again.
+"""
+import hashlib
+import os
+import time
+import uuid
+from pipetree import metacodec
+
+# Files modified this recently may be modified again within the
+# timestamp granularity, without their fingerprint changing, so their
+# digests are only recorded once they're older
+RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+
+class SourceManifest(object):
+    """
+    Maps the names of a source's files to their size, mtime_ns, inode and
+    content digest, as of the last time they were read
+    """
+    def __init__(self, path, format=metacodec.JSON):
+        self.path = path
+        self._format = format
+        self._files = {}
+        self._seen = set()
+        self._changed = False
+        self._started_ns = int(time.time() * 1000 * 1000 * 1000)
+        try:
+            with open(path, 'rb') as f:
+                self._files = metacodec.loads(f.read())['files']
+        except FileNotFoundError:
+            pass
+
+    @classmethod
+    def for_source(cls, manifest_dir, source, format=metacodec.JSON):
+        """
+        Returns the manifest kept under manifest_dir for a source file or
+        directory
+        """
+        manifest_dir = os.path.expanduser(manifest_dir)
+        os.makedirs(manifest_dir, exist_ok=True)
+        name = hashlib.md5(
+            os.path.abspath(source).encode('utf-8')).hexdigest()
+        return cls(os.path.join(manifest_dir, name + ".manifest"), format)
+
+    def digest(self, name, stat):
+        """
+        Returns the digest recorded for a file, or None if it's new or
+        its fingerprint changed
+        """
+        self._seen.add(name)
+        entry = self._files.get(name)
+        if entry is not None and entry[0] == stat.st_size and \
+           entry[1] == stat.st_mtime_ns and entry[2] == stat.st_ino:
+            return entry[3]
+        return None
+
+    def record(self, name, stat, digest):
+        self._seen.add(name)
+        if stat.st_mtime_ns >= self._started_ns - RACY_WINDOW_NS:
+            if self._files.pop(name, None) is not None:
+                self._changed = True
+            return
+        entry = [stat.st_size, stat.st_mtime_ns, stat.st_ino, digest]
+        if self._files.get(name) != entry:
+            self._files[name] = entry
+            self._changed = True
+
+    def save(self):
+        """
+        Writes the manifest if it changed, dropping the files which
+        weren't looked up since it was loaded
+        """
+        for name in list(self._files):
+            if name not in self._seen:
+                del self._files[name]
+                self._changed = True
+        if not self._changed:
+            return
+        tmp_path = "%s.%s" % (self.path, uuid.uuid4().hex)
+        with open(tmp_path, 'wb') as f:
+            f.write(metacodec.dumps({"files": self._files}, self._format))
+        os.replace(tmp_path, self.path)
+        self._changed = False
@@ -0,0 +1,324 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Encodes artifact metadata documents: shared metadata files, stage run
+records, DynamoDB items and task messages.
+
+The binary format is a header of MAGIC and a version byte, followed by
+msgpack. Artifact metadata records within it are arrays of their fields
+in a fixed order rather than maps, with hex digests stored as raw bytes.
+Documents without the header are JSON, which older caches hold and which
+is written when msgpack isn't installed.
+"""
+import base64
+from pipetree import jsonengine
+from pipetree.exceptions import UnknownMetadataVersionError,\
+    UnknownMetadataFormatError
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "json"
+BINARY = "binary"
+FORMATS = (JSON, BINARY)
+
+MAGIC = b"PTM"
+VERSION = 1
+HEADER = MAGIC + bytes((VERSION,))
+
+# Prefix of binary documents encoded as text, for text only transports
+TEXT_HEADER = "PTM%d:" % VERSION
+
+# msgpack extension type of artifact metadata records
+META_EXT = 1
+
+# Fields of an artifact metadata record, in the order they're encoded in
+# by version 1. Other keys are kept in a map at the end of the record.
+META_FIELDS = (
+    "antecedents", "creation_time", "definition_hash", "specific_hash",
+    "dependency_hash", "pipeline_stage", "serialization_type",
+    "content_hash", "compression", "compression_dictionary",
+    "chunk_manifest", "delta_base", "delta_depth", "partitions",
+    "hash_scheme", "item")
+_FIELD_INDEX = {field: i for i, field in enumerate(META_FIELDS)}
+
+HASH_FIELDS = frozenset([
+    "definition_hash", "specific_hash", "dependency_hash", "content_hash",
+    "compression_dictionary"])
+
+
+class MetaRecord(object):
+    """
+    Marks a dictionary of artifact metadata within a document, to be
+    encoded as a record
+    """
+    __slots__ = ("meta",)
+
+    def __init__(self, meta):
+        self.meta = meta
+
+
+def metadata_format_for(name):
+    """
+    Returns the format to write metadata in given a configured one,
+    which is JSON if msgpack is missing
+    """
+    if name not in FORMATS:
+        raise UnknownMetadataFormatError(name=name, formats=list(FORMATS))
+    if name == BINARY and msgpack is None:
+        return JSON
+    return name
+
+
+def _pack_hash(value):
+    """
+    Returns a hex digest as raw bytes, or as [prefix, bytes] if it has a
+    hash scheme prefix. Other values are returned as they are.
+    """
+    if not isinstance(value, str):
+        return value
+    prefix, separator, digest = value.rpartition("-")
+    try:
+        raw = bytes.fromhex(digest)
+    except ValueError:
+        return value
+    if len(raw) == 0 or raw.hex() != digest:
+        return value
+    if separator:
+        return [prefix + separator, raw]
+    return raw
+
+
+def _unpack_hash(value):
+    if isinstance(value, bytes):
+        return value.hex()
+    if isinstance(value, list):
+        return value[0] + value[1].hex()
+    return value
+
+
+def _pack_uid(uid):
+    if not isinstance(uid, str) or uid.count("_") < 2:
+        return uid
+    definition_hash, rest = uid.split("_", 1)
+    specific_hash, dependency_hash = rest.rsplit("_", 1)
+    return [_pack_hash(definition_hash), _pack_hash(specific_hash),
+            _pack_hash(dependency_hash)]
+
+
+def _unpack_uid(value):
+    if not isinstance(value, list):
+        return value
+    return "_".join(_unpack_hash(part) for part in value)
+
+
+def _pack_chunk_manifest(manifest):
+    manifest = dict(manifest)
+    manifest["chunks"] = [_pack_hash(digest) for digest in manifest["chunks"]]
+    return manifest
+
+
+def _unpack_chunk_manifest(manifest):
+    manifest["chunks"] = [_unpack_hash(digest)
+                          for digest in manifest["chunks"]]
+    return manifest
+
+
+_PACKERS = {
+    "delta_base": _pack_uid,
+    "partitions": lambda uids: [_pack_uid(uid) for uid in uids],
+    "chunk_manifest": _pack_chunk_manifest,
+}
+_UNPACKERS = {
+    "delta_base": _unpack_uid,
+    "partitions": lambda uids: [_unpack_uid(uid) for uid in uids],
+    "chunk_manifest": _unpack_chunk_manifest,
+}
+for _field in HASH_FIELDS:
+    _PACKERS[_field] = _pack_hash
+    _UNPACKERS[_field] = _unpack_hash
+
+# Fields present and those among them needing conversion, by bit mask
+_layouts = {}
+
+
+def _layout(mask):
+    layout = _layouts.get(mask)
+    if layout is None:
+        fields = tuple(field for i, field in enumerate(META_FIELDS)
+                       if mask & (1 << i))
+        layout = (fields, tuple(field for field in fields
+                                if field in _PACKERS))
+        _layouts[mask] = layout
+    return layout
+
+
+def pack_meta(meta):
+    """
+    Returns the record of a dictionary of artifact metadata: a bit mask
+    of the fields present, their values, and a map of any other keys
+    """
+    mask = 0
+    for field in meta:
+        index = _FIELD_INDEX.get(field)
+        if index is not None:
+            mask |= 1 << index
+    fields, packed = _layout(mask)
+    record = [mask]
+    record.extend(meta[field] for field in fields)
+    for field in packed:
+        value = meta[field]
+        if value is not None:
+            record[1 + fields.index(field)] = _PACKERS[field](value)
+    if len(fields) < len(meta):
+        record.append({key: value for key, value in meta.items()
+                       if key not in _FIELD_INDEX})
+    return record
+
+
+def unpack_meta(record):
+    fields, packed = _layout(record[0])
+    meta = dict(zip(fields, record[1:]))
+    for field in packed:
+        value = meta[field]
+        if value is not None:
+            meta[field] = _UNPACKERS[field](value)
+    if len(record) > len(fields) + 1:
+        meta.update(record[-1])
+    return meta
+
+
+def _default(value):
+    if isinstance(value, MetaRecord):
+        return msgpack.ExtType(META_EXT, msgpack.packb(
+            pack_meta(value.meta), use_bin_type=True))
+    raise TypeError("Cannot encode %r in metadata" % type(value))
+
+
+def _ext_hook(code, data):
+    if code == META_EXT:
+        return unpack_meta(msgpack.unpackb(data, raw=False,
+                                           strict_map_key=False))
+    return msgpack.ExtType(code, data)
+
+
+def _json_default(value):
+    if isinstance(value, MetaRecord):
+        return value.meta
+    raise TypeError("Cannot encode %r in metadata" % type(value))
+
+
+def dumps(document, format=BINARY):
+    """
+    Encodes a document, in which artifact metadata may be marked with
+    MetaRecord, as bytes
+    """
+    if metadata_format_for(format) == JSON:
+        return jsonengine.dumps(document, sort_keys=True,
+                                default=_json_default)
+    return HEADER + msgpack.packb(document, use_bin_type=True,
+                                  default=_default)
+
+
+def loads(data):
+    """
+    Decodes a document encoded by dumps() in either format, or as JSON
+    by older versions. `data` may be bytes or text.
+    """
+    if isinstance(data, str):
+        if data.startswith(TEXT_HEADER[:len(MAGIC)]):
+            return loads_text(data)
+        return jsonengine.loads(data)
+    data = memoryview(data)
+    if data[:len(MAGIC)] != MAGIC:
+        return jsonengine.loads(data)
+    version = data[len(MAGIC)]
+    if version != VERSION:
+        raise UnknownMetadataVersionError(version=version)
+    if msgpack is None:
+        raise UnknownMetadataFormatError(
+            name="%s (msgpack is not installed)" % BINARY, formats=[JSON])
+    return msgpack.unpackb(data[len(HEADER):], raw=False,
+                           strict_map_key=False, ext_hook=_ext_hook)
+
+
+def dumps_text(document, format=BINARY):
+    """
+    Encodes a document as text, base64 encoding the binary format
+    """
+    data = dumps(document, format)
+    if data.startswith(HEADER):
+        return TEXT_HEADER + base64.b64encode(
+            data[len(HEADER):]).decode('ascii')
+    return data.decode('utf-8')
+
+
+def loads_text(text):
+    if text.startswith(TEXT_HEADER[:len(MAGIC)]):
+        version, _, body = text[len(MAGIC):].partition(":")
+        if version != str(VERSION):
+            raise UnknownMetadataVersionError(version=version)
+        return loads(HEADER + base64.b64decode(body))
+    return jsonengine.loads(text)
+
+
+def dumps_meta(meta, format=BINARY):
+    """
+    Encodes a dictionary of artifact metadata
+    """
+    return dumps(MetaRecord(meta), format)
+
+
+def dumps_meta_map(item_meta, format=BINARY):
+    """
+    Encodes a map from uids to artifact metadata, as stored in shared
+    metadata files. Uids which follow from the metadata are left out.
+    """
+    if metadata_format_for(format) == JSON:
+        return dumps(item_meta, format)
+    entries = []
+    for uid, meta in item_meta.items():
+        entries.append(None if uid == _uid_of(meta) else uid)
+        entries.append(pack_meta(meta))
+    return dumps(entries, format)
+
+
+def loads_meta_map(data):
+    document = loads(data)
+    if isinstance(document, dict):
+        return document
+    item_meta = {}
+    for i in range(0, len(document), 2):
+        meta = unpack_meta(document[i + 1])
+        item_meta[document[i] or _uid_of(meta)] = meta
+    return item_meta
+
+
+def _uid_of(meta):
+    try:
+        return "%s_%s_%s" % (meta["definition_hash"],
+                             meta["specific_hash"] or "",
+                             meta["dependency_hash"] or "")
+    except KeyError:
+        return None
@@ -0,0 +1,278 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import os.path
+import uuid
+import threading
+import distutils.dir_util
+from pipetree.utils import map_file
+
+
+class PackStore(object):
+    """
+    Append small payloads into shared pack files, similar to git packfiles,
+    to avoid paying per-file overhead for every tiny artifact.
+
+    Each pack is accompanied by an index file of `uid offset length` lines,
+    so payloads are read back by (pack, offset, length). Removed payloads
+    are recorded by a tombstone line, `uid -1 length`, in the index of
+    their pack. Packs are named uniquely per writer, so several processes
+    may share a directory. Lookups which miss load the index entries
+    appended since, so that payloads other processes packed are found.
+
+    compact() rewrites the live payloads of full packs which are mostly
+    removed payloads into the current pack, then deletes them. Packs
+    still being appended to are never full, so they're left alone.
+    """
+    PACK_EXT = ".pack"
+    INDEX_EXT = ".idx"
+    TOMBSTONE = -1
+
+    def __init__(self, path, max_pack_size=64 * 1024 * 1024,
+                 max_dead_ratio=0.5):
+        self.path = path
+        self.max_pack_size = max_pack_size
+        self.max_dead_ratio = max_dead_ratio
+        self._lock = threading.Lock()
+        self._index = None
+        # Bytes of each index file loaded so far
+        self._index_offsets = {}
+        # Bytes of payloads appended to each pack, and of those removed
+        self._pack_bytes = {}
+        self._dead_bytes = {}
+        self._current_pack = None
+        self._current_size = 0
+
+    def _load_index(self):
+        """
+        Loads the entries appended to the index files of the directory's
+        packs since they were last loaded, including those of packs other
+        processes created. Returns whether there were any.
+        """
+        if self._index is None:
+            self._index = {}
+        if not os.path.isdir(self.path):
+            return False
+        # Final state of each uid by pack, applied once all indexes are
+        # read so that a removal in one pack can't hide another's entry
+        changes = []
+        for name in sorted(os.listdir(self.path)):
+            if not name.endswith(self.INDEX_EXT):
+                continue
+            path = os.path.join(self.path, name)
+            offset = self._index_offsets.get(name, 0)
+            try:
+                if os.path.getsize(path) <= offset:
+                    continue
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            # Index files are only appended to, but the last line may not
+            # have been written in full yet
+            data = data[:data.rfind(b"\n") + 1]
+            self._index_offsets[name] = offset + len(data)
+            pack = name[:-len(self.INDEX_EXT)]
+            entries = {}
+            for line in data.decode('utf-8').splitlines():
+                parts = line.split()
+                if len(parts) != 3:
+                    continue
+                uid, entry_offset, length = \
+                    parts[0], int(parts[1]), int(parts[2])
+                if entry_offset == self.TOMBSTONE:
+                    self._dead_bytes[pack] = \
+                        self._dead_bytes.get(pack, 0) + length
+                    entries[uid] = None
+                else:
+                    self._pack_bytes[pack] = \
+                        self._pack_bytes.get(pack, 0) + length
+                    entries[uid] = (pack, entry_offset, length)
+            changes.append((pack, entries))
+
+        for pack, entries in changes:
+            for uid, location in entries.items():
+                current = self._index.get(uid)
+                if location is None and current is not None and \
+                   current[0] == pack:
+                    del self._index[uid]
+        loaded = False
+        for pack, entries in changes:
+            for uid, location in entries.items():
+                current = self._index.get(uid)
+                if location is not None and \
+                   (current is None or current[0] == pack):
+                    self._index[uid] = location
+                    loaded = True
+        return loaded
+
+    def _reload_index(self):
+        """
+        Loads every index again, dropping the entries of deleted packs
+        """
+        self._index = None
+        self._index_offsets = {}
+        self._pack_bytes = {}
+        self._dead_bytes = {}
+        self._load_index()
+
+    def _ensure_index(self):
+        if self._index is None:
+            self._load_index()
+        return self._index
+
+    def _new_pack(self):
+        distutils.dir_util.mkpath(self.path)
+        self._current_pack = "pack-%s" % uuid.uuid4().hex
+        self._current_size = 0
+
+    def locate(self, uid):
+        """
+        Returns (pack, offset, length) for a packed payload, or None
+        """
+        with self._lock:
+            location = self._ensure_index().get(uid)
+            if location is None and self._load_index():
+                # The payload may have been packed since the index loaded
+                location = self._index.get(uid)
+            return location
+
+    def __contains__(self, uid):
+        return self.locate(uid) is not None
+
+    def append(self, uid, data):
+        """
+        Appends a payload to the current pack, returning its location
+        """
+        with self._lock:
+            index = self._ensure_index()
+            if self._current_pack is None or \
+               self._current_size >= self.max_pack_size:
+                self._new_pack()
+            pack = self._current_pack
+            offset = self._current_size
+
+            # Write the payload before its index entry, so that a crash
+            # never leaves an index entry pointing at missing data.
+            with open(os.path.join(self.path, pack + self.PACK_EXT),
+                      'ab') as f:
+                f.write(data)
+            self._write_index_line(pack, uid, offset, len(data))
+
+            self._current_size += len(data)
+            index[uid] = (pack, offset, len(data))
+            return index[uid]
+
+    def _write_index_line(self, pack, uid, offset, length, create=True):
+        """
+        Appends an entry to a pack's index. Raises FileNotFoundError if the
+        index doesn't exist and `create` isn't set.
+        """
+        flags = os.O_WRONLY | os.O_APPEND | (os.O_CREAT if create else 0)
+        fd = os.open(os.path.join(self.path, pack + self.INDEX_EXT), flags,
+                     0o644)
+        with open(fd, 'a') as f:
+            f.write("%s %d %d\n" % (uid, offset, length))
+
+    def remove(self, uid):
+        """
+        Records a tombstone for a packed payload, returning whether it was
+        packed. Its bytes are reclaimed once its pack is compacted.
+        """
+        with self._lock:
+            location = self._ensure_index().get(uid)
+            if location is None and self._load_index():
+                location = self._index.get(uid)
+            while location is not None:
+                pack, _, length = location
+                try:
+                    self._write_index_line(pack, uid, self.TOMBSTONE, length,
+                                           create=False)
+                except FileNotFoundError:
+                    # Its pack was compacted by another process
+                    self._reload_index()
+                    location = self._index.get(uid)
+                    continue
+                del self._index[uid]
+                return True
+            return False
+
+    def compact(self):
+        """
+        Rewrites the live payloads of full packs whose share of removed
+        bytes exceeds `max_dead_ratio`, then deletes those packs.
+        Returns the number of payloads moved.
+        """
+        with self._lock:
+            self._load_index()
+            packs = [pack for pack, size in self._pack_bytes.items()
+                     if pack != self._current_pack and
+                     size >= self.max_pack_size and
+                     self._dead_bytes.get(pack, 0) >
+                     size * self.max_dead_ratio]
+        moved = 0
+        for pack in packs:
+            with self._lock:
+                live = [(uid, location) for uid, location
+                        in self._index.items() if location[0] == pack]
+            for uid, location in live:
+                data = map_file(os.path.join(self.path,
+                                             pack + self.PACK_EXT),
+                                location[1], location[2])
+                self.append(uid, data)
+                moved += 1
+            with self._lock:
+                # The index goes first, so that no reader finds entries
+                # without their pack
+                for ext in [self.INDEX_EXT, self.PACK_EXT]:
+                    try:
+                        os.remove(os.path.join(self.path, pack + ext))
+                    except FileNotFoundError:
+                        pass
+                self._pack_bytes.pop(pack, None)
+                self._dead_bytes.pop(pack, None)
+                self._index_offsets.pop(pack + self.INDEX_EXT, None)
+        return moved
+
+    def read(self, uid):
+        """
+        Returns the packed payload for the given uid
+        """
+        location = self.locate(uid)
+        if location is None:
+            return None
+        try:
+            return self._map(location)
+        except FileNotFoundError:
+            # Its pack was compacted since the index was loaded
+            with self._lock:
+                self._reload_index()
+                location = self._index.get(uid)
+            if location is None:
+                raise
+            return self._map(location)
+
+    def _map(self, location):
+        pack, offset, length = location
+        return map_file(os.path.join(self.path, pack + self.PACK_EXT),
+                        offset, length)
@@ -28,8 +28,8 @@ from pipetree.stage import PipelineStageFactory
 from pipetree.loaders import PipelineConfigLoader
 from pipetree.exceptions import DuplicateStageNameError
 from pipetree.futures import InputFuture
-from pipetree.backend import STAGE_COMPLETE, STAGE_IN_PROGRESS
-from pipetree.artifact import Artifact
+from pipetree.backend import STAGE_COMPLETE, STAGE_IN_PROGRESS,\
+    SAVE_BATCH_SIZE
 
 
 class DependencyChain(object):
@@ -112,7 +112,7 @@ class Pipeline(object):
         input artifacts.
         """
         stage = self._stages[stage_name]
-        dependency_hash = Artifact.dependency_hash(input_artifacts)
+        dependency_hash = backend.dependency_hash(input_artifacts)
         status = backend.pipeline_stage_run_status(
             stage, dependency_hash)
         if status == STAGE_COMPLETE or status == STAGE_IN_PROGRESS:
@@ -120,15 +120,18 @@ class Pipeline(object):
                 stage._config, dependency_hash)
             self._log("Loaded %d cached artifacts for stage %s" %\
                       (len(cached_arts), stage_name))
-            loaded_arts = []
-            for art in cached_arts:
-                loaded = backend.load_artifact(art)
+            # Payloads are only read once a downstream stage uses them
+            loaded_arts = backend.load_artifacts(cached_arts, lazy=True)
+            for loaded in loaded_arts:
                 loaded._loaded_from_cache = True
-                loaded_arts.append(loaded)
             return loaded_arts
         else:
             return None
 
+    def _save_fresh(self, artifacts, backend):
+        backend.save_artifacts(artifacts)
+        backend.release_payloads(artifacts)
+
     async def _run_stage(self, stage_name, input_artifacts,
                          executor, backend):
         """
@@ -150,22 +153,34 @@ class Pipeline(object):
         # returning generated artifacts
         stage = self._stages[stage_name]
         result = []
-        dependency_hash = Artifact.dependency_hash(input_artifacts)
-
-        task = executor.create_task(self._stages[stage_name],
-                                    input_artifacts)
-        artifacts = await task.generate_artifacts()
-
-        for art in artifacts:
-            if hasattr(art, "_remotely_produced"):
+        dependency_hash = backend.dependency_hash(input_artifacts)
+
+        stage.bind_backend(backend)
+        task = executor.create_task(stage, input_artifacts)
+
+        # Fresh artifacts are saved in batches as they're generated, so
+        # that an interrupted stage keeps what it produced, and their
+        # payloads are read back from the cache rather than kept in memory
+        fresh = []
+        while True:
+            art = await task.next_artifact()
+            if art is None:
+                break
+            if art._remotely_produced:
                 self._log("Remotely produced artifact for %s" % stage_name)
                 result.append(art)
-            else:
-                self._log("Yielding fresh artifact for stage %s" % stage_name)
+                continue
+            self._log("Yielding fresh artifact for stage %s" % stage_name)
+            if art.item.payload_loaded:
+                # Payloads streamed to the backend aren't read back
                 self._log("\tPayload: %s " % str(art.item.payload)[0:50])
-                art = self._ensure_artifact_meta(art, dependency_hash)
-                backend.save_artifact(art)
-                result.append(art)
+            art = self._ensure_artifact_meta(art, dependency_hash)
+            fresh.append(art)
+            result.append(art)
+            if len(fresh) >= SAVE_BATCH_SIZE:
+                self._save_fresh(fresh, backend)
+                fresh = []
+        self._save_fresh(fresh, backend)
 
         self._log("Done generating stage %s" % stage_name)
         backend.log_pipeline_stage_run_complete(stage, dependency_hash)
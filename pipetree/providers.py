@@ -22,10 +22,18 @@
 import os
 import os.path
 import copy
-from pipetree.utils import attach_config_to_object
+import fnmatch
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pipetree import metacodec
+from pipetree.utils import attach_config_to_object, read_file
 from pipetree.exceptions import ArtifactSourceDoesNotExistError,\
     ArtifactProviderMissingParameterError
 from pipetree.artifact import Artifact
+from pipetree.hashing import content_digest, file_digest
+from pipetree.manifests import SourceManifest
+from pipetree.references import FileReference,\
+    FILE_REFERENCE_SERIALIZATION_TYPE
 
 
 class ArtifactProvider(object):
@@ -80,8 +88,39 @@ class ParameterArtifactProvider(ArtifactProvider):
         return art
 
 
+def _read_text(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+
+def _patterns(patterns):
+    if isinstance(patterns, str):
+        return [patterns]
+    return patterns
+
+
+def _matches(patterns, relative_path, name):
+    return patterns is not None and any(
+        fnmatch.fnmatch(relative_path, pattern) or
+        fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+
+def _result(pending):
+    if isinstance(pending, Future):
+        return pending.result()
+    return pending
+
+
 class LocalFileArtifactProvider(ArtifactProvider):
+    """
+    Sources an artifact holding the contents of a file. With
+    `manifest_dir` set, the file's digest is kept in a manifest there,
+    and while the file is unchanged it's only read once its payload is
+    used. Manifests are written in `metadata_format`, as for backends.
+    """
     DEFAULTS = {
+        'manifest_dir': None,
+        'metadata_format': metacodec.JSON
     }
 
     def __init__(self, path='', stage_config=None, **kwargs):
@@ -109,18 +148,59 @@ class LocalFileArtifactProvider(ArtifactProvider):
 
     def _yield_artifact(self):
         artifact_path = os.path.join(os.getcwd(), self._path)
-        content = ""
-        with open(artifact_path, 'r') as f:
-            content = f.read()
+        stat = os.stat(artifact_path)
+        manifest = None
+        digest = None
+        if self.manifest_dir is not None:
+            manifest = SourceManifest.for_source(self.manifest_dir,
+                                                 artifact_path,
+                                                 self.metadata_format)
+            digest = manifest.digest(os.path.basename(artifact_path), stat)
 
         art = Artifact(self._stage_config)
-        art.item.payload = content
+        if digest is None:
+            content = _read_text(artifact_path)
+            digest = content_digest(content.encode('utf-8'))
+            art.item.payload = content
+        else:
+            art.item.lazy_payload(lambda: _read_text(artifact_path))
+        art._specific_hash = digest
+
+        if manifest is not None:
+            manifest.record(os.path.basename(artifact_path), stat, digest)
+            manifest.save()
         return art
 
 
 class LocalDirectoryArtifactProvider(ArtifactProvider):
+    """
+    Sources an artifact per file of a directory, and of its
+    subdirectories if `recursive` is set, in order of file path.
+    `include` and `exclude` are glob patterns, or lists of them, matched
+    against each file's path relative to the directory and against its
+    name. Excluded directories aren't descended into.
+
+    Artifacts hold the file's contents if `read_content` is set, or
+    otherwise a FileReference to it, which also fingerprints its contents
+    if `hash_content` is set. Files are read and hashed concurrently by
+    `read_workers` threads, and artifacts yielded in order as their
+    files are read.
+
+    With `manifest_dir` set, file digests are kept in a manifest there.
+    Files whose size, mtime and inode are unchanged keep their digest,
+    and so their artifact's uid, without being read: their contents are
+    only read once their payload is used. Manifests are written in
+    `metadata_format`, as for backends.
+    """
     DEFAULTS = {
-        'read_content': False
+        'read_content': False,
+        'hash_content': False,
+        'manifest_dir': None,
+        'recursive': False,
+        'include': None,
+        'exclude': None,
+        'read_workers': 8,
+        'metadata_format': metacodec.JSON
     }
 
     def __init__(self, path='', stage_config=None, **kwargs):
@@ -131,6 +211,8 @@ class LocalDirectoryArtifactProvider(ArtifactProvider):
                 parameter="stage_config")
         self._stage_config = stage_config
         self._root = path
+        self._include = _patterns(self.include)
+        self._exclude = _patterns(self.exclude)
         self._validate_dir()
 
     def _validate_config(self):
@@ -142,17 +224,87 @@ class LocalDirectoryArtifactProvider(ArtifactProvider):
                 provider=self.__class__.__name__,
                 source='directory: %s' % os.path.join(os.getcwd(), self._root))
 
+    def _walk(self, relative_dir=''):
+        """
+        Yields (relative path, stat) for each file to source, depth first
+        in order of name
+        """
+        with os.scandir(os.path.join(self._root, relative_dir)) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+        for entry in entries:
+            relative_path = os.path.join(relative_dir, entry.name)
+            if _matches(self._exclude, relative_path, entry.name):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                if self.recursive:
+                    yield from self._walk(relative_path)
+            elif entry.is_file() and (
+                    self._include is None or
+                    _matches(self._include, relative_path, entry.name)):
+                yield relative_path, entry.stat()
+
+    def _reads_file(self, artifact_name, manifest, stat):
+        if not (self.read_content or self.hash_content):
+            return False
+        return manifest is None or \
+            manifest.digest(artifact_name, stat) is None
+
     def _yield_artifacts(self):
-        for entry in os.listdir(self._root):
-            yield self._yield_artifact(entry)
+        manifest = None
+        if self.manifest_dir is not None:
+            manifest = SourceManifest.for_source(self.manifest_dir,
+                                                 self._root,
+                                                 self.metadata_format)
+        workers = max(1, self.read_workers)
+        # Artifacts, or futures of those whose file is being read, in order
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for artifact_name, stat in self._walk():
+                if self._reads_file(artifact_name, manifest, stat):
+                    pending.append(pool.submit(self._yield_artifact,
+                                               artifact_name, manifest, stat))
+                else:
+                    pending.append(self._yield_artifact(artifact_name,
+                                                        manifest, stat))
+                # Yield what's ready, bounding how many files are held
+                while pending and (len(pending) > 2 * workers or
+                                   not isinstance(pending[0], Future) or
+                                   pending[0].done()):
+                    yield _result(pending.popleft())
+            while pending:
+                yield _result(pending.popleft())
+        if manifest is not None:
+            manifest.save()
 
-    def _yield_artifact(self, artifact_name):
+    def _yield_artifact(self, artifact_name, manifest=None, stat=None):
         artifact_path = os.path.join(os.getcwd(),
                                      self._root,
                                      artifact_name)
+        if stat is None:
+            stat = os.stat(artifact_path)
+        digest = None
+        if manifest is not None:
+            digest = manifest.digest(artifact_name, stat)
+
         if self.read_content:
-            with open(artifact_path, 'rb') as f:
-                art = Artifact(self._stage_config)
-                art.item.payload = f.read()
-                return art
-        return artifact_path
+            art = Artifact(self._stage_config,
+                           serialization_type="bytestream")
+            if digest is None:
+                art.item.payload = read_file(artifact_path)
+                digest = content_digest(art.item.payload)
+            else:
+                art.item.lazy_payload(lambda: read_file(artifact_path))
+            art._specific_hash = digest
+        else:
+            if self.hash_content and digest is None:
+                digest = file_digest(artifact_path)
+            reference = FileReference.from_path(artifact_path, stat=stat)
+            reference.content_hash = digest
+            art = Artifact(
+                self._stage_config,
+                serialization_type=FILE_REFERENCE_SERIALIZATION_TYPE)
+            art.item.payload = reference
+
+        if manifest is not None and digest is not None:
+            manifest.record(artifact_name, stat, digest)
+        return art
@@ -0,0 +1,119 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+References to local files, which artifacts carry as their payload in
+place of the files' contents so that large source files are neither read
+into memory nor copied into the cache.
+"""
+import os
+from pipetree.exceptions import FileReferenceChangedError
+from pipetree.hashing import file_digest
+
+FILE_REFERENCE_SERIALIZATION_TYPE = "file_reference"
+
+
+class FileReference(object):
+    """
+    The absolute path of a file along with its fingerprint: size,
+    modification time, inode and optionally a digest of its contents.
+
+    An artifact holding a reference is stored as the reference alone, and
+    its specific hash follows from the fingerprint, so that stages
+    depending on it run again when the file changes. Consuming stages
+    open() the file themselves once they need it.
+    """
+    __slots__ = ("path", "size", "mtime_ns", "inode", "content_hash")
+
+    def __init__(self, path, size, mtime_ns, inode, content_hash=None):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.inode = inode
+        self.content_hash = content_hash
+
+    @classmethod
+    def from_path(cls, path, hash_content=False, scheme=None, stat=None):
+        """
+        Fingerprints a file, hashing its contents too if `hash_content`
+        is set. `stat` may be given if the file was stat'ed already.
+        """
+        path = os.path.abspath(path)
+        if stat is None:
+            stat = os.stat(path)
+        content_hash = None
+        if hash_content:
+            content_hash = file_digest(path, scheme)
+        return cls(path, stat.st_size, stat.st_mtime_ns, stat.st_ino,
+                   content_hash)
+
+    def to_dict(self):
+        return {"path": self.path, "size": self.size,
+                "mtime_ns": self.mtime_ns, "inode": self.inode,
+                "content_hash": self.content_hash}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["path"], d["size"], d["mtime_ns"], d["inode"],
+                   d.get("content_hash"))
+
+    def matches(self, stat):
+        return (stat.st_size == self.size and
+                stat.st_mtime_ns == self.mtime_ns and
+                stat.st_ino == self.inode)
+
+    def changed(self):
+        """
+        Returns whether the file is missing or its size, modification
+        time or inode differ from the fingerprint
+        """
+        try:
+            return not self.matches(os.stat(self.path))
+        except FileNotFoundError:
+            return True
+
+    def open(self, mode='rb', verify=True):
+        """
+        Opens the referenced file, by default raising
+        FileReferenceChangedError if it changed since it was fingerprinted
+        """
+        f = open(self.path, mode)
+        if verify and not self.matches(os.fstat(f.fileno())):
+            f.close()
+            raise FileReferenceChangedError(path=self.path)
+        return f
+
+    def read(self, verify=True):
+        with self.open('rb', verify) as f:
+            return f.read()
+
+    def __fspath__(self):
+        return self.path
+
+    def __eq__(self, other):
+        return isinstance(other, FileReference) and \
+            self.to_dict() == other.to_dict()
+
+    def __hash__(self):
+        return hash((self.path, self.size, self.mtime_ns, self.inode))
+
+    def __repr__(self):
+        return "FileReference(%r, size=%d)" % (self.path, self.size)
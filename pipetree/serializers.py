@@ -0,0 +1,430 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import io
+import pickle
+import struct
+from pipetree import jsonengine
+from pipetree.exceptions import SerializerUnavailableError
+from pipetree.references import FileReference,\
+    FILE_REFERENCE_SERIALIZATION_TYPE
+from pipetree.utils import map_file, config_for_item_type
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+DEFAULT_SERIALIZATION_TYPE = "json"
+
+# Out-of-band pickle buffers are aligned so that arrays loaded from a
+# memory map are aligned as well
+BUFFER_ALIGNMENT = 64
+
+# Pickle protocol 5, and so the pickle5 serialization type, needs Python 3.8
+PICKLE5_AVAILABLE = pickle.HIGHEST_PROTOCOL >= 5
+
+
+def byteview(buf):
+    """
+    Returns a flat memoryview of bytes over any buffer-protocol object,
+    copying only if its memory isn't contiguous
+    """
+    if isinstance(buf, str):
+        buf = buf.encode('utf-8')
+    view = memoryview(buf)
+    if view.ndim == 1 and view.format == 'B':
+        return view
+    if view.nbytes == 0:
+        return memoryview(b'')
+    if not view.c_contiguous:
+        view = memoryview(view.tobytes())
+    return view.cast('B')
+
+
+def join_chunks(chunks):
+    """
+    Joins serialized chunks into a single buffer, without copying when
+    there is only one
+    """
+    if len(chunks) == 1:
+        return chunks[0]
+    return b''.join(chunks)
+
+
+def decode_stringlike(stringlike):
+    if isinstance(stringlike, (bytes, bytearray, memoryview)):
+        return str(stringlike, 'utf-8')
+    if isinstance(stringlike, str):
+        return stringlike
+    return None
+
+
+class Serializer(object):
+    """
+    Converts payloads to and from bytes.
+
+    serialize() returns a list of buffers which are written back to back,
+    so that large buffers needn't be copied into a single bytes object.
+    deserialize() receives a bytes-like object, usually a memoryview.
+
+    Serializers relying on an optional package which isn't installed are
+    unavailable, and payloads are serialized with their `fallback`
+    serialization type instead, if they have one.
+    """
+    name = None
+    available = True
+    fallback = None
+
+    def serialize(self, payload):
+        raise NotImplementedError
+
+    def deserialize(self, data):
+        raise NotImplementedError
+
+    def deserialize_file(self, path):
+        """
+        Loads a payload stored as a whole file. Serializers may override
+        this to load the file lazily, e.g. as a memory map.
+        """
+        return self.deserialize(map_file(path))
+
+    def read_columns(self, source, columns):
+        """
+        Loads only the given columns of a tabular payload, from the path
+        of a file holding it or from a readable, seekable binary stream.
+        Serializers able to skip the other columns' bytes override this.
+        """
+        if isinstance(source, str):
+            payload = self.deserialize_file(source)
+        else:
+            payload = self.deserialize(source.read())
+        return select_columns(payload, columns)
+
+
+def select_columns(table, columns):
+    """
+    Returns the given columns of a table, which may be an Arrow table, a
+    DataFrame, or a dictionary of columns
+    """
+    if isinstance(table, dict):
+        return {column: table[column] for column in columns}
+    if hasattr(table, 'select'):
+        return table.select(columns)
+    return table[list(columns)]
+
+
+class JSONSerializer(Serializer):
+    name = "json"
+
+    def serialize(self, payload):
+        # Written as the standard library writes it, since it's hashed
+        return [jsonengine.canonical_dumps(payload)]
+
+    def deserialize(self, data):
+        return jsonengine.loads(data)
+
+
+class StringSerializer(Serializer):
+    name = "string"
+
+    def serialize(self, payload):
+        return [byteview(payload)]
+
+    def deserialize(self, data):
+        return decode_stringlike(data)
+
+
+class BytestreamSerializer(Serializer):
+    name = "bytestream"
+
+    def serialize(self, payload):
+        return [byteview(payload)]
+
+    def deserialize(self, data):
+        return byteview(data)
+
+
+class FileReferenceSerializer(Serializer):
+    """
+    Stores a FileReference in place of the file it references
+    """
+    name = FILE_REFERENCE_SERIALIZATION_TYPE
+
+    def serialize(self, payload):
+        # Written canonically, since it's hashed into the specific hash
+        return [jsonengine.canonical_dumps(payload.to_dict(),
+                                           sort_keys=True)]
+
+    def deserialize(self, data):
+        return FileReference.from_dict(jsonengine.loads(data))
+
+
+class Pickle5Serializer(Serializer):
+    """
+    Pickles payloads with protocol 5, keeping large buffers such as NumPy
+    arrays out of band. The layout is a header of lengths, the pickle
+    stream, then each buffer, aligned to BUFFER_ALIGNMENT:
+
+        <uint32 buffer count> <uint64 pickle length> <uint64 buffer length>*
+
+    Buffers are written and loaded in place, so payloads loaded from a
+    memory map reference it rather than a copy, and are read-only.
+
+    Only registered where pickle supports protocol 5, from Python 3.8.
+    """
+    name = "pickle5"
+
+    def serialize(self, payload):
+        buffers = []
+        stream = pickle.dumps(payload, protocol=5,
+                              buffer_callback=buffers.append)
+        raws = [buffer.raw() for buffer in buffers]
+        header = struct.pack('<I%dQ' % (len(raws) + 1),
+                             len(raws), len(stream),
+                             *[len(raw) for raw in raws])
+
+        chunks = [header, stream]
+        offset = len(header) + len(stream)
+        for raw in raws:
+            padding = -offset % BUFFER_ALIGNMENT
+            if padding:
+                chunks.append(bytes(padding))
+            chunks.append(raw)
+            offset += padding + len(raw)
+        return chunks
+
+    def deserialize(self, data):
+        view = byteview(data)
+        count, = struct.unpack_from('<I', view)
+        lengths = struct.unpack_from('<%dQ' % (count + 1), view, 4)
+        offset = 4 + 8 * (count + 1)
+        stream = view[offset:offset + lengths[0]]
+        offset += lengths[0]
+
+        buffers = []
+        for length in lengths[1:]:
+            offset += -offset % BUFFER_ALIGNMENT
+            buffers.append(view[offset:offset + length])
+            offset += length
+        return pickle.loads(stream, buffers=buffers)
+
+
+class MsgpackSerializer(Serializer):
+    """
+    Serializes payloads with msgpack, which must be installed
+    """
+    name = "msgpack"
+
+    def _require_msgpack(self):
+        if msgpack is None:
+            raise SerializerUnavailableError(name=self.name,
+                                             package="msgpack")
+
+    def serialize(self, payload):
+        self._require_msgpack()
+        return [msgpack.packb(payload, use_bin_type=True)]
+
+    def deserialize(self, data):
+        self._require_msgpack()
+        return msgpack.unpackb(data, raw=False)
+
+
+class NdarraySerializer(Serializer):
+    """
+    Stores NumPy arrays in the .npy layout. Payloads stored as files are
+    loaded as read-only memory maps, so that readers only touch the pages
+    they use and processes share the OS page cache.
+    """
+    name = "ndarray"
+
+    def _require_numpy(self):
+        if numpy is None:
+            raise SerializerUnavailableError(name=self.name,
+                                             package="numpy")
+
+    def serialize(self, payload):
+        self._require_numpy()
+        array = numpy.asanyarray(payload)
+        if array.dtype.hasobject:
+            # Object arrays can only be pickled, so are written as a whole
+            f = io.BytesIO()
+            numpy.save(f, array, allow_pickle=True)
+            return [f.getvalue()]
+
+        if not array.flags.c_contiguous:
+            array = numpy.ascontiguousarray(array)
+        header = io.BytesIO()
+        numpy.lib.format.write_array_header_2_0(
+            header, numpy.lib.format.header_data_from_array_1_0(array))
+        return [header.getvalue(), byteview(array)]
+
+    def deserialize(self, data):
+        self._require_numpy()
+        view = byteview(data)
+
+        # Parse the header alone, without copying the array data
+        if view[6] == 1:
+            header_length, = struct.unpack_from('<H', view, 8)
+            header_end = 10 + header_length
+            read_header = numpy.lib.format.read_array_header_1_0
+        else:
+            header_length, = struct.unpack_from('<I', view, 8)
+            header_end = 12 + header_length
+            read_header = numpy.lib.format.read_array_header_2_0
+        f = io.BytesIO(view[:header_end])
+        numpy.lib.format.read_magic(f)
+        shape, fortran_order, dtype = read_header(f)
+        if dtype.hasobject:
+            return numpy.load(io.BytesIO(view), allow_pickle=True)
+        count = 1
+        for dim in shape:
+            count *= dim
+        array = numpy.frombuffer(view, dtype=dtype, count=count,
+                                 offset=header_end)
+        return array.reshape(shape, order='F' if fortran_order else 'C')
+
+    def deserialize_file(self, path):
+        self._require_numpy()
+        return numpy.load(path, mmap_mode='r', allow_pickle=False)
+
+
+class ArrowTableSerializer(Serializer):
+    """
+    Stores tables in the Arrow IPC file format, which Feather v2 files
+    share. Tables stored as files are memory mapped, so their columns are
+    read without copying, and only the pages of the columns used.
+
+    Payloads may be Arrow tables or record batches, pandas DataFrames, or
+    dictionaries of columns; they're loaded as Arrow tables. Without
+    pyarrow, payloads fall back to pickle5 where it's available.
+    """
+    name = "arrow"
+    available = pyarrow is not None
+    fallback = "pickle5" if PICKLE5_AVAILABLE else None
+
+    def _require_pyarrow(self):
+        if pyarrow is None:
+            raise SerializerUnavailableError(name=self.name,
+                                             package="pyarrow")
+
+    def _table(self, payload):
+        if isinstance(payload, pyarrow.Table):
+            return payload
+        if isinstance(payload, pyarrow.RecordBatch):
+            return pyarrow.Table.from_batches([payload])
+        if isinstance(payload, dict):
+            return pyarrow.table(payload)
+        return pyarrow.Table.from_pandas(payload)
+
+    def serialize(self, payload):
+        self._require_pyarrow()
+        table = self._table(payload)
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        return [memoryview(sink.getvalue())]
+
+    def deserialize(self, data):
+        self._require_pyarrow()
+        # The table's columns are views of the given buffer
+        return pyarrow.ipc.open_file(
+            pyarrow.py_buffer(byteview(data))).read_all()
+
+    def deserialize_file(self, path):
+        self._require_pyarrow()
+        return pyarrow.ipc.open_file(
+            pyarrow.memory_map(path, 'r')).read_all()
+
+    def read_columns(self, source, columns):
+        self._require_pyarrow()
+        if isinstance(source, str):
+            source = pyarrow.memory_map(source, 'r')
+        else:
+            source = pyarrow.PythonFile(source, mode='r')
+        schema = pyarrow.ipc.open_file(source).schema
+        fields = []
+        for column in columns:
+            index = schema.get_field_index(column)
+            if index == -1:
+                raise KeyError(column)
+            fields.append(index)
+        # Only the buffers of the included fields are read
+        reader = pyarrow.ipc.open_file(
+            source,
+            options=pyarrow.ipc.IpcReadOptions(included_fields=fields))
+        return reader.read_all().select(list(columns))
+
+
+SERIALIZERS = {}
+
+
+def register_serializer(serializer):
+    """
+    Makes a serializer available as a serialization type by its name
+    """
+    SERIALIZERS[serializer.name] = serializer
+
+
+def get_serializer(name):
+    """
+    Returns the serializer registered under a name, or None
+    """
+    return SERIALIZERS.get(name)
+
+
+def serialization_type_for(stage_config, item_type):
+    """
+    Returns the serialization type a stage configures for an item type.
+
+    A stage's `serialization` entry is either a serialization type, or a
+    dictionary from item types to serialization types, in which the
+    "default" entry covers item types without one of their own.
+
+    Unavailable serialization types are replaced by their fallback.
+    """
+    name = config_for_item_type(stage_config, 'serialization', item_type) \
+        or DEFAULT_SERIALIZATION_TYPE
+    serializer = get_serializer(name)
+    if serializer is not None and not serializer.available and \
+       serializer.fallback is not None:
+        return serializer.fallback
+    return name
+
+
+for serializer in [JSONSerializer(), StringSerializer(),
+                   BytestreamSerializer(), FileReferenceSerializer(),
+                   MsgpackSerializer(), NdarraySerializer(),
+                   ArrowTableSerializer()]:
+    register_serializer(serializer)
+if PICKLE5_AVAILABLE:
+    register_serializer(Pickle5Serializer())
@@ -0,0 +1,296 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pipetree.artifact import Artifact, Item
+from pipetree.compression import NO_COMPRESSION
+from pipetree.hashing import HashingWriter, get_hash_scheme
+from pipetree.serializers import byteview
+
+# Smallest part S3 accepts in a multipart upload, other than the last
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class ArtifactWriter(io.RawIOBase):
+    """
+    Writable binary stream of an artifact's serialized payload, which is
+    passed on to the backend's sinks as it's written rather than held in
+    memory. The payload is compressed with the artifact's codec and hashed
+    on the way.
+
+    Closing the writer finalizes the artifact, which the stage may then
+    yield, and which is saved without its payload being serialized again.
+    Leaving a `with` block on an exception, or never closing the writer,
+    aborts the payload instead.
+    """
+    def __init__(self, artifact, sinks, finalize, compress=True,
+                 scheme=None):
+        super().__init__()
+        self.artifact = artifact
+        self._sinks = sinks
+        self._finalize = finalize
+        self._scheme = scheme or get_hash_scheme()
+        self._writer = HashingWriter(_Fanout(sinks), scheme=self._scheme)
+        # Digest of the payload before compression, identifying it
+        self._payload_hash = self._scheme.new()
+        self._compressor = None
+        if compress:
+            self._compressor = artifact._codec().compressor()
+            if self._compressor is None:
+                artifact._compression = NO_COMPRESSION
+            artifact._compression_dictionary = None
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._checkClosed()
+        view = byteview(data)
+        if self._compressor is None:
+            self._writer.write(view)
+        else:
+            self._payload_hash.update(view)
+            compressed = self._compressor.compress(view)
+            if len(compressed) > 0:
+                self._writer.write(compressed)
+        return len(view)
+
+    @property
+    def bytes_written(self):
+        """
+        Number of bytes of the stored payload written so far
+        """
+        return self._writer.bytes_written
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._compressor is not None:
+                tail = self._compressor.flush()
+                if len(tail) > 0:
+                    self._writer.write(tail)
+            for sink in self._sinks:
+                sink.close()
+            if self.artifact._specific_hash is None and \
+               self._compressor is not None:
+                self.artifact._specific_hash = \
+                    self._scheme.hexdigest(self._payload_hash)
+            self._finalize(self.artifact, self._writer.hexdigest(),
+                           self._writer.bytes_written)
+        except BaseException:
+            self._abort_sinks()
+            raise
+        finally:
+            super().close()
+
+    def abort(self):
+        """
+        Discards what has been written, leaving the artifact unfinished
+        """
+        if self.closed:
+            return
+        self._abort_sinks()
+        super().close()
+
+    def _abort_sinks(self):
+        for sink in self._sinks:
+            try:
+                sink.abort()
+            except Exception:
+                pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+    def __del__(self):
+        self.abort()
+
+
+class _Fanout(object):
+    """
+    Writes each piece of data to several sinks in turn
+    """
+    def __init__(self, sinks):
+        self._sinks = sinks
+
+    def write(self, data):
+        for sink in self._sinks:
+            sink.write(data)
+
+
+class FileSink(object):
+    """
+    Writes a payload to a file, which is removed if aborted
+    """
+    def __init__(self, path):
+        self.path = path
+        self._f = open(path, 'wb')
+
+    def write(self, data):
+        self._f.write(data)
+
+    def close(self):
+        self._f.close()
+
+    def abort(self):
+        self._f.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class MemorySink(object):
+    """
+    Holds a payload in memory, for backends without a streaming sink
+    """
+    def __init__(self):
+        self._buffer = io.BytesIO()
+
+    def write(self, data):
+        self._buffer.write(data)
+
+    def getbuffer(self):
+        return self._buffer.getbuffer()
+
+    def close(self):
+        pass
+
+    def abort(self):
+        self._buffer = io.BytesIO()
+
+
+class S3MultipartSink(object):
+    """
+    Uploads a payload to an S3 object while it's written, as a multipart
+    upload whose parts are sent by `workers` threads. Writes block while
+    `workers` parts are in flight, so at most that many parts plus the
+    one being filled are held in memory. Payloads smaller than one part
+    are uploaded with a single PUT.
+    """
+    def __init__(self, client, bucket, key,
+                 part_size=MIN_PART_SIZE, workers=4):
+        self._client = client
+        self._bucket = bucket
+        self.key = key
+        self._part_size = max(part_size, MIN_PART_SIZE)
+        self._workers = workers
+        self._slots = threading.Semaphore(workers)
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._pool = None
+        self._parts = []
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= self._part_size:
+            part = bytes(self._buffer[:self._part_size])
+            del self._buffer[:self._part_size]
+            self._upload_part(part)
+
+    def _upload_part(self, data):
+        if self._upload_id is None:
+            self._upload_id = self._client.create_multipart_upload(
+                Bucket=self._bucket, Key=self.key)['UploadId']
+            self._pool = ThreadPoolExecutor(max_workers=self._workers)
+        self._slots.acquire()
+        self._parts.append(self._pool.submit(
+            self._send_part, len(self._parts) + 1, data))
+
+    def _send_part(self, number, data):
+        try:
+            response = self._client.upload_part(Bucket=self._bucket,
+                                                Key=self.key,
+                                                UploadId=self._upload_id,
+                                                PartNumber=number,
+                                                Body=data)
+            return {'ETag': response['ETag'], 'PartNumber': number}
+        finally:
+            self._slots.release()
+
+    def close(self):
+        if self._upload_id is None:
+            self._client.put_object(Bucket=self._bucket,
+                                    Key=self.key,
+                                    Body=bytes(self._buffer))
+            self._buffer = bytearray()
+            return
+        if len(self._buffer) > 0:
+            self._upload_part(bytes(self._buffer))
+            self._buffer = bytearray()
+        parts = [future.result() for future in self._parts]
+        self._pool.shutdown()
+        self._client.complete_multipart_upload(
+            Bucket=self._bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            MultipartUpload={'Parts': parts})
+
+    def abort(self):
+        self._buffer = bytearray()
+        if self._upload_id is None:
+            return
+        self._pool.shutdown()
+        self._client.abort_multipart_upload(Bucket=self._bucket,
+                                            Key=self.key,
+                                            UploadId=self._upload_id)
+
+
+def buffered_artifact_writer(artifact):
+    """
+    Returns an ArtifactWriter holding the payload in memory, which is
+    deserialized into the artifact's item once closed
+    """
+    sink = MemorySink()
+
+    def finalize(artifact, digest, size):
+        artifact.load_payload(bytes(sink.getbuffer()))
+
+    return ArtifactWriter(artifact, [sink], finalize, compress=False)
+
+
+class ArtifactOutputs(object):
+    """
+    Opens writers for the artifacts produced by a stage, which stream
+    their payloads to the backend the stage is bound to
+    """
+    def __init__(self, stage_config, backend=None):
+        self._config = stage_config
+        self._backend = backend
+
+    def open(self, item_type=None, specific_hash=None,
+             serialization_type="bytestream", meta=None, tags=None):
+        """
+        Returns an ArtifactWriter for a new artifact. Once the writer is
+        closed, its `artifact` is to be yielded by the stage.
+        """
+        artifact = Artifact(self._config,
+                            Item(None, meta or {}, tags or [], item_type),
+                            serialization_type=serialization_type)
+        artifact._specific_hash = specific_hash
+        if self._backend is None:
+            return buffered_artifact_writer(artifact)
+        return self._backend.open_artifact_writer(artifact)
@@ -20,21 +20,45 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 import os
+import time
 import inspect
 import importlib.util
+from concurrent.futures import ThreadPoolExecutor
 from pipetree.providers import LocalDirectoryArtifactProvider,\
     LocalFileArtifactProvider,\
     ParameterArtifactProvider
+from pipetree import metacodec
 from pipetree.exceptions import InvalidConfigurationFileError
-from pipetree.artifact import Artifact
+from pipetree.artifact import Artifact, Item
+from pipetree.backend import STAGE_COMPLETE
+from pipetree.hashing import partition_digest
+from pipetree.sinks import ArtifactOutputs
+
+# Number of partitions a partitioned stage processes at once by default
+DEFAULT_PARTITION_WORKERS = 4
 
 
 class BasePipelineStage(object):
     """Base class for a pipeline stage"""
+    # Backend to which the stage may stream the artifacts it produces
+    _backend = None
+
     def __init__(self, config):
         if self._validate_config(config):
             self._config = config
 
+    def bind_backend(self, backend):
+        """
+        Set the backend the stage's artifacts are saved to. Providers
+        write source manifests in the backend's metadata format, unless
+        the stage sets its own.
+        """
+        self._backend = backend
+        source = getattr(self, '_artifact_source', None)
+        if source is not None and \
+           not hasattr(self._config, 'metadata_format'):
+            source.metadata_format = backend._metadata_format
+
     def validate_prereqs(self, previous_stages):
         raise NotImplementedError
 
@@ -64,7 +88,8 @@ class ParameterPipelineStage(BasePipelineStage):
 
     def params_from_config(self, config):
         """ Extract parameters from a config"""
-        exclude = ['type', 'raw_config', 'parent_class']
+        exclude = ['type', 'raw_config', 'parent_class',
+                   '_hash', '_hashes', '_frozen']
         params = {}
         for prop in dir(config):
             value = getattr(config, prop)
@@ -97,7 +122,10 @@ class LocalFilePipelineStage(BasePipelineStage):
         super().__init__(config)
         self._artifact_source = LocalFileArtifactProvider(
             path=config.filepath,
-            stage_config=config)
+            stage_config=config,
+            manifest_dir=getattr(config, 'manifest_dir', None),
+            metadata_format=getattr(config, 'metadata_format',
+                                    metacodec.JSON))
 
     def validate_prereqs(self, previous_stages):
         return True
@@ -168,9 +196,13 @@ class LocalDirectoryPipelineStage(BasePipelineStage):
 
     def __init__(self, config):
         super().__init__(config)
+        options = {key: getattr(config, key)
+                   for key in LocalDirectoryArtifactProvider.DEFAULTS
+                   if hasattr(config, key)}
         self._artifact_source = LocalDirectoryArtifactProvider(
             path=config.filepath,
-            stage_config=config)
+            stage_config=config,
+            **options)
 
     def validate_prereqs(self, previous_stages):
         return True
@@ -229,7 +261,87 @@ class ExecutorPipelineStage(BasePipelineStage):
         pass
 
     def yield_artifacts(self, input_artifacts=None):
-        yield self._fn()
+        if not self._fn_accepts_inputs():
+            yield self._fn()
+            return
+
+        if getattr(self._config, 'partitioned', False):
+            yield self._process_partitions(input_artifacts or [])
+            return
+
+        inputs = self._inputs(input_artifacts or [])
+        if self._fn_accepts_outputs():
+            # Outputs open writers streaming payloads to the backend
+            yield self._fn(inputs, ArtifactOutputs(self._config,
+                                                   self._backend))
+            return
+        yield self._fn(inputs)
+
+    def _inputs(self, input_artifacts):
+        """
+        Inputs are passed as payloads, or as streams of the serialized
+        payloads for stages with an `input_mode` of "stream"
+        """
+        if getattr(self._config, 'input_mode', 'payload') == 'stream':
+            return [artifact.open() for artifact in input_artifacts]
+        return [artifact.item.payload for artifact in input_artifacts]
+
+    def _process_partitions(self, input_artifacts):
+        """
+        Calls the stage's function on each partition of its inputs, with
+        `partition_workers` partitions at once, returning a partitioned
+        artifact of the results. Inputs which aren't partitioned count as
+        a single partition.
+
+        Each partition's result is cached as a stage run of its own, so
+        that only partitions which changed are processed again.
+        """
+        partitions = []
+        for artifact in input_artifacts:
+            if artifact.is_partitioned:
+                partitions += artifact._partition_artifacts
+            else:
+                partitions.append(artifact)
+        workers = getattr(self._config, 'partition_workers',
+                          DEFAULT_PARTITION_WORKERS)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(self._process_partition, partitions))
+        return Artifact.partitioned(self._config, results)
+
+    def _process_partition(self, partition):
+        backend = self._backend
+        if backend is not None:
+            dependency_hash = backend.partition_dependency_hash(partition)
+        else:
+            dependency_hash = partition_digest(
+                Artifact.dependency_hash([partition]))
+        if backend is not None and backend.pipeline_stage_run_status(
+                self, dependency_hash) == STAGE_COMPLETE:
+            cached = backend.find_pipeline_stage_run_artifacts(
+                self._config, dependency_hash)
+            if len(cached) == 1:
+                return backend.load_artifacts(cached, lazy=True)[0]
+
+        result = self._fn(self._inputs([partition]))
+        if not isinstance(result, Artifact):
+            result = Artifact(self._config, Item(result))
+        result._dependency_hash = dependency_hash
+        result._creation_time = float(time.time())
+        if backend is not None:
+            backend.save_artifact(result)
+            backend.log_pipeline_stage_run_complete(self, dependency_hash)
+        return result
+
+    def _fn_accepts_inputs(self):
+        """
+        Functions are called without arguments unless their stage sets
+        `accepts_inputs`. Partitioned stages always pass their inputs.
+        """
+        return getattr(self._config, 'accepts_inputs', False) or \
+            getattr(self._config, 'partitioned', False)
+
+    def _fn_accepts_outputs(self):
+        return getattr(self._config, 'output_mode', 'payload') == 'stream'
 
     def _validate_config(self, config):
         if not hasattr(config, 'inputs'):
@@ -245,6 +357,29 @@ class ExecutorPipelineStage(BasePipelineStage):
             raise InvalidConfigurationFileError(
                 configurable=self.__class__.__name__,
                 reason='expected \'execute\' entry of type string')
+        if getattr(config, 'input_mode', 'payload') not in ['payload',
+                                                            'stream']:
+            raise InvalidConfigurationFileError(
+                configurable=self.__class__.__name__,
+                reason='expected \'input_mode\' to be one of '
+                '\'payload\' or \'stream\'')
+        if getattr(config, 'output_mode', 'payload') not in ['payload',
+                                                             'stream']:
+            raise InvalidConfigurationFileError(
+                configurable=self.__class__.__name__,
+                reason='expected \'output_mode\' to be one of '
+                '\'payload\' or \'stream\'')
+        if getattr(config, 'output_mode', 'payload') == 'stream' and \
+           not getattr(config, 'accepts_inputs', False):
+            raise InvalidConfigurationFileError(
+                configurable=self.__class__.__name__,
+                reason='expected \'accepts_inputs\' for an \'output_mode\' '
+                'of \'stream\'')
+        if getattr(config, 'partitioned', False) and \
+           getattr(config, 'partition_workers', 1) < 1:
+            raise InvalidConfigurationFileError(
+                configurable=self.__class__.__name__,
+                reason='expected \'partition_workers\' to be positive')
         return True
 
 
@@ -0,0 +1,74 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import io
+
+# Bytes fetched at once when reading a stream of byte ranges
+DEFAULT_READ_AHEAD = 1024 * 1024
+
+
+class RangeReader(io.RawIOBase):
+    """
+    Seekable raw stream over a payload of `size` bytes, reading byte
+    ranges on demand with read_range(offset, length)
+    """
+    def __init__(self, read_range, size):
+        super().__init__()
+        self._read_range = read_range
+        self._size = size
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        if offset < 0:
+            raise ValueError("negative seek position %d" % offset)
+        self._position = offset
+        return self._position
+
+    def readinto(self, b):
+        length = min(len(b), self._size - self._position)
+        if length <= 0:
+            return 0
+        data = self._read_range(self._position, length)
+        b[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+def open_range_stream(read_range, size, read_ahead=DEFAULT_READ_AHEAD):
+    """
+    Returns a buffered, seekable binary stream reading byte ranges with
+    read_range(offset, length), at least `read_ahead` bytes at a time
+    """
+    return io.BufferedReader(RangeReader(read_range, size),
+                             buffer_size=read_ahead)
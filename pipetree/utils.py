@@ -19,11 +19,17 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import mmap
+import os
 import re
 
 
 PYTHONIC_NAME = re.compile('^[_a-zA-Z][_a-zA-Z0-9]*$')
 
+# Files read in ranges smaller than this many bytes are copied rather than
+# memory mapped
+MAP_THRESHOLD = 1024 * 1024
+
 
 def name_is_pythonic(name):
     return PYTHONIC_NAME.match(name)
@@ -32,3 +38,64 @@ def name_is_pythonic(name):
 def attach_config_to_object(obj, config):
     for key, value in config.items():
         setattr(obj, key, value)
+
+
+def config_for_item_type(stage_config, key, item_type):
+    """
+    Returns a stage's setting for an item type. The setting is either a
+    single value, or a dictionary from item types to values, in which the
+    "default" entry covers item types without one of their own.
+    """
+    value = getattr(stage_config, key, None)
+    if isinstance(value, dict):
+        value = value.get(item_type, value.get('default'))
+    return value
+
+
+def map_file(path, offset=0, length=None, threshold=MAP_THRESHOLD):
+    """
+    Returns a read-only memoryview over a file's bytes, from `offset` and
+    of `length` bytes if given. Ranges of at least `threshold` bytes are
+    backed by a memory map rather than a copy. Smaller ones are read, so
+    that no map or file descriptor is held open for them.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        end = size if length is None else min(size, offset + length)
+        if end - offset < threshold or end <= offset:
+            f.seek(offset)
+            return memoryview(f.read(max(end - offset, 0)))
+        mapped = _map_descriptor(f.fileno())
+    return memoryview(mapped)[offset:end]
+
+
+def _map_descriptor(fd):
+    """
+    Maps a file read-only, closing the map's own duplicate of the
+    descriptor where supported (Python 3.13+)
+    """
+    try:
+        return mmap.mmap(fd, 0, access=mmap.ACCESS_READ, trackfd=False)
+    except TypeError:
+        return mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+
+
+def advise_sequential(fd):
+    """
+    Hints that a file will be read sequentially and in full, so that the
+    kernel reads ahead aggressively. Does nothing where unsupported.
+    """
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+
+def read_file(path):
+    """
+    Returns the contents of a file, read sequentially in one call
+    """
+    with open(path, 'rb', buffering=0) as f:
+        advise_sequential(f.fileno())
+        return f.readall()
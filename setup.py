@@ -9,6 +9,17 @@ install_requires = [
     'boto3==1.4.2',
 ]
 
+extras_require = {
+    'msgpack': ['msgpack'],
+    'zstd': ['zstandard'],
+    'lz4': ['lz4'],
+    'arrow': ['pyarrow'],
+    'xxhash': ['xxhash'],
+    'orjson': ['orjson'],
+    'ujson': ['ujson'],
+    'rapidjson': ['python-rapidjson'],
+}
+
 setup(
     name='pipetree',
     version=pipetree_version,
@@ -20,8 +31,9 @@ setup(
     license='MIT',
     zip_safe=False,
     keywords='pipetree',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks']),
     install_requires=install_requires,
+    extras_require=extras_require,
     entry_points={
         'console_scripts': [
             'pipetree = pipetree.cli:main',
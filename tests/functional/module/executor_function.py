@@ -1,2 +1,25 @@
 def function():
     yield from ['foo', 'bar', 'baz']
+
+
+def with_defaults(value='default'):
+    yield value
+
+
+def read_headers(inputs):
+    yield from [stream.read(3) for stream in inputs]
+
+
+def write_outputs(inputs, outputs):
+    for payload in inputs:
+        with outputs.open(item_type="upper") as writer:
+            writer.write(payload.upper())
+        yield writer.artifact
+
+
+def count_calls(inputs):
+    count_calls.calls += 1
+    return [value * 2 for value in inputs[0]]
+
+
+count_calls.calls = 0
@@ -50,7 +50,7 @@ class TestServer(unittest.TestCase):
         asyncio.set_event_loop(loop)
 
     def tearDown(self):
-        pass
+        self.fs.__exit__(None, None, None)
 
     def generate_pipeline_config(self):
         return OrderedDict([(
@@ -20,8 +20,12 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 import unittest
+from tests import isolated_filesystem
+from pipetree.backend import LocalArtifactBackend
 from pipetree.config import PipelineStageConfig
 from pipetree.stage import PipelineStageFactory
+from pipetree.artifact import Artifact, Item
+from pipetree.exceptions import InvalidConfigurationFileError
 
 
 class TestExecutorPipelineStage(unittest.TestCase):
@@ -42,3 +46,92 @@ class TestExecutorPipelineStage(unittest.TestCase):
             res = list(x)
 
         self.assertEqual(res, ['foo', 'bar', 'baz'])
+
+    def test_optional_parameters(self):
+        self.data["execute"] = \
+            "tests.functional.module.executor_function.with_defaults"
+        config = PipelineStageConfig('WithDefaults', self.data)
+        stage = self.factory.create_pipeline_stage(config)
+        inputs = [Artifact(config, Item(payload="foo"))]
+
+        res = []
+        for x in stage.yield_artifacts(input_artifacts=inputs):
+            res = list(x)
+
+        # Inputs are only passed to stages accepting them
+        self.assertEqual(res, ['default'])
+
+    def test_output_mode_needs_inputs(self):
+        self.data["output_mode"] = "stream"
+        config = PipelineStageConfig('WriteOutputs', self.data)
+        with self.assertRaises(InvalidConfigurationFileError):
+            self.factory.create_pipeline_stage(config)
+
+    def test_stream_inputs(self):
+        self.data["execute"] = \
+            "tests.functional.module.executor_function.read_headers"
+        self.data["accepts_inputs"] = True
+        self.data["input_mode"] = "stream"
+        config = PipelineStageConfig('ReadHeaders', self.data)
+        stage = self.factory.create_pipeline_stage(config)
+        inputs = [Artifact(config, Item(payload=payload),
+                           serialization_type="bytestream")
+                  for payload in [b"foobar", b"bazquux"]]
+
+        res = []
+        for x in stage.yield_artifacts(input_artifacts=inputs):
+            res = list(x)
+
+        self.assertEqual(res, [b'foo', b'baz'])
+
+    def test_outputs(self):
+        self.data["execute"] = \
+            "tests.functional.module.executor_function.write_outputs"
+        self.data["accepts_inputs"] = True
+        self.data["output_mode"] = "stream"
+        config = PipelineStageConfig('WriteOutputs', self.data)
+        stage = self.factory.create_pipeline_stage(config)
+        inputs = [Artifact(config, Item(payload=payload),
+                           serialization_type="bytestream")
+                  for payload in [b"foo", b"bar"]]
+
+        res = []
+        for x in stage.yield_artifacts(input_artifacts=inputs):
+            res = list(x)
+
+        self.assertEqual([art.item.payload for art in res], [b'FOO', b'BAR'])
+        self.assertEqual([art.item.type for art in res], ['upper', 'upper'])
+
+    def test_partitioned(self):
+        self.data["execute"] = \
+            "tests.functional.module.executor_function.count_calls"
+        self.data["partitioned"] = True
+        config = PipelineStageConfig('Double', self.data)
+        source_config = PipelineStageConfig('Source', {
+            "type": "ParameterPipelineStage"
+        })
+        stage = self.factory.create_pipeline_stage(config)
+
+        with isolated_filesystem():
+            backend = LocalArtifactBackend(path="./test_storage/")
+            stage.bind_backend(backend)
+            results = []
+            for i, shards in enumerate([[[1, 2], [3, 4], [5, 6]],
+                                        [[1, 2], [3, 5], [5, 6]]]):
+                source = Artifact.partitioned(source_config, shards)
+                source._dependency_hash = str(i)
+                backend.save_artifact(source)
+
+                query = Artifact(source_config)
+                query._specific_hash = source._specific_hash
+                query._dependency_hash = str(i)
+                loaded = backend.load_artifact(query)
+                self.assertEqual(loaded.item.payload, shards)
+
+                for result in stage.yield_artifacts(input_artifacts=[loaded]):
+                    results.append(result.item.payload)
+
+            # Only the changed partition was processed again
+            self.assertEqual(stage._module.count_calls.calls, 4)
+            self.assertEqual(results, [[[2, 4], [6, 8], [10, 12]],
+                                       [[2, 4], [6, 10], [10, 12]]])
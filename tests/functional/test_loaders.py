@@ -21,6 +21,7 @@
 # SOFTWARE.
 import unittest
 import json
+from collections import OrderedDict
 
 from pipetree.loaders import JSONFileLoader, PipelineConfigLoader
 from pipetree.exceptions import InvalidPipelineConfigError
@@ -64,6 +65,16 @@ class TestJSONLoader(unittest.TestCase):
             loaded_dict = loader.load_file(self.filename)
             self.assertEqual(self.dictionary, loaded_dict)
 
+    def test_nested_order(self):
+        with isolated_filesystem():
+            with open(self.filename, 'w') as f:
+                f.write('{"b": {"z": 1, "y": 2}, "a": {"x": 3, "w": 4}}')
+
+            loaded_dict = JSONFileLoader().load_file(self.filename)
+            self.assertEqual(list(loaded_dict), ["b", "a"])
+            self.assertIsInstance(loaded_dict["b"], OrderedDict)
+            self.assertEqual(list(loaded_dict["b"]), ["z", "y"])
+
 
 class TestPipelineConfigLoader(unittest.TestCase):
     def setUp(self):
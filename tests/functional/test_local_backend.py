@@ -19,15 +19,33 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import json
 import os
 import os.path
 import unittest
 from tests import isolated_filesystem
 
-from pipetree.exceptions import ArtifactMissingPayloadError
-from pipetree.backend import LocalArtifactBackend, STAGE_COMPLETE, STAGE_DOES_NOT_EXIST, STAGE_IN_PROGRESS
+from pipetree.exceptions import ArtifactMissingPayloadError,\
+    UnknownHashSchemeError
+from pipetree.backend import LocalArtifactBackend, STAGE_COMPLETE, STAGE_DOES_NOT_EXIST, STAGE_IN_PROGRESS, PACKS_DIR
 from pipetree.config import PipelineStageConfig
 from pipetree.artifact import Artifact, Item
+from pipetree.providers import LocalDirectoryArtifactProvider
+
+from pipetree.backend import DICTIONARY_SAMPLES
+from pipetree.compression import zstandard
+from pipetree.hashing import xxhash
+from pipetree.metacodec import msgpack, HEADER
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
 
 
 class TestLocalArtifactBackend(unittest.TestCase):
@@ -169,3 +187,765 @@ class TestLocalArtifactBackend(unittest.TestCase):
             artifact._dependency_hash)
 
         self.assertEqual(len(meta['artifacts']), 1)
+
+    def test_striped_roots(self):
+        roots = ["./disk_a/", "./disk_b/", "./disk_c/"]
+        backend = LocalArtifactBackend(path=roots)
+        artifacts = []
+        for i in range(30):
+            artifact = Artifact(self.stage_config)
+            artifact.item = Item(payload="SHRIM %d" % i)
+            artifact._specific_hash = str(i)
+            artifacts.append(artifact)
+        backend.save_artifacts(artifacts)
+
+        # Payloads are spread over every root, metadata lives on the first
+        used_roots = set()
+        for artifact in artifacts:
+            path = backend._artifact_payload_path(artifact)
+            self.assertTrue(os.path.exists(path))
+            used_roots.add(backend._artifact_root(artifact))
+        self.assertEqual(used_roots, set(roots))
+        self.assertTrue(os.path.exists(os.path.join(
+            roots[0], backend._relative_artifact_dir(artifacts[0]),
+            backend.metadata_file)))
+
+        loaded = backend.load_artifacts(artifacts)
+        for artifact, loaded_artifact in zip(artifacts, loaded):
+            self.assertEqual(loaded_artifact.item.payload,
+                             artifact.item.payload)
+
+    def test_add_root_rebalance(self):
+        roots = ["./disk_a/", "./disk_b/", "./disk_c/"]
+        backend = LocalArtifactBackend(path=roots)
+        artifacts = []
+        for i in range(200):
+            artifact = Artifact(self.stage_config)
+            artifact.item = Item(payload="SHRIM %d" % i)
+            artifact._specific_hash = str(i)
+            artifacts.append(artifact)
+        backend.save_artifacts(artifacts)
+
+        # Payloads remain readable before they're moved onto a new root
+        backend = LocalArtifactBackend(path=roots + ["./disk_d/"])
+        loaded = backend.load_artifact(artifacts[0])
+        self.assertEqual(loaded.item.payload, "SHRIM 0")
+
+        # Only roughly 1/N of the payloads migrate onto the new root
+        moved = backend.rebalance()
+        self.assertTrue(0 < moved < 100)
+        self.assertEqual(backend.rebalance(), 0)
+        for artifact in artifacts:
+            self.assertTrue(backend._artifact_payload_path(artifact)
+                            .startswith(backend._artifact_root(artifact)))
+
+    def test_pack_small_payloads(self):
+        backend = LocalArtifactBackend(path="./test_storage/",
+                                       pack_threshold=64)
+        artifacts = []
+        for i in range(10):
+            artifact = Artifact(self.stage_config)
+            artifact.item = Item(payload="SHRIM %d" % i)
+            artifact._specific_hash = str(i)
+            artifacts.append(artifact)
+        backend.save_artifacts(artifacts)
+
+        # No loose payload files are written for small artifacts
+        for artifact in artifacts:
+            self.assertFalse(os.path.exists(
+                backend._artifact_payload_path(artifact)))
+        self.assertEqual(1, len([name for name in os.listdir(
+            os.path.join("./test_storage/", PACKS_DIR))
+            if name.endswith(".pack")]))
+
+        backend = LocalArtifactBackend(path="./test_storage/",
+                                       pack_threshold=64)
+        for artifact in artifacts:
+            loaded = backend.load_artifact(artifact)
+            self.assertEqual(loaded.item.payload, artifact.item.payload)
+
+    def test_repack(self):
+        backend = LocalArtifactBackend(path="./test_storage/")
+        small = Artifact(self.stage_config)
+        small.item = Item(payload="SHRIM")
+        small._specific_hash = "small"
+        large = Artifact(self.stage_config)
+        large.item = Item(payload="SHRIM" * 100)
+        large._specific_hash = "large"
+        backend.save_artifacts([small, large])
+
+        backend = LocalArtifactBackend(path="./test_storage/",
+                                       pack_threshold=64)
+        self.assertEqual(backend.repack(), 1)
+        self.assertEqual(backend.repack(), 0)
+        self.assertFalse(os.path.exists(
+            backend._artifact_payload_path(small)))
+        self.assertTrue(os.path.exists(
+            backend._artifact_payload_path(large)))
+        self.assertEqual(backend.load_artifact(small).item.payload, "SHRIM")
+        self.assertEqual(backend.load_artifact(large).item.payload,
+                         "SHRIM" * 100)
+
+    def test_repack_concurrently(self):
+        backend = LocalArtifactBackend(path="./test_storage/")
+        small = Artifact(self.stage_config)
+        small.item = Item(payload="SHRIM")
+        small._specific_hash = "small"
+        backend.save_artifact(small)
+
+        reader = LocalArtifactBackend(path="./test_storage/",
+                                      pack_threshold=64)
+        self.assertEqual(reader.load_artifact(small).item.payload, "SHRIM")
+        cached = reader._find_cached_artifact(small)
+
+        # Another process packs the payload, after the reader loaded the
+        # index of its packs
+        repacker = LocalArtifactBackend(path="./test_storage/",
+                                        pack_threshold=64)
+        self.assertEqual(repacker.repack(), 1)
+
+        self.assertEqual(reader.load_artifact(small).item.payload, "SHRIM")
+        # A read of the loose file which lost the race finds the pack
+        self.assertEqual(bytes(reader._read_loose_payload(cached)),
+                         bytes(repacker._get_cached_artifact_payload(cached)))
+
+    def test_compact_packs(self):
+        backend = LocalArtifactBackend(path="./test_storage/",
+                                       pack_threshold=64, pack_size=20)
+        artifacts = []
+        for i in range(10):
+            artifact = Artifact(self.stage_config)
+            artifact.item = Item(payload="SHRIM %d" % i)
+            artifact._specific_hash = str(i)
+            artifacts.append(artifact)
+        backend.save_artifacts(artifacts)
+        packs_dir = os.path.join("./test_storage/", PACKS_DIR)
+        self.assertEqual(len([name for name in os.listdir(packs_dir)
+                              if name.endswith(".pack")]), 4)
+
+        reader = LocalArtifactBackend(path="./test_storage/",
+                                      pack_threshold=64)
+        self.assertEqual(reader.load_artifact(artifacts[8]).item.payload,
+                         "SHRIM 8")
+        removed = [artifacts[i] for i in [0, 2, 3, 4, 5, 6, 7]]
+        kept = [artifacts[i] for i in [1, 8, 9]]
+        for artifact in removed:
+            self.assertTrue(backend.delete_artifact(artifact))
+        # Removed payloads are recorded as tombstones
+        self.assertIsNone(LocalArtifactBackend(
+            path="./test_storage/")._packed_location(artifacts[0].get_uid()))
+
+        # Full packs which are mostly removed payloads are rewritten
+        self.assertEqual(backend.repack(), 2)
+        self.assertEqual(backend.repack(), 0)
+        self.assertEqual(len([name for name in os.listdir(packs_dir)
+                              if name.endswith(".pack")]), 1)
+        for artifact in kept:
+            # Readers which loaded the index before find the new packs
+            self.assertEqual(reader.load_artifact(artifact).item.payload,
+                             artifact.item.payload)
+
+    def test_inline_small_payloads(self):
+        backend = LocalArtifactBackend(path="./test_storage/",
+                                       inline_threshold=64)
+        small = Artifact(self.stage_config)
+        small.item = Item(payload={"learning_rate": 0.1})
+        small._specific_hash = "small"
+        large = Artifact(self.stage_config)
+        large.item = Item(payload="SHRIM" * 100)
+        large._specific_hash = "large"
+        backend.save_artifacts([small, large])
+
+        self.assertFalse(os.path.exists(
+            backend._artifact_payload_path(small)))
+        self.assertTrue(os.path.exists(
+            backend._artifact_payload_path(large)))
+
+        # The payload is returned along with the metadata
+        query = Artifact(self.stage_config)
+        query._specific_hash = "small"
+        found = backend._find_cached_artifact(query)
+        self.assertEqual(found._inline_payload,
+                         b'{"learning_rate": 0.1}')
+        self.assertEqual(backend.load_artifact(small).item.payload,
+                         {"learning_rate": 0.1})
+        self.assertEqual(backend.load_artifact(large).item.payload,
+                         "SHRIM" * 100)
+
+    def test_content_addressed_dedupe(self):
+        backend = LocalArtifactBackend(path="./test_storage/",
+                                       content_addressed=True,
+                                       gc_grace_period=0)
+        artifact_a = Artifact(self.stage_config)
+        artifact_a.item = Item(payload="SHRIM" * 100)
+        artifact_a._specific_hash = "a"
+        artifact_b = Artifact(self.stage_config)
+        artifact_b.item = Item(payload="SHRIM" * 100)
+        artifact_b._specific_hash = "b"
+        backend.save_artifacts([artifact_a, artifact_b])
+
+        # Identical payloads are stored once
+        self.assertEqual(artifact_a._content_hash, artifact_b._content_hash)
+        self.assertEqual(backend._artifact_payload_path(artifact_a),
+                         backend._artifact_payload_path(artifact_b))
+        self.assertEqual(len(list(backend._iter_objects())), 1)
+
+        query = Artifact(self.stage_config)
+        query._specific_hash = "b"
+        self.assertEqual(backend.load_artifact(query).item.payload,
+                         "SHRIM" * 100)
+
+        # The payload is only collected once no artifact references it
+        backend.delete_artifact(artifact_a)
+        self.assertEqual(backend.collect_garbage(), 0)
+        self.assertEqual(backend.load_artifact(query).item.payload,
+                         "SHRIM" * 100)
+        backend.delete_artifact(artifact_b)
+        self.assertEqual(backend.collect_garbage(), 1)
+        self.assertEqual(len(list(backend._iter_objects())), 0)
+
+    def test_collect_garbage_grace_period(self):
+        backend = LocalArtifactBackend(path="./test_storage/",
+                                       content_addressed=True)
+        artifact = Artifact(self.stage_config)
+        artifact.item = Item(payload="SHRIM" * 100)
+        artifact._specific_hash = "a"
+        backend.save_artifact(artifact)
+        backend.delete_artifact(artifact)
+
+        # Objects written within the grace period are kept
+        self.assertEqual(backend.collect_garbage(), 0)
+        path = backend._find_object(artifact._content_hash)
+        stale = os.path.getmtime(path) - backend.gc_grace_period - 1
+        os.utime(path, (stale, stale))
+        self.assertEqual(backend.collect_garbage(), 1)
+        self.assertIsNone(backend._find_object(artifact._content_hash))
+
+    def test_content_hash_specific_hash(self):
+        backend = LocalArtifactBackend(path="./test_storage/")
+        artifact_a = Artifact(self.stage_config)
+        artifact_a.item = Item(payload="SHRIM")
+        artifact_b = Artifact(self.stage_config)
+        artifact_b.item = Item(payload="SHRIMP")
+        backend.save_artifacts([artifact_a, artifact_b])
+
+        # Artifacts without a specific hash are identified by their content
+        self.assertEqual(artifact_a._specific_hash, artifact_a._content_hash)
+        self.assertNotEqual(artifact_a.get_uid(), artifact_b.get_uid())
+
+        query = Artifact(self.stage_config)
+        query._specific_hash = artifact_b._content_hash
+        loaded = backend.load_artifact(query)
+        self.assertEqual(loaded.item.payload, "SHRIMP")
+        self.assertEqual(loaded._content_hash, artifact_b._content_hash)
+        self.assertFalse(os.listdir(os.path.join("./test_storage/", ".tmp")))
+
+    def test_bytestream_payload(self):
+        backend = LocalArtifactBackend(path="./test_storage/",
+                                       pack_threshold=64)
+        payloads = [b'\x00\xff' * 8, bytearray(b'\x89PNG' * 100)]
+        for i, payload in enumerate(payloads):
+            artifact = Artifact(self.stage_config,
+                                serialization_type="bytestream")
+            artifact.item = Item(payload=payload)
+            artifact._specific_hash = str(i)
+            backend.save_artifact(artifact)
+
+        for i, payload in enumerate(payloads):
+            query = Artifact(self.stage_config,
+                             serialization_type="bytestream")
+            query._specific_hash = str(i)
+            loaded = backend.load_artifact(query).item.payload
+            self.assertIsInstance(loaded, memoryview)
+            self.assertEqual(loaded, payload)
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_ndarray_memmap(self):
+        backend = LocalArtifactBackend(path="./test_storage/",
+                                       pack_threshold=256)
+        arrays = [numpy.arange(4, dtype=numpy.int8),
+                  numpy.arange(1000.0).reshape(10, 100)]
+        for i, array in enumerate(arrays):
+            artifact = Artifact(self.stage_config,
+                                serialization_type="ndarray")
+            artifact.item = Item(payload=array)
+            artifact._specific_hash = str(i)
+            backend.save_artifact(artifact)
+
+        loaded = []
+        for i in range(len(arrays)):
+            query = Artifact(self.stage_config)
+            query._specific_hash = str(i)
+            loaded.append(backend.load_artifact(query).item.payload)
+
+        # Packed arrays are read from the pack, loose ones memory mapped
+        self.assertNotIsInstance(loaded[0], numpy.memmap)
+        self.assertIsInstance(loaded[1], numpy.memmap)
+        for array, loaded_array in zip(arrays, loaded):
+            self.assertTrue(numpy.array_equal(array, loaded_array))
+            self.assertFalse(loaded_array.flags.writeable)
+
+    def test_lazy_load(self):
+        backend = LocalArtifactBackend(path="./test_storage/")
+        artifact = Artifact(self.stage_config)
+        artifact.item = Item(payload={"foo": "bar"})
+        artifact._specific_hash = "lazy"
+        backend.save_artifact(artifact)
+
+        query = Artifact(self.stage_config)
+        query._specific_hash = "lazy"
+        loaded = backend.load_artifacts([query], lazy=True)[0]
+        self.assertFalse(loaded.item.payload_loaded)
+        self.assertEqual(loaded.item.payload, {"foo": "bar"})
+        self.assertTrue(loaded.item.payload_loaded)
+
+        # Released payloads are loaded again on the next access
+        loaded.release()
+        self.assertFalse(loaded.item.payload_loaded)
+        self.assertTrue(loaded.prefetch().item.payload_loaded)
+        self.assertEqual(loaded.item.payload, {"foo": "bar"})
+
+    def test_compression(self):
+        backend = LocalArtifactBackend(path="./test_storage/")
+        payload = {"foo": ["bar"] * 1000}
+        for compression in ["none", "zlib", "lzma"]:
+            stage_config = PipelineStageConfig("compressed_stage", {
+                "type": "ParameterPipelineStage",
+                "compression": compression
+            })
+            artifact = Artifact(stage_config)
+            artifact.item = Item(payload=payload)
+            backend.save_artifact(artifact)
+
+            # The codec is recorded in the artifact's metadata
+            query = Artifact(stage_config)
+            query._specific_hash = artifact._specific_hash
+            loaded = backend.load_artifact(query)
+            self.assertEqual(loaded._compression, compression)
+            self.assertEqual(loaded.item.payload, payload)
+            if compression != "none":
+                self.assertLess(backend._payload_size(loaded), 1000)
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_compression_dictionary(self):
+        backend = LocalArtifactBackend(path="./test_storage/")
+        stage_config = PipelineStageConfig("dictionary_stage", {
+            "type": "ParameterPipelineStage",
+            "compression": "zstd",
+            "compression_dictionary_size": 1024
+        })
+        artifacts = []
+        for i in range(DICTIONARY_SAMPLES + 10):
+            artifact = Artifact(stage_config)
+            artifact.item = Item(payload={"id": i, "name": "item %d" % i,
+                                          "tags": ["alpha", "beta"]})
+            artifacts.append(artifact)
+        backend.save_artifacts(artifacts)
+
+        # Payloads saved once enough samples were seen use the dictionary
+        self.assertIsNone(artifacts[0]._compression_dictionary)
+        digest = artifacts[-1]._compression_dictionary
+        self.assertIsNotNone(digest)
+
+        backend = LocalArtifactBackend(path="./test_storage/")
+        for artifact in [artifacts[0], artifacts[-1]]:
+            query = Artifact(stage_config)
+            query._specific_hash = artifact._specific_hash
+            loaded = backend.load_artifact(query)
+            self.assertEqual(loaded._compression_dictionary,
+                             artifact._compression_dictionary)
+            self.assertEqual(loaded.item.payload, artifact.item.payload)
+
+    def test_chunked_payloads(self):
+        backend = LocalArtifactBackend(path=["./disk_a/", "./disk_b/"],
+                                       chunk_size=100)
+        payloads = [bytes(range(256)) * 4, bytes(range(256)) * 4]
+        payloads[1] = payloads[1][:500] + b"tail"
+        for i, payload in enumerate(payloads):
+            artifact = Artifact(self.stage_config,
+                                serialization_type="bytestream")
+            artifact.item = Item(payload=payload)
+            artifact._specific_hash = str(i)
+            backend.save_artifact(artifact)
+            self.assertEqual(artifact._chunk_manifest['size'], len(payload))
+
+        # The payloads share their first five chunks
+        self.assertEqual(len(list(backend._iter_objects())), 11 + 1)
+
+        backend = LocalArtifactBackend(path=["./disk_a/", "./disk_b/"],
+                                       chunk_size=100, gc_grace_period=0)
+        query = Artifact(self.stage_config)
+        query._specific_hash = "1"
+        self.assertEqual(backend.load_artifact(query).item.payload,
+                         payloads[1])
+        query = Artifact(self.stage_config)
+        query._specific_hash = "0"
+        self.assertEqual(backend.read_artifact_range(query, 150, 300),
+                         payloads[0][150:450])
+
+        backend.delete_artifact(query)
+        self.assertEqual(backend.collect_garbage(), 6)
+
+    def test_open_artifact(self):
+        backend = LocalArtifactBackend(path="./test_storage/",
+                                       inline_threshold=8,
+                                       pack_threshold=64,
+                                       chunk_size=256)
+        payloads = [b"inline", b"packed" * 5, bytes(range(200)),
+                    bytes(range(256)) * 3]
+        for i, payload in enumerate(payloads):
+            artifact = Artifact(self.stage_config,
+                                serialization_type="bytestream")
+            artifact.item = Item(payload=payload)
+            artifact._specific_hash = str(i)
+            backend.save_artifact(artifact)
+
+        for i, payload in enumerate(payloads):
+            query = Artifact(self.stage_config)
+            query._specific_hash = str(i)
+            with backend.open_artifact(query) as stream:
+                self.assertEqual(stream.read(4), payload[:4])
+                stream.seek(-5, os.SEEK_END)
+                self.assertEqual(stream.read(), payload[-5:])
+                stream.seek(2)
+                self.assertEqual(stream.read(), payload[2:])
+
+    def test_artifact_writer(self):
+        backend = LocalArtifactBackend(path="./test_storage/")
+        artifact = Artifact(self.stage_config,
+                            serialization_type="bytestream",
+                            compression="zlib")
+        with backend.open_artifact_writer(artifact) as writer:
+            for i in range(4):
+                writer.write(bytes(range(256)) * 64)
+        self.assertFalse(artifact.item.payload_loaded)
+        artifact._dependency_hash = "dep"
+        backend.save_artifact(artifact)
+
+        query = Artifact(self.stage_config)
+        query._specific_hash = artifact._specific_hash
+        query._dependency_hash = "dep"
+        loaded = backend.load_artifact(query)
+        self.assertEqual(loaded._compression, "zlib")
+        self.assertEqual(loaded.item.payload, bytes(range(256)) * 256)
+        self.assertEqual(artifact.item.payload, bytes(range(256)) * 256)
+
+        # Aborted writers leave nothing behind
+        artifact = Artifact(self.stage_config,
+                            serialization_type="bytestream")
+        try:
+            with backend.open_artifact_writer(artifact) as writer:
+                writer.write(b"partial")
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEqual(os.listdir("./test_storage/.tmp"), [])
+        self.assertIsNone(artifact._content_hash)
+
+    def test_specific_hash_of_serialized_payload(self):
+        backend = LocalArtifactBackend(path="./test_storage/")
+        payload = bytes(range(256)) * 64
+        specific_hashes = set()
+        content_hashes = set()
+        for compression in ["none", "zlib"]:
+            artifact = Artifact(self.stage_config,
+                                serialization_type="bytestream",
+                                compression=compression)
+            artifact.item = Item(payload=payload)
+            backend.save_artifact(artifact)
+            specific_hashes.add(artifact._specific_hash)
+            content_hashes.add(artifact._content_hash)
+
+            artifact = Artifact(self.stage_config,
+                                serialization_type="bytestream",
+                                compression=compression)
+            with backend.open_artifact_writer(artifact) as writer:
+                writer.write(payload)
+            specific_hashes.add(artifact._specific_hash)
+
+        # Payloads are identified by their content, however it's stored
+        self.assertEqual(len(specific_hashes), 1)
+        self.assertEqual(len(content_hashes), 2)
+
+    def test_delta_encoding(self):
+        backend = LocalArtifactBackend(path="./test_storage/",
+                                       delta_block_size=256,
+                                       delta_max_depth=2)
+        stage_config = PipelineStageConfig("checkpoints", {
+            "type": "ParameterPipelineStage",
+            "delta_encoding": True
+        })
+        payload = bytes(range(256)) * 64
+        versions = []
+        for i in range(4):
+            payload = payload[:1000 * i] + b"version %d" % i + \
+                payload[1000 * i + 9:]
+            versions.append(payload)
+            artifact = Artifact(stage_config,
+                                serialization_type="bytestream")
+            artifact.item = Item(payload=payload)
+            artifact._creation_time = float(i)
+            artifact._specific_hash = str(i)
+            backend.save_artifact(artifact)
+            self.assertEqual(artifact._delta_depth, [0, 1, 2, 0][i])
+            if artifact._delta_depth > 0:
+                self.assertLess(backend._payload_size(artifact), 1024)
+
+        for i, payload in enumerate(versions):
+            query = Artifact(stage_config)
+            query._specific_hash = str(i)
+            loaded = backend.load_artifact(query)
+            self.assertEqual(bytes(loaded.item.payload), payload)
+            with backend.open_artifact(query) as stream:
+                self.assertEqual(stream.read(), payload)
+
+    @unittest.skipIf(not os.path.isdir("/proc/self/fd"),
+                     "open file descriptors can't be listed")
+    def test_load_many_payloads(self):
+        backend = LocalArtifactBackend(path="./test_storage/",
+                                       pack_threshold=64)
+        artifacts = []
+        for i in range(64):
+            artifact = Artifact(self.stage_config,
+                                serialization_type="bytestream")
+            artifact.item = Item(
+                payload=b"payload %d" % i + (b"" if i % 2 else b"." * 100))
+            artifact._specific_hash = str(i)
+            artifacts.append(artifact)
+        backend.save_artifacts(artifacts)
+
+        open_fds = len(os.listdir("/proc/self/fd"))
+        loaded = backend.load_artifacts(artifacts)
+        # Small payloads hold neither maps nor file descriptors
+        self.assertEqual(len(os.listdir("/proc/self/fd")), open_fds)
+        self.assertEqual([bytes(artifact.item.payload) for artifact in loaded],
+                         [artifact.item.payload for artifact in artifacts])
+
+    def test_save_large_payloads_one_at_a_time(self):
+        calls = []
+
+        class RecordingBackend(LocalArtifactBackend):
+            def _serialize_payload(self, artifact):
+                calls.append(("serialize", artifact._specific_hash))
+                return super()._serialize_payload(artifact)
+
+            def _store_payload(self, artifact, chunks, digest=None):
+                calls.append(("store", artifact._specific_hash))
+                return super()._store_payload(artifact, chunks, digest)
+
+        backend = RecordingBackend(path="./test_storage/", pack_threshold=64)
+        payloads = [b"large" * 100, b"small", b"large" * 200]
+        artifacts = []
+        for i, payload in enumerate(payloads):
+            artifact = Artifact(self.stage_config,
+                                serialization_type="bytestream")
+            artifact.item = Item(payload=payload)
+            artifact._specific_hash = str(i)
+            artifacts.append(artifact)
+        backend.save_artifacts(artifacts)
+
+        # Large payloads are stored before the next one is serialized,
+        # while small ones are stored together once the batch is
+        self.assertEqual(calls, [("serialize", "0"), ("store", "0"),
+                                 ("serialize", "1"),
+                                 ("serialize", "2"), ("store", "2"),
+                                 ("store", "1")])
+        for artifact, payload in zip(artifacts, payloads):
+            self.assertEqual(bytes(backend.load_artifact(
+                artifact).item.payload), payload)
+
+    def test_save_stored_lazy_payload(self):
+        backend = LocalArtifactBackend(path="./test_storage/")
+        artifact = Artifact(self.stage_config, Item(payload="unchanged"))
+        artifact._specific_hash = "source"
+        backend.save_artifact(artifact)
+
+        loads = []
+        for save in [backend.save_artifact,
+                     lambda artifact: backend.save_artifacts([artifact])]:
+            again = Artifact(self.stage_config, Item(None))
+            again._specific_hash = "source"
+            again.item.lazy_payload(lambda: loads.append(1) or "unchanged")
+            save(again)
+            # The stored payload is kept rather than loaded and written
+            self.assertEqual(loads, [])
+            self.assertEqual(again._content_hash, artifact._content_hash)
+
+        query = Artifact(self.stage_config)
+        query._specific_hash = "source"
+        self.assertEqual(backend.load_artifact(query).item.payload,
+                         "unchanged")
+
+    def test_delete_delta_base(self):
+        stage_config = PipelineStageConfig("checkpoints", {
+            "type": "ParameterPipelineStage",
+            "delta_encoding": True
+        })
+        for content_addressed in [False, True]:
+            backend = LocalArtifactBackend(
+                path="./test_storage_%d/" % content_addressed,
+                content_addressed=content_addressed,
+                delta_block_size=256, gc_grace_period=0)
+            payload = bytes(range(256)) * 64
+            versions = []
+            for i in range(3):
+                payload = payload[:1000 * i] + b"version %d" % i + \
+                    payload[1000 * i + 9:]
+                versions.append(payload)
+                artifact = Artifact(stage_config,
+                                    serialization_type="bytestream")
+                artifact.item = Item(payload=payload)
+                artifact._creation_time = float(i)
+                artifact._specific_hash = str(i)
+                backend.save_artifact(artifact)
+                self.assertEqual(artifact._delta_depth, i)
+
+            query = Artifact(stage_config)
+            query._specific_hash = "0"
+            self.assertTrue(backend.delete_artifact(query))
+            backend.collect_garbage()
+
+            query = Artifact(stage_config)
+            query._specific_hash = "0"
+            self.assertIsNone(backend.load_artifact(query))
+            for i in [1, 2]:
+                query = Artifact(stage_config)
+                query._specific_hash = str(i)
+                loaded = backend.load_artifact(query)
+                self.assertEqual(bytes(loaded.item.payload), versions[i])
+            # The first delta was stored in full
+            query = Artifact(stage_config)
+            query._specific_hash = "1"
+            self.assertIsNone(backend._find_cached_artifact(query)._delta_base)
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_arrow_columns(self):
+        backend = LocalArtifactBackend(path="./test_storage/")
+        columns = {"a": list(range(100)), "b": [str(i) for i in range(100)]}
+        for i, compression in enumerate(["none", "zlib"]):
+            artifact = Artifact(self.stage_config,
+                                serialization_type="arrow",
+                                compression=compression)
+            artifact.item = Item(payload=columns)
+            artifact._specific_hash = str(i)
+            backend.save_artifact(artifact)
+
+            query = Artifact(self.stage_config)
+            query._specific_hash = str(i)
+            loaded = backend.load_artifact(query)
+            self.assertTrue(loaded.item.payload.equals(pyarrow.table(columns)))
+
+            query = Artifact(self.stage_config)
+            query._specific_hash = str(i)
+            projected = backend.load_artifact_columns(query, ["b"])
+            self.assertEqual(projected.column_names, ["b"])
+            self.assertEqual(projected.column("b").to_pylist(), columns["b"])
+
+    def test_hash_schemes(self):
+        legacy = LocalArtifactBackend(path="./test_storage/")
+        artifact = Artifact(self.stage_config, Item(payload="legacy"))
+        artifact._specific_hash = "legacy"
+        legacy.save_artifact(artifact)
+        legacy_uid = artifact.get_uid()
+        self.assertEqual(artifact.meta_to_dict()['hash_scheme'], "md5")
+
+        schemes = ["blake2b"] + (["xxh3"] if xxhash is not None else [])
+        for scheme in schemes:
+            backend = LocalArtifactBackend(path="./test_storage/",
+                                           content_addressed=True,
+                                           hash_scheme=scheme)
+            prefix = backend._hash_scheme.prefix
+            artifact = Artifact(self.stage_config, Item(payload=scheme))
+            artifact._specific_hash = "new"
+            artifact._dependency_hash = backend.dependency_hash([])
+            backend.save_artifact(artifact)
+            backend.log_pipeline_stage_run_complete(
+                self.stage_config, artifact._dependency_hash)
+            self.assertTrue(artifact.get_uid().startswith(prefix))
+            self.assertTrue(artifact._dependency_hash.startswith(prefix))
+            self.assertTrue(artifact._content_hash.startswith(prefix))
+            self.assertTrue(os.path.exists(
+                backend._object_path(artifact._content_hash)))
+            self.assertEqual(artifact.meta_to_dict()['hash_scheme'], scheme)
+
+            query = Artifact(self.stage_config)
+            query._specific_hash = "new"
+            query._dependency_hash = artifact._dependency_hash
+            loaded = backend.load_artifact(query)
+            self.assertEqual(loaded.item.payload, scheme)
+            self.assertEqual(loaded._hash_scheme, scheme)
+            self.assertEqual(backend.pipeline_stage_run_status(
+                self.stage_config, artifact._dependency_hash),
+                STAGE_COMPLETE)
+            self.assertEqual(legacy.pipeline_stage_run_status(
+                self.stage_config, artifact._dependency_hash),
+                STAGE_DOES_NOT_EXIST)
+
+            # Artifacts of the legacy scheme still resolve by their uid
+            related = backend._related_artifact(query, legacy_uid)
+            self.assertEqual(backend.load_artifact(related).item.payload,
+                             "legacy")
+
+        with self.assertRaises(UnknownHashSchemeError):
+            LocalArtifactBackend(path="./test_storage/", hash_scheme="crc")
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_metadata_format(self):
+        # A cache written as JSON, by default and by older versions
+        old = LocalArtifactBackend(path="./test_storage/",
+                                   inline_threshold=1024)
+        artifact = Artifact(self.stage_config, Item(payload="old"))
+        artifact._specific_hash = "old"
+        old.save_artifact(artifact)
+        old.log_pipeline_stage_run_complete(self.stage_config, "deps")
+        meta_path = os.path.join("./test_storage/",
+                                 old._relative_artifact_dir(artifact),
+                                 old.metadata_file)
+        with open(meta_path, 'r') as f:
+            self.assertIn(artifact.get_uid(), json.load(f))
+
+        backend = LocalArtifactBackend(path="./test_storage/",
+                                       metadata_format="binary",
+                                       inline_threshold=1024)
+        self.assertEqual(backend.load_artifact(artifact).item.payload, "old")
+        self.assertEqual(backend.pipeline_stage_run_status(
+            self.stage_config, "deps"), STAGE_COMPLETE)
+
+        new = Artifact(self.stage_config, Item(payload="new"))
+        new._specific_hash = "new"
+        backend.save_artifact(new)
+        with open(meta_path, 'rb') as f:
+            self.assertTrue(f.read().startswith(HEADER))
+        for saved in [artifact, new]:
+            query = Artifact(self.stage_config)
+            query._specific_hash = saved._specific_hash
+            self.assertEqual(backend.load_artifact(query).item.payload,
+                             saved.item.payload)
+        self.assertEqual(len(list(backend._iter_item_meta_uids())), 2)
+
+    def test_file_reference(self):
+        provider = LocalDirectoryArtifactProvider(
+            path=self.dirname, stage_config=self.stage_config)
+        backend = LocalArtifactBackend(path="./test_storage/")
+        artifacts = list(provider.yield_artifacts())
+        backend.save_artifacts(artifacts)
+
+        for artifact in artifacts:
+            reference = artifact.item.payload
+            # Only the reference is stored, not the file's contents
+            with open(backend._artifact_payload_path(artifact), 'rb') as f:
+                self.assertNotIn(reference.read(), f.read())
+            loaded = backend.load_artifact(artifact)
+            self.assertEqual(loaded.item.payload, reference)
+
+        # The uid, and so downstream dependency hashes, follow the file
+        changed_path = artifacts[0].item.payload.path
+        with open(changed_path, 'a') as f:
+            f.write("changed")
+        changed = list(provider.yield_artifacts())
+        backend.save_artifacts(changed)
+        self.assertNotEqual(backend.dependency_hash(artifacts),
+                            backend.dependency_hash(changed))
+        for before, after in zip(artifacts, changed):
+            self.assertEqual(before.get_uid() == after.get_uid(),
+                             after.item.payload.path != changed_path)
@@ -19,11 +19,15 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import asyncio
 import os
 import os.path
 import unittest
+from unittest import mock
 from tests import isolated_filesystem
 from collections import OrderedDict
+from pipetree.artifact import Artifact, Item
+from pipetree.backend import LocalArtifactBackend
 from pipetree.pipeline import PipelineFactory
 from pipetree.exceptions import InvalidConfigurationFileError
 
@@ -218,3 +222,134 @@ class TestPipelineLoading(unittest.TestCase):
         pipeline = self.factory.generate_pipeline_from_dict(config)
         self.assertEqual(set(('StageB',)), pipeline._endpoints)
         
+
+
+class SynchronousTask(object):
+    def __init__(self, artifacts, on_next=None):
+        self._artifacts = iter(artifacts)
+        self._on_next = on_next
+
+    async def next_artifact(self):
+        artifact = next(self._artifacts, None)
+        if self._on_next is not None:
+            self._on_next(artifact)
+        return artifact
+
+
+class SynchronousExecutor(object):
+    def __init__(self, on_next=None):
+        self._on_next = on_next
+
+    def create_task(self, stage, input_artifacts):
+        return SynchronousTask(stage.yield_artifacts(
+            input_artifacts=input_artifacts), self._on_next)
+
+
+def _run_stage(pipeline, stage_name, input_artifacts, executor, backend):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(pipeline._run_stage(
+            stage_name, input_artifacts, executor, backend))
+    finally:
+        loop.close()
+
+
+class TestRunStage(unittest.TestCase):
+    def setUp(self):
+        self.fs = isolated_filesystem()
+        self.fs.__enter__()
+        self.pipeline = PipelineFactory().generate_pipeline_from_dict(
+            OrderedDict([
+                ('Source', {
+                    'type': 'ParameterPipelineStage',
+                    'parameters': {}
+                }),
+            ]))
+        self.config = self.pipeline.stages['Source']._config
+        self.backend = LocalArtifactBackend(path="./test_storage/")
+
+    def tearDown(self):
+        self.fs.__exit__(None, None, None)
+
+    def _query(self, specific_hash):
+        query = Artifact(self.config)
+        query._specific_hash = specific_hash
+        query._dependency_hash = self.backend.dependency_hash([])
+        return query
+
+    def test_save_in_batches(self):
+        artifacts = []
+        for i in range(5):
+            artifact = Artifact(self.config, Item("payload %d" % i))
+            artifact._specific_hash = str(i)
+            artifacts.append(artifact)
+        saved = []
+
+        def on_next(artifact):
+            saved.append([self.backend.load_artifact(self._query(str(i)))
+                          is not None for i in range(5)])
+
+        stage = self.pipeline.stages['Source']
+        stage.yield_artifacts = lambda input_artifacts: iter(artifacts)
+        with mock.patch('pipetree.pipeline.SAVE_BATCH_SIZE', 2):
+            result = _run_stage(self.pipeline, 'Source', [],
+                                SynchronousExecutor(on_next), self.backend)
+
+        # Each batch is saved before the next artifact is generated
+        self.assertEqual([sum(flags) for flags in saved], [0, 0, 2, 2, 4, 4])
+        self.assertIsNotNone(self.backend.load_artifact(self._query("4")))
+        # Saved payloads are read back from the cache
+        self.assertFalse(any(art.item.payload_loaded for art in result))
+        self.assertEqual([art.item.payload for art in result],
+                         ["payload %d" % i for i in range(5)])
+
+
+class TestPartitionedPipeline(unittest.TestCase):
+    def setUp(self):
+        self.fs = isolated_filesystem()
+        self.fs.__enter__()
+        self.pipeline = PipelineFactory().generate_pipeline_from_dict(
+            OrderedDict([
+                ('Source', {
+                    'type': 'ParameterPipelineStage',
+                    'parameters': {}
+                }),
+                ('Double', {
+                    'inputs': ['Source'],
+                    'type': 'ExecutorPipelineStage',
+                    'execute':
+                        'tests.functional.module.executor_function.count_calls',
+                    'partitioned': True
+                }),
+            ]))
+        self.backend = LocalArtifactBackend(path="./test_storage/")
+
+    def tearDown(self):
+        self.fs.__exit__(None, None, None)
+
+    def _run(self, input_artifacts):
+        return _run_stage(self.pipeline, 'Double', input_artifacts,
+                          SynchronousExecutor(), self.backend)
+
+    def test_rerun_single_input(self):
+        # With a single unpartitioned input, the partition run and the
+        # run of the whole stage share their input
+        source = Artifact(self.pipeline.stages['Source']._config,
+                          Item([1, 2, 3]))
+        source._dependency_hash = 'source'
+        self.backend.save_artifact(source)
+
+        stage = self.pipeline.stages['Double']
+        first = self._run([source])
+        calls = stage._module.count_calls.calls
+        second = self._run([source])
+
+        self.assertEqual(stage._module.count_calls.calls, calls)
+        self.assertEqual(len(second), 1)
+        self.assertTrue(second[0]._loaded_from_cache)
+        self.assertEqual(second[0].item.payload, first[0].item.payload)
+        self.assertEqual(second[0].item.payload, [[2, 4, 6]])
+
+        dependency_hash = self.backend.partition_dependency_hash(source)
+        self.assertEqual(len(self.backend.find_pipeline_stage_run_artifacts(
+            stage._config, dependency_hash)), 1)
@@ -23,7 +23,10 @@ import os
 import os.path
 import unittest
 from tests import isolated_filesystem
+from pipetree import metacodec
+from pipetree.backend import LocalArtifactBackend
 from pipetree.config import PipelineStageConfig
+from pipetree.stage import PipelineStageFactory
 from pipetree.providers import LocalDirectoryArtifactProvider,\
     LocalFileArtifactProvider,\
     ParameterArtifactProvider
@@ -185,11 +188,10 @@ class TestLocalDirectoryArtifactProvider(unittest.TestCase):
     def test_load_file_names(self):
         provider = LocalDirectoryArtifactProvider(path=self.dirname,
                                                   stage_config=self.stage_config)
-        for loaded_name, name in zip(provider.yield_artifacts(),
-                                     self.filename):
-            self.assertEqual(loaded_name, os.path.join(os.getcwd(),
-                                                       self.dirname,
-                                                       name))
+        for art, name in zip(provider.yield_artifacts(),
+                             self.filename):
+            self.assertEqual(art.item.payload.path,
+                             os.path.join(os.getcwd(), self.dirname, name))
 
     def test_load_multiple_file_contents(self):
         provider = LocalDirectoryArtifactProvider(path=self.dirname,
@@ -199,3 +201,91 @@ class TestLocalDirectoryArtifactProvider(unittest.TestCase):
                              self.filedatas):
             art_data = art.item.payload
             self.assertEqual(art_data.decode('utf-8'), data)
+
+    def test_manifest(self):
+        # Files modified too recently aren't recorded in manifests
+        for name in self.filename:
+            path = os.path.join(self.dirname, name)
+            past = os.stat(path).st_mtime_ns - 3600 * 10 ** 9
+            os.utime(path, ns=(past, past))
+
+        def yield_artifacts():
+            provider = LocalDirectoryArtifactProvider(
+                path=self.dirname, stage_config=self.stage_config,
+                read_content=True, manifest_dir="manifests")
+            return list(provider.yield_artifacts())
+
+        first = yield_artifacts()
+        self.assertTrue(all(art.item.payload_loaded for art in first))
+
+        # Unchanged files keep their uid without being read
+        second = yield_artifacts()
+        for before, after, data in zip(first, second, self.filedatas):
+            self.assertFalse(after.item.payload_loaded)
+            self.assertEqual(before.get_uid(), after.get_uid())
+            self.assertEqual(after.item.payload.decode('utf-8'), data)
+
+        path = os.path.join(self.dirname, self.filename[0])
+        with open(path, 'w') as f:
+            f.write('changed')
+        os.utime(path, ns=(past, past))
+        third = yield_artifacts()
+        self.assertTrue(third[0].item.payload_loaded)
+        self.assertNotEqual(third[0].get_uid(), first[0].get_uid())
+        self.assertFalse(third[1].item.payload_loaded)
+        self.assertEqual(third[1].get_uid(), first[1].get_uid())
+
+    @unittest.skipIf(metacodec.msgpack is None, "msgpack is not installed")
+    def test_manifest_format(self):
+        stage = PipelineStageFactory().create_pipeline_stage(
+            PipelineStageConfig("source", {
+                "type": "LocalDirectoryPipelineStage",
+                "filepath": self.dirname,
+                "read_content": True,
+                "manifest_dir": "manifests"
+            }))
+        for name in self.filename:
+            path = os.path.join(self.dirname, name)
+            past = os.stat(path).st_mtime_ns - 3600 * 10 ** 9
+            os.utime(path, ns=(past, past))
+        for format in [metacodec.JSON, metacodec.BINARY]:
+            # Manifests are written in the bound backend's format
+            stage.bind_backend(LocalArtifactBackend(
+                path="./storage_%s/" % format, metadata_format=format))
+            list(stage.yield_artifacts())
+            path = os.path.join("manifests", os.listdir("manifests")[0])
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read().startswith(metacodec.MAGIC),
+                                 format == metacodec.BINARY)
+            os.remove(path)
+
+    def test_recursive_filtered(self):
+        for relative_path in ['sub/b.jpg', 'sub/a.txt', 'sub/deeper/c.jpg',
+                              'skip/d.jpg', 'e.jpg']:
+            path = os.path.join(self.dirname, relative_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(relative_path)
+
+        def sourced(**kwargs):
+            provider = LocalDirectoryArtifactProvider(
+                path=self.dirname, stage_config=self.stage_config, **kwargs)
+            return [os.path.relpath(art.item.payload.path, self.dirname)
+                    for art in provider.yield_artifacts()]
+
+        self.assertEqual(sourced(), ['e.jpg', 'foo.bar', 'foo.baz'])
+        self.assertEqual(sourced(recursive=True, include='*.jpg',
+                                 exclude=['skip']),
+                         ['e.jpg', 'sub/b.jpg', 'sub/deeper/c.jpg'])
+        self.assertEqual(sourced(recursive=True, exclude='sub/*'),
+                         ['e.jpg', 'foo.bar', 'foo.baz', 'skip/d.jpg'])
+
+        # Files read concurrently are yielded in order
+        provider = LocalDirectoryArtifactProvider(
+            path=self.dirname, stage_config=self.stage_config,
+            recursive=True, read_content=True, read_workers=4)
+        for art, relative_path in zip(provider.yield_artifacts(),
+                                      sourced(recursive=True)):
+            path = os.path.join(self.dirname, relative_path)
+            with open(path, 'rb') as f:
+                self.assertEqual(art.item.payload, f.read())
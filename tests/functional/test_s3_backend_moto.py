@@ -0,0 +1,307 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import unittest
+from unittest import mock
+from tests import isolated_filesystem
+from pipetree.artifact import Artifact, Item
+from pipetree.backend import S3ArtifactBackend, OBJECTS_DIR, PACKS_DIR,\
+    STREAMS_DIR
+from pipetree.config import PipelineStageConfig
+from pipetree.sinks import MIN_PART_SIZE
+
+try:
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+
+@unittest.skipIf(mock_aws is None, "moto is not installed")
+class TestS3ArtifactBackend(unittest.TestCase):
+    def setUp(self):
+        self.env = mock.patch.dict(os.environ, {
+            "AWS_ACCESS_KEY_ID": "testing",
+            "AWS_SECRET_ACCESS_KEY": "testing"
+        })
+        self.env.start()
+        self.aws = mock_aws()
+        self.aws.start()
+        self.fs = isolated_filesystem()
+        self.fs.__enter__()
+        self.stage_config = PipelineStageConfig("test_stage_name", {
+            "type": "ParameterPipelineStage"
+        })
+
+    def tearDown(self):
+        self.fs.__exit__(None, None, None)
+        self.aws.stop()
+        self.env.stop()
+
+    def _backend(self, path, **kwargs):
+        return S3ArtifactBackend(path=path,
+                                 aws_profile=None,
+                                 aws_region="us-west-1",
+                                 s3_bucket_name="pipetree-test",
+                                 **kwargs)
+
+    def _keys(self, backend, prefix=""):
+        listed = backend._s3_client.list_objects_v2(Bucket="pipetree-test",
+                                                    Prefix=prefix)
+        return [obj['Key'] for obj in listed.get('Contents', [])]
+
+    def _artifact(self, payload, specific_hash):
+        artifact = Artifact(self.stage_config,
+                            serialization_type="bytestream")
+        artifact.item = Item(payload=payload)
+        artifact._specific_hash = specific_hash
+        return artifact
+
+    def _query(self, specific_hash):
+        query = Artifact(self.stage_config)
+        query._specific_hash = specific_hash
+        return query
+
+    def _round_trip(self, payloads, **kwargs):
+        """
+        Saves artifacts of the given payloads through one backend, then
+        loads them through another with an empty local cache
+        """
+        writer = self._backend("./writer/", **kwargs)
+        writer.save_artifacts([self._artifact(payload, str(i))
+                               for i, payload in enumerate(payloads)])
+        writer.flush_pack()
+
+        reader = self._backend("./reader/", **kwargs)
+        for i, payload in enumerate(payloads):
+            loaded = reader.load_artifact(self._query(str(i)))
+            self.assertEqual(bytes(loaded.item.payload), payload)
+        return writer, reader
+
+    def test_packs(self):
+        payloads = [b"small %d" % i for i in range(5)] + [b"large" * 100]
+        writer, reader = self._round_trip(payloads, pack_threshold=64)
+        # Small payloads are uploaded together as a single pack
+        self.assertEqual(len(self._keys(writer, PACKS_DIR + "/")), 1)
+        self.assertEqual(len(self._keys(writer)), 2)
+
+    def test_repack(self):
+        payloads = [b"small %d" % i for i in range(5)] + [b"large" * 100]
+        writer, _ = self._round_trip(payloads)
+        self.assertEqual(len(self._keys(writer)), 6)
+
+        backend = self._backend("./repacker/", pack_threshold=64)
+        self.assertEqual(backend.repack(), 5)
+        self.assertEqual(backend.repack(), 0)
+        self.assertEqual(len(self._keys(backend, PACKS_DIR + "/")), 1)
+        # Loose objects are only deleted once the grace period has passed
+        self.assertEqual(len(self._keys(backend)), 7)
+        backend.gc_grace_period = 0
+        self.assertEqual(backend.repack(), 0)
+        self.assertEqual(len(self._keys(backend)), 2)
+
+        reader = self._backend("./reader_after/")
+        for i, payload in enumerate(payloads):
+            loaded = reader.load_artifact(self._query(str(i)))
+            self.assertEqual(bytes(loaded.item.payload), payload)
+
+    def test_inline(self):
+        payloads = [b"tiny", b"large" * 100]
+        writer, reader = self._round_trip(payloads, inline_threshold=64)
+        # Small payloads are stored within their DynamoDB items
+        self.assertEqual(len(self._keys(writer)), 1)
+        self.assertIsNotNone(reader._find_cached_artifact(
+            self._query("0"))._inline_payload)
+
+    def test_content_addressed(self):
+        payloads = [b"shared" * 100, b"shared" * 100, b"other" * 100]
+        writer, reader = self._round_trip(payloads, content_addressed=True,
+                                          gc_grace_period=0)
+        objects = self._keys(writer, OBJECTS_DIR + "/")
+        self.assertEqual(len(objects), 2)
+
+        digest = reader._find_cached_artifact(self._query("0"))._content_hash
+        refs = writer._artifact_meta_table.get_item(Key={
+            'artifact_uid': writer._object_refs_uid(digest)})['Item']['refs']
+        self.assertEqual(refs, set(writer._find_cached_artifact(
+            self._query(str(i))).get_uid() for i in [0, 1]))
+
+        # Objects are removed once no artifact references them
+        self.assertTrue(writer.delete_artifact(self._query("0")))
+        self.assertEqual(writer.collect_garbage(), 0)
+        self.assertTrue(writer.delete_artifact(self._query("1")))
+        self.assertFalse(writer.delete_artifact(self._query("1")))
+        self.assertEqual(writer.collect_garbage(), 1)
+        self.assertEqual(len(self._keys(writer, OBJECTS_DIR + "/")), 1)
+
+        reader = self._backend("./reader_after/", content_addressed=True)
+        self.assertIsNone(reader.load_artifact(self._query("0")))
+        self.assertEqual(bytes(reader.load_artifact(
+            self._query("2")).item.payload), payloads[2])
+
+    def test_collect_garbage_races(self):
+        writer, _ = self._round_trip([b"shared" * 100],
+                                     content_addressed=True)
+        digest = writer._find_cached_artifact(self._query("0"))._content_hash
+        uid = writer._object_refs_uid(digest)
+        key = writer._object_key(digest)
+        self.assertTrue(writer.delete_artifact(self._query("0")))
+
+        # Objects uploaded within the grace period are kept
+        self.assertEqual(writer.collect_garbage(), 0)
+        self.assertEqual(self._keys(writer, OBJECTS_DIR + "/"), [key])
+
+        # Objects referenced again after the scan are kept
+        writer.gc_grace_period = 0
+        self.assertFalse(writer._add_object_ref(digest, "late"))
+        self.assertFalse(writer._collect_object(uid, key))
+        self.assertEqual(self._keys(writer, OBJECTS_DIR + "/"), [key])
+
+        self.assertTrue(writer._add_object_ref(digest, "later"))
+        writer._artifact_meta_table.update_item(
+            Key={'artifact_uid': uid},
+            UpdateExpression='DELETE refs :uid',
+            ExpressionAttributeValues={':uid': set(["late", "later"])})
+        self.assertEqual(writer.collect_garbage(), 1)
+        self.assertEqual(self._keys(writer, OBJECTS_DIR + "/"), [])
+
+    def test_delete_artifact(self):
+        writer, _ = self._round_trip([b"loose" * 100, b"packed"],
+                                     pack_threshold=64)
+        self.assertTrue(writer.delete_artifact(self._query("0")))
+        self.assertTrue(writer.delete_artifact(self._query("1")))
+        # Packs are kept until repacked, as other payloads may be packed
+        # along
+        self.assertEqual(self._keys(writer),
+                         self._keys(writer, PACKS_DIR + "/"))
+
+        reader = self._backend("./reader_after/")
+        self.assertIsNone(reader.load_artifact(self._query("0")))
+        self.assertIsNone(reader.load_artifact(self._query("1")))
+
+        writer.gc_grace_period = 0
+        self.assertEqual(writer.repack(), 0)
+        self.assertEqual(writer.repack(), 0)
+        self.assertEqual(self._keys(writer), [])
+
+    def test_repack_packs(self):
+        writer, _ = self._round_trip(
+            [b"small %d" % i for i in range(4)], pack_threshold=64,
+            gc_grace_period=0)
+        pack, = self._keys(writer, PACKS_DIR + "/")
+        for i in range(3):
+            self.assertTrue(writer.delete_artifact(self._query(str(i))))
+
+        # Packs mostly holding deleted payloads are rewritten
+        self.assertEqual(writer.repack(), 1)
+        self.assertEqual(writer.repack(), 0)
+        self.assertNotIn(pack, self._keys(writer, PACKS_DIR + "/"))
+        self.assertEqual(len(self._keys(writer)), 1)
+        reader = self._backend("./reader_after/")
+        self.assertEqual(bytes(reader.load_artifact(
+            self._query("3")).item.payload), b"small 3")
+
+    def test_chunks(self):
+        payload = bytes(i % 251 for i in range(5120))
+        writer, reader = self._round_trip([payload, payload[:1000]],
+                                          chunk_size=1024, gc_grace_period=0)
+        chunked = reader._find_cached_artifact(self._query("0"))
+        self.assertEqual(len(chunked._chunk_manifest['chunks']), 5)
+        # Only the chunks covering a range are downloaded
+        self.assertEqual(bytes(reader.read_artifact_range(
+            self._query("0"), 1000, 100)), payload[1000:1100])
+
+        # Chunks are referenced like content addressed objects
+        self.assertTrue(writer.delete_artifact(self._query("0")))
+        self.assertEqual(writer.collect_garbage(), 5)
+        self.assertEqual(self._keys(writer, OBJECTS_DIR + "/"), [])
+
+    def test_multipart_writer(self):
+        writer = self._backend("./writer/", part_size=MIN_PART_SIZE,
+                               transfer_workers=2)
+        artifact = Artifact(self.stage_config,
+                            serialization_type="bytestream")
+        part = bytes(range(256)) * (MIN_PART_SIZE // 256)
+        with writer.open_artifact_writer(artifact) as stream:
+            for i in range(2):
+                stream.write(part)
+            stream.write(b"tail")
+        artifact._specific_hash = "streamed"
+        writer.save_artifact(artifact)
+
+        # Saved streams are moved to their content address
+        self.assertEqual(self._keys(writer, STREAMS_DIR + "/"), [])
+        self.assertEqual(self._keys(writer),
+                         [writer._object_key(artifact._content_hash)])
+        reader = self._backend("./reader/")
+        loaded = reader.load_artifact(self._query("streamed"))
+        self.assertEqual(bytes(loaded.item.payload), part * 2 + b"tail")
+
+        # The object is collected once its artifact is deleted
+        writer.gc_grace_period = 0
+        self.assertTrue(writer.delete_artifact(self._query("streamed")))
+        self.assertEqual(writer.collect_garbage(), 1)
+        self.assertEqual(self._keys(writer), [])
+
+    def test_collect_streams(self):
+        writer = self._backend("./writer/", part_size=MIN_PART_SIZE)
+        # A stream whose artifact was never saved, and a failed upload
+        with writer.open_artifact_writer(Artifact(
+                self.stage_config, serialization_type="bytestream")) as stream:
+            stream.write(b"orphan")
+        writer._s3_client.create_multipart_upload(
+            Bucket="pipetree-test", Key=STREAMS_DIR + "/crashed")
+
+        self.assertEqual(writer.collect_garbage(), 0)
+        self.assertEqual(len(self._keys(writer, STREAMS_DIR + "/")), 1)
+        writer.gc_grace_period = 0
+        self.assertEqual(writer.collect_garbage(), 1)
+        self.assertEqual(self._keys(writer), [])
+        uploads = writer._s3_client.list_multipart_uploads(
+            Bucket="pipetree-test")
+        self.assertEqual(uploads.get('Uploads', []), [])
+
+    def test_multipart_abort(self):
+        writer = self._backend("./writer/", part_size=MIN_PART_SIZE)
+        artifact = Artifact(self.stage_config,
+                            serialization_type="bytestream")
+        try:
+            with writer.open_artifact_writer(artifact) as stream:
+                stream.write(b"x" * (MIN_PART_SIZE + 1))
+                raise ValueError()
+        except ValueError:
+            pass
+        uploads = writer._s3_client.list_multipart_uploads(
+            Bucket="pipetree-test")
+        self.assertEqual(uploads.get('Uploads', []), [])
+        self.assertEqual(self._keys(writer), [])
+        self.assertEqual(os.listdir("./writer/.tmp"), [])
+
+    def test_release_payloads(self):
+        backend = self._backend("./writer/")
+        artifact = self._artifact(b"released" * 100, "0")
+        backend.save_artifacts([artifact])
+        backend.release_payloads([artifact])
+        self.assertFalse(artifact.item.payload_loaded)
+        # Payloads are read back from the local cache rather than S3
+        with mock.patch.object(backend, '_get_object_range') as get:
+            self.assertEqual(bytes(artifact.item.payload), b"released" * 100)
+            get.assert_not_called()
@@ -20,8 +20,9 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 import unittest
-from pipetree.artifact import Artifact
+from pipetree.artifact import Artifact, ArtifactBatch, Item
 from pipetree.config import PipelineStageConfig
+from pipetree.hashing import DependencyHasher
 from pipetree.exceptions import InvalidArtifactMetadataError
 
 
@@ -100,3 +101,93 @@ class TestArtifact(unittest.TestCase):
         for m in art_a._meta_properties:
             if m not in d:
                 self.fail()
+
+    def test_slots(self):
+        stage_a = PipelineStageConfig(
+            'some_name',
+            {"A": 1, "type": "ExecutorPipelineStage"})
+        art_a = Artifact(stage_a)
+        art_b = Artifact(stage_a)
+        self.assertFalse(hasattr(art_a, '__dict__'))
+        self.assertFalse(hasattr(art_a.item, '__dict__'))
+        art_a.item.meta['key'] = 'value'
+        art_a.item.tags.append('tag')
+        self.assertEqual(art_b.item.meta, {})
+        self.assertEqual(art_b.item.tags, [])
+
+    def test_artifact_batch(self):
+        stage_a = PipelineStageConfig(
+            'some_name',
+            {"A": 1, "type": "ExecutorPipelineStage"})
+        artifacts = []
+        for i, (time, item_type) in enumerate([(3.0, 'a'), (None, 'b'),
+                                               (1.0, 'a'), (2.0, 'b')]):
+            art = Artifact(stage_a, Item(None, type=item_type))
+            art._specific_hash = str(i)
+            art._creation_time = time
+            artifacts.append(art)
+        batch = ArtifactBatch.from_artifacts(artifacts)
+        self.assertEqual(len(batch), 4)
+        self.assertEqual(batch.uids(), [a.get_uid() for a in artifacts])
+        self.assertEqual(batch.dependency_hash(),
+                         Artifact.dependency_hash(artifacts))
+        self.assertEqual(batch.argsort(), [1, 2, 3, 0])
+        self.assertEqual(batch.sorted(reverse=True).specific_hashes,
+                         ['0', '3', '2', '1'])
+        self.assertEqual(batch.where(item_type='a'), [0, 2])
+        self.assertEqual(batch.where(created_after=1.5), [0, 3])
+        filtered = batch.filter(item_type='b', created_before=2.5)
+        self.assertEqual(filtered.uids(), [artifacts[3].get_uid()])
+        self.assertEqual(filtered.creation_time(0), 2.0)
+        self.assertEqual(batch.creation_time(1), None)
+        self.assertEqual(batch.item_type(3), 'b')
+        self.assertEqual(ArtifactBatch.from_meta(
+            [a.meta_to_dict() for a in artifacts]).uids(), batch.uids())
+
+    def test_dependency_hash_order(self):
+        stage_a = PipelineStageConfig(
+            'stage_a', {"type": "ExecutorPipelineStage"})
+        stage_b = PipelineStageConfig(
+            'stage_b', {"type": "ExecutorPipelineStage"})
+        artifacts = []
+        for config in (stage_a, stage_b):
+            for i in range(20):
+                art = Artifact(config)
+                art._specific_hash = str(i)
+                artifacts.append(art)
+        expected = Artifact.dependency_hash(artifacts)
+        self.assertEqual(Artifact.dependency_hash(reversed(artifacts)),
+                         expected)
+        self.assertNotEqual(Artifact.dependency_hash(artifacts[1:]),
+                            expected)
+        # The same uid produced by another stage is another input
+        moved = Artifact(stage_b)
+        moved._definition_hash = artifacts[0]._definition_hash
+        moved._specific_hash = artifacts[0]._specific_hash
+        self.assertNotEqual(
+            Artifact.dependency_hash([moved] + artifacts[1:]), expected)
+
+    def test_dependency_hasher(self):
+        stage_a = PipelineStageConfig(
+            'stage_a', {"type": "ExecutorPipelineStage"})
+        artifacts = []
+        for i in range(50):
+            art = Artifact(stage_a)
+            art._specific_hash = str(i)
+            artifacts.append(art)
+        hasher = DependencyHasher()
+        self.assertEqual(hasher.hexdigest(), Artifact.dependency_hash([]))
+        for art in artifacts:
+            hasher.add(art._pipeline_stage, art.get_uid())
+        self.assertEqual(hasher.hexdigest(),
+                         Artifact.dependency_hash(artifacts))
+        for art in artifacts[:10]:
+            hasher.remove(art._pipeline_stage, art.get_uid())
+        self.assertEqual(hasher.hexdigest(),
+                         Artifact.dependency_hash(artifacts[10:]))
+        hasher.add(artifacts[0]._pipeline_stage, artifacts[0].get_uid())
+        self.assertEqual(hasher.hexdigest(), Artifact.dependency_hash(
+            artifacts[:1] + artifacts[10:]))
+        with self.assertRaises(KeyError):
+            hasher.remove(artifacts[1]._pipeline_stage,
+                          artifacts[1].get_uid())
@@ -0,0 +1,41 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import unittest
+from pipetree.chunking import split_chunks, make_manifest, chunk_ranges
+
+
+class TestChunking(unittest.TestCase):
+    def test_split_chunks(self):
+        pieces = list(split_chunks([b"abcde", b"fg", b"hijklmn"], 3))
+        self.assertEqual([bytes(piece) for piece in pieces],
+                         [b"abc", b"def", b"ghi", b"jkl", b"mn"])
+
+        # Pieces within a single buffer are views rather than copies
+        self.assertIsInstance(pieces[0], memoryview)
+
+    def test_chunk_ranges(self):
+        manifest = make_manifest(["a", "b", "c", "d"], 10, 3)
+        self.assertEqual(list(chunk_ranges(manifest, 4, 4)),
+                         [("b", 1, 3, 0, 3), ("c", 0, 2, 2, 3)])
+        self.assertEqual(list(chunk_ranges(manifest, 8)),
+                         [("c", 2, 3, 0, 3), ("d", 0, 1, 1, 1)])
+        self.assertEqual(list(chunk_ranges(manifest, 12, 4)), [])
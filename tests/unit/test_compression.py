@@ -0,0 +1,58 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import unittest
+from pipetree.compression import get_codec, train_dictionary, zstandard,\
+    lz4
+from pipetree.serializers import join_chunks
+
+
+class TestCompression(unittest.TestCase):
+    def roundtrip(self, name, chunks, dictionary=None):
+        codec = get_codec(name)
+        compressed = join_chunks(codec.compress(chunks, dictionary))
+        return bytes(codec.decompress(memoryview(compressed), dictionary))
+
+    def test_builtin_codecs(self):
+        chunks = [b"foo bar baz " * 100, memoryview(b"quux" * 100)]
+        for name in ["none", "zlib", "lzma"]:
+            self.assertEqual(self.roundtrip(name, chunks),
+                             b"foo bar baz " * 100 + b"quux" * 100)
+
+    @unittest.skipIf(lz4 is None, "lz4 is not installed")
+    def test_lz4(self):
+        self.assertEqual(self.roundtrip("lz4", [b"ab" * 100, b"cd" * 100]),
+                         b"ab" * 100 + b"cd" * 100)
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_zstd_dictionary(self):
+        samples = [('{"id": %d, "name": "item %d", "tags": ["a", "b"]}'
+                    % (i, i)).encode('utf-8') for i in range(1000)]
+        dictionary = train_dictionary(samples, 1024)
+        self.assertIsNotNone(dictionary)
+
+        payload = b'{"id": 5000, "name": "item 5000", "tags": ["a", "b"]}'
+        self.assertEqual(self.roundtrip("zstd", [payload], dictionary),
+                         payload)
+        codec = get_codec("zstd")
+        self.assertLess(len(join_chunks(codec.compress([payload],
+                                                       dictionary))),
+                        len(join_chunks(codec.compress([payload]))))
@@ -22,6 +22,7 @@
 import unittest
 from pipetree.config import PipelineStageConfig
 from pipetree.exceptions import NonPythonicNameError, IncorrectPipelineStageNameError, MissingPipelineAttributeError
+from pipetree.exceptions import FrozenPipelineStageConfigError
 
 class TestPipelineStageConfig(unittest.TestCase):
     def setUp(self):
@@ -60,3 +61,31 @@ class TestPipelineStageConfig(unittest.TestCase):
             self.fail()
         except IncorrectPipelineStageNameError:
             pass
+
+    def test_frozen_after_initialization(self):
+        config = PipelineStageConfig('valid_name', {
+            'type': 'ParameterPipelineStage',
+            'value': 1
+        })
+        try:
+            config.value = 2
+            print('This should have raised an error, the config is frozen.')
+            self.fail()
+        except FrozenPipelineStageConfigError:
+            pass
+        try:
+            del config.value
+            self.fail()
+        except FrozenPipelineStageConfigError:
+            pass
+        self.assertEqual(config.value, 1)
+
+    def test_hash(self):
+        data = {'type': 'ParameterPipelineStage', 'value': 1}
+        config = PipelineStageConfig('valid_name', data)
+        self.assertEqual(config.hash(), config._compute_hash())
+        self.assertEqual(config.hash(),
+                         PipelineStageConfig('valid_name', data).hash())
+        self.assertNotEqual(config.hash(), PipelineStageConfig(
+            'valid_name', {'type': 'ParameterPipelineStage',
+                           'value': 2}).hash())
@@ -0,0 +1,60 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import unittest
+
+from pipetree.delta import encode_delta, apply_delta
+from pipetree.serializers import join_chunks
+
+
+class TestDelta(unittest.TestCase):
+    def setUp(self):
+        self.base = os.urandom(64 * 1024)
+
+    def assertRoundTrip(self, target, max_size):
+        delta = encode_delta(self.base, target, block_size=512)
+        self.assertIsNotNone(delta)
+        delta = join_chunks(delta)
+        self.assertLessEqual(len(delta), max_size)
+        self.assertEqual(bytes(apply_delta(self.base, delta)), target)
+
+    def test_identical(self):
+        self.assertRoundTrip(self.base, 64)
+
+    def test_modified(self):
+        self.assertRoundTrip(self.base[:1000] + b"x" * 10 +
+                             self.base[1010:], 1100)
+
+    def test_inserted(self):
+        self.assertRoundTrip(self.base[:3333] + b"inserted" +
+                             self.base[3333:], 1100)
+
+    def test_deleted(self):
+        self.assertRoundTrip(self.base[:3333] + self.base[9999:], 1100)
+
+    def test_unrelated(self):
+        self.assertIsNone(encode_delta(self.base, os.urandom(64 * 1024),
+                                       block_size=512))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            apply_delta(self.base, b"not a delta at all")
@@ -0,0 +1,90 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import json
+import unittest
+from collections import OrderedDict
+from pipetree import jsonengine
+from pipetree.config import PipelineStageConfig
+from pipetree.exceptions import UnknownJSONEngineError
+
+
+class TestJSONEngine(unittest.TestCase):
+    def setUp(self):
+        self.document = {"b": [1, 1.5, None, True, "é a/b"],
+                         "a": {"nested": "value"}}
+        self.engines = [engine for engine in jsonengine.JSON_ENGINES.values()
+                        if engine.available()]
+
+    def test_round_trip(self):
+        for engine in self.engines:
+            data = engine.dumps(self.document)
+            self.assertIsInstance(data, bytes)
+            self.assertEqual(json.loads(data), self.document)
+            self.assertEqual(engine.loads(data), self.document)
+            self.assertEqual(engine.loads(memoryview(data)), self.document)
+            self.assertEqual(engine.loads(data.decode('utf-8')),
+                             self.document)
+            self.assertEqual(list(json.loads(engine.dumps(
+                self.document, sort_keys=True))), ["a", "b"])
+
+    def test_stdlib_compatibility(self):
+        # The standard library writes values some engines don't support
+        written = json.dumps({"nan": float("nan"), "big": 2 ** 70})
+        for engine in self.engines:
+            loaded = engine.loads(written)
+            self.assertNotEqual(loaded["nan"], loaded["nan"])
+            self.assertEqual(loaded["big"], 2 ** 70)
+            self.assertEqual(engine.loads(engine.dumps({"big": 2 ** 70})),
+                             {"big": 2 ** 70})
+
+    def test_object_pairs_hook(self):
+        written = '{"b": {"z": 1, "y": [{"d": 2, "c": 3}]}, "a": 0}'
+        for engine in self.engines:
+            loaded = engine.loads(written, object_pairs_hook=OrderedDict)
+            self.assertIsInstance(loaded["b"]["y"][0], OrderedDict)
+            self.assertEqual(list(loaded), ["b", "a"])
+            self.assertEqual(list(loaded["b"]), ["z", "y"])
+            self.assertEqual(list(loaded["b"]["y"][0]), ["d", "c"])
+
+    def test_canonical_dumps(self):
+        self.assertEqual(jsonengine.canonical_dumps(self.document),
+                         json.dumps(self.document).encode('utf-8'))
+        self.assertEqual(jsonengine.canonical_dumps(self.document, True),
+                         json.dumps(self.document,
+                                    sort_keys=True).encode('utf-8'))
+
+    def test_config_hash(self):
+        # Config hashes don't depend on the engine
+        config = {"type": "ParameterPipelineStage", "params": self.document}
+        hashes = set()
+        for engine in self.engines:
+            jsonengine.use_json_engine(engine.name)
+            try:
+                loaded = jsonengine.loads(jsonengine.dumps(config))
+                hashes.add(PipelineStageConfig("stage", loaded).hash())
+            finally:
+                jsonengine.use_json_engine()
+        self.assertEqual(len(hashes), 1)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(UnknownJSONEngineError):
+            jsonengine.get_json_engine("simdjson")
@@ -0,0 +1,95 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import json
+import unittest
+from unittest import mock
+
+from pipetree import metacodec
+from pipetree.metacodec import msgpack
+from pipetree.artifact import Artifact, Item
+from pipetree.config import PipelineStageConfig
+from pipetree.exceptions import UnknownMetadataVersionError,\
+    UnknownMetadataFormatError
+
+
+class TestMetaCodec(unittest.TestCase):
+    def setUp(self):
+        stage_config = PipelineStageConfig("StageA", {
+            "type": "ParameterPipelineStage"
+        })
+        artifact = Artifact(stage_config, Item(
+            payload=None, meta={"name": "a"}, tags=["x"], type="default"))
+        artifact._specific_hash = "%032x" % 1
+        artifact._dependency_hash = "b2-%032x" % 2
+        artifact._content_hash = "not hex"
+        artifact._creation_time = 1.5
+        artifact._delta_base = artifact.get_uid()
+        artifact._chunk_manifest = {"size": 3, "chunk_size": 2,
+                                    "chunks": ["%032x" % 3, "ABCD"]}
+        self.meta = artifact.meta_to_dict()
+        self.meta["extra"] = [1, 2]
+        self.uid = artifact.get_uid()
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_round_trip(self):
+        data = metacodec.dumps_meta(self.meta)
+        self.assertTrue(data.startswith(metacodec.HEADER))
+        self.assertEqual(metacodec.loads(data), self.meta)
+
+        item_meta = {self.uid: self.meta, "other": self.meta}
+        data = metacodec.dumps_meta_map(item_meta)
+        self.assertEqual(metacodec.loads_meta_map(data), item_meta)
+        self.assertLess(len(data), len(json.dumps(item_meta)))
+
+        document = {"artifacts": [metacodec.MetaRecord(self.meta)]}
+        text = metacodec.dumps_text(document)
+        self.assertTrue(text.startswith(metacodec.TEXT_HEADER))
+        self.assertEqual(metacodec.loads_text(text),
+                         {"artifacts": [self.meta]})
+
+    def test_json(self):
+        item_meta = {self.uid: self.meta}
+        # Written by older versions
+        data = json.dumps(item_meta)
+        self.assertEqual(metacodec.loads(data), item_meta)
+        self.assertEqual(metacodec.loads_meta_map(data.encode()), item_meta)
+        self.assertEqual(metacodec.loads_text(data), item_meta)
+
+        data = metacodec.dumps_meta_map(item_meta, metacodec.JSON)
+        self.assertEqual(json.loads(data.decode()), item_meta)
+        self.assertEqual(metacodec.loads_meta_map(data), item_meta)
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_unknown_version(self):
+        data = metacodec.dumps({"a": 1})
+        with self.assertRaises(UnknownMetadataVersionError):
+            metacodec.loads(metacodec.MAGIC + b"\x09" +
+                            data[len(metacodec.HEADER):])
+        with self.assertRaises(UnknownMetadataVersionError):
+            metacodec.loads_text("PTM9:" + metacodec.dumps_text({"a": 1})[5:])
+        with self.assertRaises(UnknownMetadataFormatError):
+            metacodec.dumps({"a": 1}, "xml")
+
+    def test_binary_without_msgpack(self):
+        with mock.patch.object(metacodec, "msgpack", None):
+            with self.assertRaises(UnknownMetadataFormatError):
+                metacodec.loads(metacodec.HEADER + b"\x80")
@@ -0,0 +1,66 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import unittest
+from tests import isolated_filesystem
+from pipetree.exceptions import FileReferenceChangedError
+from pipetree.hashing import content_digest
+from pipetree.references import FileReference
+from pipetree.serializers import get_serializer
+
+
+class TestFileReference(unittest.TestCase):
+    def setUp(self):
+        self.fs = isolated_filesystem()
+        self.fs.__enter__()
+        with open("data.bin", "wb") as f:
+            f.write(b"contents")
+
+    def tearDown(self):
+        self.fs.__exit__(None, None, None)
+
+    def test_fingerprint(self):
+        reference = FileReference.from_path("data.bin")
+        self.assertEqual(reference.path, os.path.abspath("data.bin"))
+        self.assertEqual(reference.size, 8)
+        self.assertIsNone(reference.content_hash)
+        self.assertFalse(reference.changed())
+        self.assertEqual(reference.read(), b"contents")
+        with open(reference, "rb") as f:
+            self.assertEqual(f.read(), b"contents")
+
+        hashed = FileReference.from_path("data.bin", hash_content=True)
+        self.assertEqual(hashed.content_hash, content_digest(b"contents"))
+
+        with open("data.bin", "ab") as f:
+            f.write(b" and more")
+        self.assertTrue(reference.changed())
+        with self.assertRaises(FileReferenceChangedError):
+            reference.open()
+        self.assertEqual(reference.read(verify=False), b"contents and more")
+
+    def test_serializer(self):
+        serializer = get_serializer("file_reference")
+        reference = FileReference.from_path("data.bin", hash_content=True)
+        data = b"".join(serializer.serialize(reference))
+        self.assertNotIn(b"contents", data)
+        self.assertEqual(serializer.deserialize(memoryview(data)), reference)
@@ -0,0 +1,123 @@
+# MIT License
+
+# Copyright (c) 2016 Morgan McDermott & John Carlyle
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import io
+import pickle
+import unittest
+from pipetree.artifact import Artifact, Item
+from pipetree.config import PipelineStageConfig
+from pipetree.serializers import get_serializer, join_chunks,\
+    register_serializer, serialization_type_for, Serializer,\
+    BUFFER_ALIGNMENT, PICKLE5_AVAILABLE, SERIALIZERS
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class TestSerializers(unittest.TestCase):
+    def roundtrip(self, name, payload):
+        serializer = get_serializer(name)
+        data = join_chunks(serializer.serialize(payload))
+        return serializer.deserialize(memoryview(data))
+
+    def test_builtin_roundtrips(self):
+        self.assertEqual(self.roundtrip("json", {"a": [1, 2]}), {"a": [1, 2]})
+        self.assertEqual(self.roundtrip("string", "foo"), "foo")
+        self.assertEqual(self.roundtrip("bytestream", b"\x00\xff"),
+                         b"\x00\xff")
+
+    @unittest.skipIf(not PICKLE5_AVAILABLE, "pickle protocol 5 is missing")
+    def test_pickle5_out_of_band_buffers(self):
+        data = bytearray(b"\x01" * 1000)
+        payload = {"name": "weights", "data": pickle.PickleBuffer(data)}
+        chunks = get_serializer("pickle5").serialize(payload)
+
+        # The buffer is passed through rather than copied into the stream
+        self.assertTrue(any(isinstance(chunk, memoryview) and
+                            len(chunk) == 1000 for chunk in chunks))
+        loaded = self.roundtrip("pickle5", payload)
+        self.assertEqual(loaded["name"], "weights")
+        self.assertEqual(bytes(loaded["data"]), data)
+
+    @unittest.skipIf(not PICKLE5_AVAILABLE, "pickle protocol 5 is missing")
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_pickle5_numpy(self):
+        array = numpy.arange(1000, dtype=numpy.float64)
+        loaded = self.roundtrip("pickle5", [array, array * 2])
+        self.assertTrue(numpy.array_equal(loaded[0], array))
+        self.assertTrue(numpy.array_equal(loaded[1], array * 2))
+        self.assertEqual(loaded[0].ctypes.data % BUFFER_ALIGNMENT,
+                         loaded[1].ctypes.data % BUFFER_ALIGNMENT)
+
+    def test_stage_serialization_config(self):
+        stage_config = PipelineStageConfig("some_name", {
+            "type": "ParameterPipelineStage",
+            "serialization": {"model": "pickle5", "default": "string"}
+        })
+        model = Artifact(stage_config, Item(None, type="model"))
+        self.assertEqual(model.meta_to_dict()["serialization_type"],
+                         "pickle5")
+        log = Artifact(stage_config, Item(None, type="log"))
+        self.assertEqual(log.meta_to_dict()["serialization_type"], "string")
+        explicit = Artifact(stage_config, Item(None, type="model"),
+                            serialization_type="json")
+        self.assertEqual(explicit.meta_to_dict()["serialization_type"],
+                         "json")
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_arrow_table(self):
+        columns = {"a": [1, 2, 3], "b": ["x", "y", "z"], "c": [0.5, 1.5, 2.5]}
+        loaded = self.roundtrip("arrow", columns)
+        self.assertTrue(loaded.equals(pyarrow.table(columns)))
+
+        data = join_chunks(get_serializer("arrow").serialize(columns))
+        projected = get_serializer("arrow").read_columns(
+            io.BytesIO(bytes(data)), ["c", "a"])
+        self.assertEqual(projected.column_names, ["c", "a"])
+        self.assertEqual(projected.column("a").to_pylist(), [1, 2, 3])
+
+    def test_unavailable_fallback(self):
+        class UnavailableSerializer(Serializer):
+            name = "unavailable"
+            available = False
+            fallback = "pickle5"
+
+        register_serializer(UnavailableSerializer())
+        try:
+            stage_config = PipelineStageConfig("some_name", {
+                "type": "ParameterPipelineStage",
+                "serialization": "unavailable"
+            })
+            self.assertEqual(serialization_type_for(stage_config, None),
+                             "pickle5")
+        finally:
+            del SERIALIZERS["unavailable"]
+
+    def test_pickle5_registered(self):
+        self.assertEqual(get_serializer("pickle5") is not None,
+                         PICKLE5_AVAILABLE)
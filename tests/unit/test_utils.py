@@ -19,8 +19,11 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import mmap
 import unittest
-from pipetree.utils import name_is_pythonic, attach_config_to_object
+from tests import isolated_filesystem
+from pipetree.utils import name_is_pythonic, attach_config_to_object,\
+    map_file
 
 
 class TestUtils(unittest.TestCase):
@@ -41,3 +44,22 @@ class TestUtils(unittest.TestCase):
         attach_config_to_object(obj, config)
         for k, v in config.items():
             self.assertEqual(v, getattr(obj, k))
+
+    def test_map_file(self):
+        with isolated_filesystem():
+            with open('data', 'wb') as f:
+                f.write(bytes(range(256)) * 4)
+
+            # Small ranges are read rather than mapped
+            view = map_file('data', 256, 4)
+            self.assertIsInstance(view.obj, bytes)
+            self.assertEqual(bytes(view), bytes(range(4)))
+
+            view = map_file('data', 1000, threshold=16)
+            self.assertIsInstance(view.obj, mmap.mmap)
+            self.assertEqual(bytes(view), bytes(range(232, 256)))
+            view.release()
+
+            self.assertEqual(bytes(map_file('data', 2000)), b'')
+            open('empty', 'wb').close()
+            self.assertEqual(bytes(map_file('empty', threshold=0)), b'')